@@ -0,0 +1,89 @@
+"""
+Bulk ban benchmark against a local stub of the Discord REST API.
+
+Runs run_bulk_ban() and the previous per-ID loop (fetch_user + fetch_ban + ban) over the same
+IDs, asserts how many API calls the bulk pipeline makes per 1,000 IDs and prints timings.
+
+Usage: python benchmarks/bench_bulkban.py [--ids 1000] [--prebanned 300] [--latency 0.005]
+"""
+import argparse
+import asyncio
+import math
+import os
+import sys
+
+import discord
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import bot  # noqa: E402
+from stub_discord import StubDiscord, connect, timed  # noqa: E402
+
+FIRST_ID = 10**17
+
+
+async def legacy_bulk_ban(client, guild, user_ids, reason):
+    """The previous !bulkban loop, minus its fixed 0.1s sleep per ID."""
+    banned = already = 0
+    for user_id in user_ids:
+        target = discord.Object(id=user_id)
+        try: await client.fetch_user(user_id)
+        except discord.HTTPException: pass
+        try:
+            await guild.fetch_ban(target); already += 1; continue
+        except discord.NotFound: pass
+        try: await guild.ban(target, reason=reason, delete_message_seconds=0); banned += 1
+        except discord.HTTPException: pass
+    return banned, already
+
+
+async def run(args):
+    user_ids = list(range(FIRST_ID, FIRST_ID + args.ids))
+    prebanned = user_ids[:args.prebanned]
+    unbannable = user_ids[-5:]
+
+    # Bulk pipeline
+    stub = await StubDiscord(banned=prebanned, unbannable=unbannable, latency=args.latency).start()
+    client, guild = await connect(stub)
+    elapsed = timed()
+    result = await bot.run_bulk_ban(guild, user_ids, "benchmark")
+    bulk_s = elapsed()
+    bulk_calls = dict(stub.calls)
+    await client.close(); await stub.stop()
+
+    expected_ban_pages = len(prebanned) // 1000 + 1
+    expected_bulk_requests = math.ceil((len(user_ids) - len(prebanned)) / bot.BULK_BAN_BATCH_SIZE)
+    assert bulk_calls.get("GET /guilds/{id}/bans") == expected_ban_pages, bulk_calls
+    assert bulk_calls.get("POST /guilds/{id}/bulk-ban") == expected_bulk_requests, bulk_calls
+    assert sum(bulk_calls.values()) == expected_ban_pages + expected_bulk_requests, bulk_calls
+    assert len(result["already_banned"]) == len(prebanned)
+    assert len(result["banned"]) == len(user_ids) - len(prebanned) - len(unbannable)
+    assert sorted(result["failed"]) == unbannable
+
+    # Previous per-ID loop
+    stub = await StubDiscord(banned=prebanned, unbannable=unbannable, latency=args.latency).start()
+    client, guild = await connect(stub)
+    elapsed = timed()
+    await legacy_bulk_ban(client, guild, user_ids, "benchmark")
+    legacy_s = elapsed()
+    legacy_calls = sum(stub.calls.values())
+    await client.close(); await stub.stop()
+
+    per_1000 = lambda calls: calls * 1000 / len(user_ids)
+    print(f"{len(user_ids):,} IDs, {len(prebanned):,} already banned, {args.latency * 1000:.1f}ms simulated latency")
+    print(f"{'pipeline':<10} {'API calls':>10} {'per 1k IDs':>11} {'time':>9}")
+    print(f"{'bulk':<10} {sum(bulk_calls.values()):>10,} {per_1000(sum(bulk_calls.values())):>11.1f} {bulk_s:>8.2f}s")
+    print(f"{'legacy':<10} {legacy_calls:>10,} {per_1000(legacy_calls):>11.1f} {legacy_s:>8.2f}s")
+    print("call counts OK")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ids", type=int, default=1000)
+    parser.add_argument("--prebanned", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.005)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Bulk role benchmark against a local stub of the Discord REST API.
+
+The stub enforces a member-role rate limit bucket (X-RateLimit headers, 429 past the budget)
+and can inject extra 429s. Compares the previous sequential loop (fixed 0.1s sleep per user)
+with run_bulk_role_change() at BULK_ROLE_WORKERS and 4 workers, for adding and removing a role.
+The member-role bucket is shared by the whole guild, so extra workers are not expected to go faster.
+
+Usage: python benchmarks/bench_bulkrole.py [--members 100] [--budget 10/1.0] [--latency 0.03] [--inject-429 25]
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+import discord
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import bot  # noqa: E402
+from stub_discord import StubDiscord, connect, timed, user_payload  # noqa: E402
+
+FIRST_ID = 10**17
+ROLE_ID = 800000000000000001
+
+
+async def legacy_bulk_give_role(members, role):
+    """The previous !bulkgiverole loop."""
+    for member in members:
+        await asyncio.sleep(0.1)
+        try: await member.add_roles(role, reason="benchmark")
+        except discord.HTTPException: pass
+
+
+async def run_case(args, label, add, runner):
+    member_ids = list(range(FIRST_ID, FIRST_ID + args.members))
+    limit, window = (float(x) for x in args.budget.split("/"))
+    stub = StubDiscord(members=member_ids, role_ids=[ROLE_ID], latency=args.latency,
+                       rate_limit_every=args.inject_429, role_bucket=(int(limit), window))
+    if not add:
+        for member_id in member_ids: stub.members[member_id].add(ROLE_ID)
+    await stub.start()
+    client, guild = await connect(stub)
+    role = guild.get_role(ROLE_ID)
+    members = [discord.Member(data={"user": user_payload(i), "roles": [], "joined_at": None, "deaf": False, "mute": False, "flags": 0}, guild=guild, state=client._connection)
+               for i in member_ids]
+
+    elapsed = timed()
+    await runner(members, role)
+    seconds = elapsed()
+    holders = sum(1 for roles in stub.members.values() if ROLE_ID in roles)
+    calls, rate_limited = sum(stub.calls.values()), stub.rate_limited
+    await client.close(); await stub.stop()
+
+    expected = len(member_ids) if add else 0
+    assert holders == expected, f"{label}: {holders} members hold the role, expected {expected}"
+    print(f"{label:<26} {seconds:>7.2f}s {len(member_ids) / seconds:>8.1f}/s {calls:>7,} {rate_limited:>6,}")
+
+
+async def run(args):
+    print(f"{args.members} members, bucket {args.budget} (requests/seconds), {args.latency * 1000:.0f}ms latency, 429 injected every {args.inject_429 or '-'} requests")
+    print(f"{'case':<26} {'time':>8} {'rate':>10} {'calls':>7} {'429s':>6}")
+    pool = lambda add, workers: lambda members, role: bot.run_bulk_role_change(members, role, add, "benchmark", workers=workers)
+    await run_case(args, "legacy add (sleep 0.1)", True, legacy_bulk_give_role)
+    await run_case(args, f"pool add, {bot.BULK_ROLE_WORKERS} worker(s)", True, pool(True, bot.BULK_ROLE_WORKERS))
+    await run_case(args, "pool add, 4 workers", True, pool(True, 4))
+    await run_case(args, f"pool remove, {bot.BULK_ROLE_WORKERS} worker(s)", False, pool(False, bot.BULK_ROLE_WORKERS))
+    print("all role changes applied")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=100)
+    parser.add_argument("--budget", default="10/1.0")
+    parser.add_argument("--latency", type=float, default=0.03)
+    parser.add_argument("--inject-429", type=int, default=25)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
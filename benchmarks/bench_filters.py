@@ -0,0 +1,120 @@
+"""
+Filter throughput benchmark for the UserFilter engine.
+
+Generates synthetic user records (same shape as guild stats file entries) and times UserFilter.mask()
+over the columnar UserStatsTable against the previous per-user op_map dispatch loop.
+
+Usage: python benchmarks/bench_filters.py [--users 1000000] [--seed 7]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import bot  # noqa: E402
+from fixtures import make_user_record  # noqa: E402
+
+ROLE_IDS = [1000 + i for i in range(20)]
+
+# Filter sets to benchmark: (label, numeric filter strings, role terms, use 'or' split)
+SCENARIOS = [
+    ("single numeric", ["msgcount>100"], [], False),
+    ("numeric + range", ["msgcount>=50", "5<artcount<40"], [], False),
+    ("lists + role", ["joined>=3", "won>=1", "twtcount>2"], [(ROLE_IDS[0], True)], False),
+    ("two groups (or)", ["msgcount>500", "artcount>=10"], [(ROLE_IDS[1], True), (ROLE_IDS[2], False)], True),
+]
+
+
+def make_records(count, seed):
+    """Builds (user_data, role_ids) pairs with a long-tailed activity distribution."""
+    rng = random.Random(seed)
+    records = []
+    for _ in range(count):
+        data = make_user_record(rng)
+        role_ids = frozenset(rng.sample(ROLE_IDS, rng.randint(0, 4)))
+        records.append((data, role_ids))
+    return records
+
+
+LEGACY_OP_MAP = {">": lambda a, b: a > b, "<": lambda a, b: a < b, ">=": lambda a, b: a >= b, "<=": lambda a, b: a <= b, "=": lambda a, b: a == b, "!=": lambda a, b: a != b}
+
+
+def legacy_matches(data, role_ids, numeric_filters, has_roles, not_roles):
+    """The per-user dispatch loop previously duplicated in generate_excel/filter_user_id."""
+    op_map = LEGACY_OP_MAP
+    if any(r not in role_ids for r in has_roles) or any(r in role_ids for r in not_roles):
+        return False
+    for filt in numeric_filters:
+        field = filt[0]
+        if field == "total_message_count": user_val = data.get("total_message_count", 0)
+        elif field == "tweet_count": user_val = len(data.get("twitter_links", []))
+        elif field == "joined": user_val = len(data.get("events", []))
+        elif field == "won": user_val = len(data.get("winners", []))
+        else: user_val = data.get("art_count", 0)
+        if len(filt) == 3:
+            if not op_map[filt[1]](user_val, filt[2]): return False
+        else:
+            if not op_map[filt[1]](user_val, filt[2]) or not op_map[filt[3]](user_val, filt[4]): return False
+    return True
+
+
+def build_table(records):
+    """Loads the records into a UserStatsTable with role bits set directly (no guild needed)."""
+    table = bot.UserStatsTable()
+    table.rebuild((str(10**17 + i), data) for i, (data, _) in enumerate(records))
+    table.role_bits = {role_id: bit for bit, role_id in enumerate(ROLE_IDS)}
+    masks = [sum(1 << table.role_bits[r] for r in role_ids) for _, role_ids in records]
+    table.role_mask[:table.size] = np.array(masks, dtype=np.uint64)
+    table.tracked[:table.size] = True
+    table.member_stale[:table.size] = False
+    return table
+
+
+def build_filter(filter_strings, role_terms, split_or):
+    numeric_filters = [bot.parse_numeric_filter(f) for f in filter_strings]
+    terms = [t for filt in numeric_filters for t in bot.UserFilter.terms_from_numeric_filter(filt)]
+    terms += [("role", role_id, must_have) for role_id, must_have in role_terms]
+    clauses = [terms[:1], terms[1:]] if split_or else [terms]
+    return numeric_filters, bot.UserFilter(clauses)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"Generating {args.users:,} synthetic records...")
+    records = make_records(args.users, args.seed)
+
+    table = build_table(records)
+
+    print(f"{'scenario':<18} {'matched':>9} {'mask()':>11} {'legacy':>10} {'speedup':>9}")
+    for label, filter_strings, role_terms, split_or in SCENARIOS:
+        numeric_filters, user_filter = build_filter(filter_strings, role_terms, split_or)
+
+        start = time.perf_counter()
+        matched = int(np.count_nonzero(user_filter.mask(table)))
+        vector_s = time.perf_counter() - start
+
+        legacy_s = None
+        if not split_or: # The old loop had no OR support
+            has_roles = [r for r, must in role_terms if must]
+            not_roles = [r for r, must in role_terms if not must]
+            start = time.perf_counter()
+            legacy_matched = sum(1 for data, role_ids in records if legacy_matches(data, role_ids, numeric_filters, has_roles, not_roles))
+            legacy_s = time.perf_counter() - start
+            assert legacy_matched == matched, f"{label}: legacy {legacy_matched} != mask() {matched}"
+
+        legacy_col = f"{legacy_s:>9.3f}s" if legacy_s is not None else f"{'n/a':>10}"
+        speedup_col = f"{legacy_s / vector_s:>8.0f}x" if legacy_s is not None else f"{'n/a':>9}"
+        print(f"{label:<18} {matched:>9,} {vector_s * 1000:>9.1f}ms {legacy_col} {speedup_col}")
+
+
+if __name__ == "__main__":
+    main()
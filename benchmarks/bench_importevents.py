@@ -0,0 +1,109 @@
+"""
+Event import benchmark: !importevents' parse + single-pass apply + one save versus entering the
+same rows through !addevent / !eventwinners commands (about 100 IDs per message, one save each).
+
+Runs on a synthetic guild partition saved to a temporary directory; the real guild stats files are not touched.
+
+Usage: python benchmarks/bench_importevents.py [--rows 50000] [--users 20000] [--events 40]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import bot  # noqa: E402
+
+IDS_PER_COMMAND = 100 # What fits in one 2,000 character command message
+GUILD_ID = 1
+
+
+def make_rows(rows, users, events, seed):
+    rng = random.Random(seed)
+    user_ids = [str(10**17 + i) for i in range(users)]
+    lines = ["event,user_id,status"]
+    for _ in range(rows):
+        status = "winner" if rng.random() < 0.1 else "joined"
+        lines.append(f"Event {rng.randrange(events)},{rng.choice(user_ids)},{status}")
+    return user_ids, lines
+
+
+def reset_stats(guild_state, user_ids):
+    guild_state.stats_data = {uid: {**bot.DEFAULT_USER_TEMPLATE(), "events": ["Old event"]} for uid in user_ids}
+    guild_state.stats_data["config"] = guild_state.config_data
+    guild_state.stats_table.rebuild((uid, data) for uid, data in guild_state.stats_data.items() if uid.isdigit())
+    guild_state.rebuild_leaderboards()
+
+
+def import_path(guild_state, lines):
+    """parse_event_import_row for every row, apply_event_import once, one save."""
+    ops_by_user = {}
+    for line in lines[1:]:
+        event_name, user_id, status = bot.parse_event_import_row(line)
+        ops_by_user.setdefault(user_id, []).append((event_name, status))
+    counts = bot.apply_event_import(guild_state, ops_by_user)
+    guild_state.save_stats()
+    return counts
+
+
+def command_path(guild_state, lines):
+    """The per-command loop of _modify_event: sets rebuilt per ID, one save per command message."""
+    groups = {}
+    for line in lines[1:]:
+        event_name, user_id, status = bot.parse_event_import_row(line)
+        groups.setdefault((event_name, status), []).append(user_id)
+    saves = 0
+    for (event_name, status), user_ids in groups.items():
+        event_std = bot.standardize_event_name(event_name)
+        for start in range(0, len(user_ids), IDS_PER_COMMAND):
+            changed = False
+            for user_id in dict.fromkeys(user_ids[start:start + IDS_PER_COMMAND]):
+                data = guild_state.get_user_data(user_id)
+                events_list, winners_list = data.setdefault("events", []), data.setdefault("winners", [])
+                events_std = {bot.standardize_event_name(e) for e in events_list}
+                winners_std = {bot.standardize_event_name(w) for w in winners_list}
+                modified = False
+                if event_std not in events_std: events_list.append(event_name); modified = True
+                if status == "winner" and event_std not in winners_std: winners_list.append(event_name); modified = True
+                if modified: changed = True; guild_state.notify_user_changed(user_id)
+            if changed: guild_state.save_stats(); saves += 1
+    return saves
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--events", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    user_ids, lines = make_rows(args.rows, args.users, args.events, args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        bot.GUILD_DATA_DIR = tmp
+        guild_state = bot.get_guild_state(GUILD_ID)
+
+        reset_stats(guild_state, user_ids)
+        start = time.perf_counter()
+        counts = import_path(guild_state, lines)
+        import_s = time.perf_counter() - start
+        imported = {uid: (list(guild_state.stats_data[uid]["events"]), list(guild_state.stats_data[uid]["winners"])) for uid in user_ids}
+
+        reset_stats(guild_state, user_ids)
+        start = time.perf_counter()
+        saves = command_path(guild_state, lines)
+        command_s = time.perf_counter() - start
+        # Same final memberships (order within a user's lists may differ)
+        for uid in user_ids:
+            assert sorted(imported[uid][0]) == sorted(guild_state.stats_data[uid]["events"]), uid
+            assert sorted(imported[uid][1]) == sorted(guild_state.stats_data[uid]["winners"]), uid
+
+    print(f"{args.rows:,} rows, {args.users:,} users, {args.events} events")
+    print(f"importevents: {import_s:6.2f}s, 1 save ({counts['joined']:,} joined, {counts['winner']:,} winners, {counts['unchanged']:,} unchanged)")
+    print(f"commands:     {command_s:6.2f}s, {saves:,} saves")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Event loop lag benchmark: runs the loop watchdog while blocking work that happens on the loop
+(a guild stats file write over synthetic users) runs between short awaits, then reports the lag histogram
+and the stalls the watchdog captured (with the innermost bot.py frame of each captured stack).
+
+Meant for CI-style runs: --max-p99-ms / --max-stalls make the script exit with status 1 on a
+regression, and --json writes the numbers for comparison between runs.
+
+Usage: python benchmarks/bench_loop_lag.py [--users 50000] [--saves 10] [--threshold 0.1] [--max-p99-ms 500]
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import bot  # noqa: E402
+
+GUILD_ID = 1
+
+
+def make_stats(guild_state, users):
+    guild_state.stats_data = {str(10**17 + i): {**bot.DEFAULT_USER_TEMPLATE(), "events": [f"Event {i % 40}"], "total_message_count": i % 500}
+                              for i in range(users)}
+
+
+def innermost_bot_frame(stack):
+    """'function (bot.py:line)' of the deepest bot.py frame in a captured stack."""
+    frames = re.findall(r'File "([^"]+)", line (\d+), in (\S+)', stack)
+    for path, line, function in reversed(frames):
+        if os.path.basename(path) == "bot.py": return f"{function} (bot.py:{line})"
+    return "-"
+
+
+async def workload(guild_state, args):
+    for _ in range(args.saves):
+        guild_state.flush() # Blocks the loop, as saves do inside on_message and commands
+        await asyncio.sleep(args.pause)
+
+
+async def run(guild_state, args):
+    watchdog = bot.LoopWatchdog(interval=args.interval, threshold=args.threshold)
+    watchdog.start()
+    await asyncio.sleep(args.interval * 4) # Idle baseline samples
+    await workload(guild_state, args)
+    await asyncio.sleep(args.interval * 2)
+    await watchdog.stop()
+    return watchdog
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--saves", type=int, default=10)
+    parser.add_argument("--pause", type=float, default=0.2, help="seconds awaited between saves")
+    parser.add_argument("--interval", type=float, default=0.05)
+    parser.add_argument("--threshold", type=float, default=0.1)
+    parser.add_argument("--max-p99-ms", type=float, default=None, help="exit 1 if the p99 lag is above this")
+    parser.add_argument("--max-stalls", type=int, default=None, help="exit 1 if more stalls were recorded")
+    parser.add_argument("--json", default=None, help="write the results to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bot.GUILD_DATA_DIR = tmp
+        guild_state = bot.get_guild_state(GUILD_ID)
+        make_stats(guild_state, args.users)
+        watchdog = asyncio.run(run(guild_state, args))
+        stats_bytes = os.path.getsize(guild_state.path)
+
+    lag = bot.metrics_loop_lag
+    _, total, count = lag.merged()
+    results = {"users": args.users, "saves": args.saves, "stats_bytes": stats_bytes, "samples": count,
+               "lag_avg_ms": total / count * 1000 if count else 0.0,
+               "lag_p50_ms": lag.quantile(0.5) * 1000, "lag_p99_ms": lag.quantile(0.99) * 1000, "lag_max_ms": watchdog.max_lag * 1000,
+               "stalls": len(watchdog.stalls), "captured": sum(1 for stall in watchdog.stalls if stall[3])}
+
+    print(f"{args.users:,} users, stats file {stats_bytes / 1024 / 1024:.1f} MB, {args.saves} saves, stall threshold {args.threshold * 1000:.0f}ms")
+    print(f"lag over {count} samples: avg {results['lag_avg_ms']:.1f}ms | p50 {results['lag_p50_ms']:.1f}ms | "
+          f"p99 {results['lag_p99_ms']:.1f}ms | max {results['lag_max_ms']:.1f}ms")
+    print(f"stalls: {results['stalls']} ({results['captured']} with a captured stack)")
+    for timestamp, seconds, task, stack in list(watchdog.stalls)[:5]:
+        print(f"  {timestamp} {seconds * 1000:7.1f}ms  {task}  at {innermost_bot_frame(stack)}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f: json.dump(results, f, indent=2)
+
+    failed = []
+    if args.max_p99_ms is not None and results["lag_p99_ms"] > args.max_p99_ms: failed.append(f"p99 lag {results['lag_p99_ms']:.1f}ms > {args.max_p99_ms:g}ms")
+    if args.max_stalls is not None and results["stalls"] > args.max_stalls: failed.append(f"{results['stalls']} stalls > {args.max_stalls}")
+    if failed:
+        print("FAIL: " + "; ".join(failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
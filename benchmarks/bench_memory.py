@@ -0,0 +1,120 @@
+"""
+Memory benchmark for lean memory mode (LEAN_MEMORY): measures the resident set size that discord.py's caches
+add in a default process (every member cached after startup chunking, 1,000 cached messages) and in a lean one
+(uncached guild, members in voice channels only, LEAN_MAX_MESSAGES cached messages, the fetched-member LRU full at
+its size for the guild).
+
+Each size and mode runs in a fresh subprocess with the mode's environment, so the bot is constructed with the
+same client options as in production and RSS numbers are not polluted by the other run. Stats records are not
+loaded: they are the same in both modes.
+
+Usage: python benchmarks/bench_memory.py [--members 20k,100k,300k] [--messages 5000] [--voice 200] [--json out.json]
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MODES = ("full", "lean")
+
+
+def rss_bytes():
+    """Current resident set size (Linux), else the peak from getrusage."""
+    try:
+        with open("/proc/self/statm") as f: return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def child(mode, members, args):
+    """Runs in the subprocess: builds the caches one mode keeps and prints the measurements as JSON."""
+    import logging
+    import bot
+    import fixtures
+    logging.getLogger("eventtrack").setLevel(logging.WARNING)
+    lean = bot.LEAN_MEMORY
+    state = bot.bot._connection
+    gc.collect()
+    baseline = rss_bytes()
+
+    # Startup: chunking fills the member cache; a lean guild only knows its member count
+    started = time.perf_counter()
+    guild = fixtures.build_guild(bot.bot, members, args.seed, cache_members=not lean)
+    build_seconds = time.perf_counter() - started
+    rng = random.Random(args.seed + 1)
+    if lean: # Members sitting in voice channels stay cached (attendance)
+        for index in rng.sample(range(members), min(args.voice, members)): guild._add_member(fixtures.make_member(guild, index, rng))
+
+    # Message traffic through the message cache (authors come with the message payload)
+    authors = guild.members if not lean else [fixtures.make_member(guild, index, rng) for index in range(min(members, 1000))]
+    for i in range(args.messages):
+        message = fixtures.make_message(guild, fixtures.COMMAND_CHANNEL_ID, authors[i % len(authors)], "hello there " * 4)
+        if state._messages is not None: state._messages.append(message)
+    del authors, message
+
+    # Lean steady state after reports: the fetched-member LRU at capacity
+    if lean:
+        bot.member_lru.resize(bot.lean_member_cache_limit())
+        for index in range(min(members, bot.member_lru.max_entries)):
+            bot.member_lru.put(guild.id, fixtures.user_id(index), fixtures.make_member(guild, index, rng))
+    gc.collect()
+    return {"mode": mode, "members": members, "cached_members": len(guild.members), "cached_messages": len(state._messages or ()),
+            "lru_members": len(bot.member_lru), "build_seconds": build_seconds, "rss_baseline": baseline, "rss": rss_bytes(),
+            "rss_added": rss_bytes() - baseline}
+
+
+def run_child(mode, members, args):
+    env = {**os.environ, "LEAN_MEMORY": "true" if mode == "lean" else "false", "METRICS_PORT": "0",
+           "LOOP_STALL_LOG_PATH": "", "SLOW_COMMAND_LOG_PATH": "", "TRAFFIC_RECORD_PATH": "", "STORAGE_DB_PATH": ""}
+    command = [sys.executable, os.path.abspath(__file__), "--child", mode, "--members", str(members), "--messages", str(args.messages),
+               "--voice", str(args.voice), "--seed", str(args.seed)]
+    output = subprocess.run(command, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def format_mb(size):
+    return f"{size / 1024 / 1024:,.1f} MB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", default="20k,100k,300k", help="comma separated guild sizes: 10k, 100k, 1m or member counts")
+    parser.add_argument("--messages", type=int, default=5000, help="messages passed through the message cache")
+    parser.add_argument("--voice", type=int, default=200, help="members in voice channels (cached in lean mode)")
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--json", default=None, help="also write the results to this file")
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(child(args.child, int(args.members), args)))
+        return
+
+    import fixtures
+    results = []
+    print(f"{'members':>9} {'mode':<5} {'cached':>9} {'messages':>8} {'LRU':>7} {'build':>8} {'RSS added':>11} {'RSS total':>11}")
+    for label in args.members.split(","):
+        members = fixtures.parse_size(label)
+        for mode in MODES:
+            result = run_child(mode, members, args)
+            results.append(result)
+            print(f"{members:>9,} {mode:<5} {result['cached_members']:>9,} {result['cached_messages']:>8,} {result['lru_members']:>7,} "
+                  f"{result['build_seconds']:>7.2f}s {format_mb(result['rss_added']):>11} {format_mb(result['rss']):>11}")
+        full, lean = results[-2], results[-1]
+        saved = full["rss_added"] - lean["rss_added"]
+        print(f"{'':>9} lean mode saves {format_mb(saved)} ({saved / full['rss_added']:.0%} of the cache memory)" if full["rss_added"] > 0 else "")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f: json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
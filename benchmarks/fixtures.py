@@ -0,0 +1,184 @@
+"""
+Synthetic fixtures for the offline benchmarks: guild stats file contents at any size and a guild built
+from real discord.py models (Guild, Role, Member, TextChannel, Message) on the bot's own connection
+state, so bot.py code runs unmodified without a Discord connection.
+
+Nothing here talks to Discord: BenchContext records what commands send instead of calling the API,
+and the bot owner is set to an ID no fixture member has (so owner checks never fetch it).
+"""
+import datetime
+import itertools
+import json
+import random
+
+import discord
+from discord.ext import commands
+from discord.ext.commands.view import StringView
+
+GUILD_ID = 900000000000000001
+OWNER_ID = 900000000000000002
+BOT_USER_ID = 900000000000000003
+FIRST_USER_ID = 10**17
+ROLE_COUNT = 20
+TARGET_ROLE_COUNT = 10 # Members with one of the first 10 roles are tracked
+COMMAND_CHANNEL_ID = 910000000000000001
+LOG_CHANNEL_ID = 910000000000000002
+ART_CHANNEL_ID = 910000000000000003
+VOICE_CHANNEL_IDS = [910000000000000011 + i for i in range(4)]
+EVENT_COUNT = 6
+
+ROLE_IDS = [GUILD_ID + 1 + i for i in range(ROLE_COUNT)]
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+_message_ids = itertools.count(920000000000000001)
+
+
+def parse_size(text):
+    """'10k' / '300k' / '1m' / plain integer -> user count."""
+    text = text.strip().lower()
+    if text in SIZES: return SIZES[text]
+    if text[-1:] in ("k", "m"): return int(float(text[:-1]) * (1_000 if text[-1] == "k" else 1_000_000))
+    return int(text)
+
+
+def user_id(index):
+    return FIRST_USER_ID + index
+
+
+def make_user_record(rng):
+    """One guild stats file user record with a long-tailed activity distribution."""
+    activity = int(rng.paretovariate(1.2))
+    return {
+        "events": [f"event{j}" for j in range(rng.randint(0, EVENT_COUNT))],
+        "winners": [f"event{j}" for j in range(rng.randint(0, 2))],
+        "twitter_links": [f"https://x.com/u/status/{j}" for j in range(min(activity // 20, 8))],
+        "total_message_count": activity * rng.randint(1, 30),
+        "art_count": rng.randint(0, 60) if activity > 3 else 0,
+    }
+
+
+def make_stats(users, seed=11):
+    """Guild stats file contents for 'users' users, with log/art channels and target roles configured."""
+    rng = random.Random(seed)
+    stats = {str(user_id(i)): make_user_record(rng) for i in range(users)}
+    links = {link for data in stats.values() for link in data["twitter_links"]}
+    stats["config"] = {
+        "twitter_log_channel_ids": [LOG_CHANNEL_ID], "art_channel_ids": [ART_CHANNEL_ID],
+        "track_authorized_roles": [], "track_target_roles": ROLE_IDS[:TARGET_ROLE_COUNT], "stats_authorized_roles": [],
+        "stats_channel_id": None, "stats_message_id": None, "stats_cooldowns": {},
+    }
+    stats["posted_twitter_links"] = sorted(links)
+    return stats
+
+
+def write_stats(path, stats):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=2, ensure_ascii=False) # Same layout as GuildState.flush()
+
+
+def _user_payload(uid):
+    return {"id": str(uid), "username": f"user{uid}", "discriminator": "0", "global_name": None, "avatar": None}
+
+
+def _role_payload(role_id, name, position):
+    return {"id": str(role_id), "name": name, "permissions": "0", "position": position, "color": 0x3498DB if position else 0,
+            "hoist": False, "managed": False, "mentionable": False}
+
+
+def _channel_payload(channel_id, name, position, channel_type=0):
+    payload = {"id": str(channel_id), "type": channel_type, "name": name, "position": position, "permission_overwrites": [], "guild_id": str(GUILD_ID)}
+    if channel_type == 2: payload.update(bitrate=64000, user_limit=0)
+    return payload
+
+
+def make_member(guild, index, rng):
+    """Member model of fixture user 'index' with 1-3 random roles (not added to the guild's member cache)."""
+    member_roles = [str(role_id) for role_id in rng.sample(ROLE_IDS, rng.randint(1, 3))]
+    return discord.Member(data={"user": _user_payload(user_id(index)), "roles": member_roles, "joined_at": None,
+                                "deaf": False, "mute": False, "flags": 0}, guild=guild, state=guild._state)
+
+
+def build_guild(client, members, seed=11, cache_members=True):
+    """
+    Registers a guild with ROLE_COUNT roles, the command/log/art text channels, voice channels and 'members' members
+    (IDs matching make_stats) on client's connection state. Each member has 1-3 roles; about half have a
+    target role. With cache_members=False only the member count is set, like a guild that was not chunked
+    (lean memory mode). Returns the guild.
+    """
+    rng = random.Random(seed)
+    state = client._connection
+    roles = [_role_payload(GUILD_ID, "@everyone", 0)] + [_role_payload(role_id, f"role{i}", i + 1) for i, role_id in enumerate(ROLE_IDS)]
+    channels = [_channel_payload(COMMAND_CHANNEL_ID, "commands", 0), _channel_payload(LOG_CHANNEL_ID, "x-links", 1), _channel_payload(ART_CHANNEL_ID, "art", 2)]
+    channels += [_channel_payload(channel_id, f"voice{i}", 3 + i, channel_type=2) for i, channel_id in enumerate(VOICE_CHANNEL_IDS)]
+    guild = discord.Guild(data={"id": str(GUILD_ID), "name": "Bench Guild", "owner_id": str(OWNER_ID), "roles": roles, "channels": channels,
+                                "emojis": [], "stickers": [], "features": [], "member_count": members}, state=state)
+    state._add_guild(guild)
+    for i in range(members if cache_members else 0):
+        guild._add_member(make_member(guild, i, rng))
+    client.owner_id = OWNER_ID
+    state.user = discord.ClientUser(state=state, data={**_user_payload(BOT_USER_ID), "bot": True}) # Needed by process_commands
+    return guild
+
+
+def tracked_members(guild, count, tracked=True):
+    """First 'count' members that do (or don't) have a target role."""
+    targets = set(ROLE_IDS[:TARGET_ROLE_COUNT])
+    picked = (m for m in guild.members if any(r.id in targets for r in m.roles) == tracked)
+    return list(itertools.islice(picked, count))
+
+
+def make_message(guild, channel_id, author, content="", attachments=0):
+    """A guild Message from 'author' in the given channel (with 'attachments' image attachments)."""
+    channel = guild.get_channel(channel_id)
+    message_id = next(_message_ids)
+    files = [{"id": str(message_id + n), "filename": f"art{n}.png", "size": 1024, "url": f"https://cdn.example/{message_id}/{n}.png",
+              "proxy_url": f"https://cdn.example/{message_id}/{n}.png", "content_type": "image/png"} for n in range(attachments)]
+    data = {"id": str(message_id), "channel_id": str(channel_id), "guild_id": str(GUILD_ID), "author": _user_payload(author.id), "content": content,
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(), "edited_timestamp": None, "tts": False, "mention_everyone": False,
+            "mentions": [], "mention_roles": [], "attachments": files, "embeds": [], "pinned": False, "type": 0}
+    return discord.Message(state=guild._state, channel=channel, data=data)
+
+
+def make_interaction(guild, member, custom_id, channel_id=COMMAND_CHANNEL_ID):
+    """A button click (component interaction) by 'member' on the component with 'custom_id'."""
+    interaction_id = next(_message_ids)
+    roles = [str(role.id) for role in member.roles if role.id != guild.id]
+    data = {"id": str(interaction_id), "application_id": str(BOT_USER_ID), "type": 3, "token": f"token{interaction_id}", "version": 1,
+            "guild_id": str(GUILD_ID), "channel_id": str(channel_id), "app_permissions": "0", "locale": "en-US", "guild_locale": "en-US", "attachment_size_limit": 10 * 1024 * 1024,
+            "member": {"user": _user_payload(member.id), "roles": roles, "joined_at": None, "deaf": False, "mute": False, "flags": 0, "permissions": "0"},
+            "data": {"custom_id": custom_id, "component_type": 2}, "entitlements": [], "authorizing_integration_owners": {}, "context": 0}
+    return discord.Interaction(data=data, state=guild._state)
+
+
+def make_voice_state(guild, channel_id):
+    """VoiceState of a member in the given voice channel (None: not connected)."""
+    return discord.VoiceState(data={"session_id": "bench"}, channel=guild.get_channel(channel_id) if channel_id else None)
+
+
+class SentMessage:
+    """Stand-in for a message the bot sent: records later edits."""
+    def __init__(self, channel, kwargs):
+        self.channel = channel
+        self.id = next(_message_ids)
+        self.kwargs = kwargs
+
+    async def edit(self, **kwargs):
+        self.kwargs.update(kwargs)
+        return self
+
+
+class BenchContext(commands.Context):
+    """Command context whose replies are recorded in .sent instead of being sent to Discord."""
+    def __init__(self, client, message, command_name=None):
+        super().__init__(message=message, bot=client, view=StringView(message.content), prefix="!",
+                         command=client.get_command(command_name) if command_name else None)
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        if content is not None: kwargs["content"] = content
+        self.sent.append(kwargs)
+        return SentMessage(self.channel, kwargs)
+
+
+def make_context(client, guild, author, command_name=None, content=""):
+    return BenchContext(client, make_message(guild, COMMAND_CHANNEL_ID, author, content), command_name)
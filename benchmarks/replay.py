@@ -0,0 +1,308 @@
+"""
+Deterministic replay load test for traffic recorded with `!traffic` / TRAFFIC_RECORD_PATH (gzip JSONL).
+
+The recording is replayed against a synthetic guild (benchmarks/fixtures.py) while every REST call goes to the
+local stand-in (benchmarks/stub_discord.py): messages go through on_message (tracking, moderation, commands),
+stats button clicks through StatsView's callback and voice moves through on_voice_state_update (with an
+attendance session open over the voice channels). Pseudonymous users, channels, roles, links and words are mapped
+onto fixture objects in order of first appearance, so a recording always replays the same way.
+
+Events start at their recorded offset divided by --speed ('max' sends them back to back). Latency is measured
+from an event's scheduled start to the end of its handler, so it includes time spent waiting for a busy loop.
+Reports throughput, latency percentiles per event kind, REST calls and the guild stats file persistence cost.
+
+--make-sample writes a synthetic recording through bot.TrafficRecorder (chat, commands, an art burst, a link
+flood with duplicates, a stats button stampede and voice moves) for trying the tool without a live recording.
+
+Usage: python benchmarks/replay.py traffic.jsonl.gz [--speed 1|10|max] [--users 10k] [--limit N] [--json out.json]
+       python benchmarks/replay.py sample.jsonl.gz --make-sample 5000
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import bot  # noqa: E402
+import fixtures  # noqa: E402
+from stub_discord import StubDiscord  # noqa: E402
+
+ADMIN_ROLE_ID = fixtures.ROLE_IDS[-1] # Track authorized role in the replay guild (not a target role)
+CHANNEL_CLASSES = {"log": fixtures.LOG_CHANNEL_ID, "art": fixtures.ART_CHANNEL_ID, "stats": fixtures.COMMAND_CHANNEL_ID, "text": fixtures.COMMAND_CHANNEL_ID}
+STATS_BUTTON_ID = "show_my_stats_button"
+DRAIN_TIMEOUT = 30.0 # Seconds to wait for queued replies and deletions after the last event
+
+
+def read_recording(path, limit=None):
+    """Events of a recording in order; offsets of later recording sessions (new header) continue after the previous one."""
+    events, base, last = [], 0.0, 0.0
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            event = json.loads(line)
+            if event["e"] == "header":
+                if event.get("v") != bot.TRAFFIC_FORMAT_VERSION: raise SystemExit(f"Unsupported recording version: {event.get('v')}")
+                base = last
+                continue
+            event["t"] += base
+            last = event["t"]
+            events.append(event)
+            if limit and len(events) >= limit: break
+    return events
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))] if sorted_values else 0.0
+
+
+class Mapper:
+    """Maps pseudonyms of a recording onto fixture members, channels and roles (first appearance order)."""
+    def __init__(self, guild):
+        self.guild = guild
+        tracked_roles = set(fixtures.ROLE_IDS[:fixtures.TARGET_ROLE_COUNT])
+        self.pools = {} # (tracked, admin) -> members
+        for member in guild.members:
+            role_ids = {role.id for role in member.roles}
+            self.pools.setdefault((int(bool(role_ids & tracked_roles)), int(ADMIN_ROLE_ID in role_ids)), []).append(member)
+        self.next_index = {key: 0 for key in self.pools}
+        self.users, self.voice, self.roles = {}, {}, {}
+
+    def member(self, pseudonym, tracked=1, admin=0):
+        if pseudonym not in self.users:
+            key = (tracked, admin) if self.pools.get((tracked, admin)) else next(iter(self.pools))
+            pool, index = self.pools[key], self.next_index[key]
+            self.users[pseudonym] = pool[index % len(pool)]
+            self.next_index[key] = index + 1
+        return self.users[pseudonym]
+
+    def voice_channel(self, pseudonym):
+        if pseudonym is None: return None
+        return self.voice.setdefault(pseudonym, fixtures.VOICE_CHANNEL_IDS[len(self.voice) % len(fixtures.VOICE_CHANNEL_IDS)])
+
+    def role(self, pseudonym):
+        return self.roles.setdefault(pseudonym, fixtures.ROLE_IDS[len(self.roles) % (len(fixtures.ROLE_IDS) - 1)])
+
+    def argument(self, token):
+        if token.startswith("<@&"): return f"<@&{self.role(token[3:-1])}>"
+        if token.startswith("<#"): return f"<#{fixtures.COMMAND_CHANNEL_ID}>"
+        if token.startswith("<@"): return self.member(token.lstrip("<@!").rstrip(">")).mention
+        if token.startswith("id:"): return str(self.member(token[3:]).id)
+        if token.startswith("w:"): return f"w{token[2:10]}"
+        return token
+
+    def content(self, event):
+        if "cmd" in event: return " ".join([f"{bot.bot.command_prefix}{event['cmd']}"] + [self.argument(token) for token in event["args"]])
+        if "link" in event: return f"https://x.com/replay/status/{int(event['link'], 16)}"
+        return "x" * event.get("len", 0)
+
+
+def build_calls(events, guild):
+    """(offset, kind, coroutine function) per event; all Discord models are built here so only handling is timed."""
+    mapper, view = Mapper(guild), bot.StatsView()
+    button = next(item for item in view.children if getattr(item, "custom_id", None) == STATS_BUTTON_ID)
+    calls, skipped = [], 0
+    for event in events:
+        author = mapper.member(event["u"], event.get("tr", 1), event.get("ad", 0))
+        if event["e"] == "msg":
+            # Embeds (link previews) are replayed as attachments: both make an art post count as media
+            message = fixtures.make_message(guild, CHANNEL_CLASSES.get(event["c"], fixtures.COMMAND_CHANNEL_ID), author, mapper.content(event),
+                                            attachments=event.get("att", 0) + event.get("emb", 0))
+            kind = f"command[{event['cmd']}]" if "cmd" in event else f"message[{event['c']}]"
+            calls.append((event["t"], kind, lambda message=message: bot.on_message(message)))
+        elif event["e"] == "int" and event.get("id") == STATS_BUTTON_ID:
+            interaction = fixtures.make_interaction(guild, author, STATS_BUTTON_ID)
+            calls.append((event["t"], "stats_button", lambda interaction=interaction: view._scheduled_task(button, interaction)))
+        elif event["e"] == "voice":
+            before = fixtures.make_voice_state(guild, mapper.voice_channel(event.get("from")))
+            after = fixtures.make_voice_state(guild, mapper.voice_channel(event.get("to")))
+            calls.append((event["t"], "voice", lambda member=author, before=before, after=after: bot.on_voice_state_update(member, before, after)))
+        else:
+            skipped += 1 # Clicks on non-persistent components (paginators) can't be replayed
+    return calls, skipped
+
+
+async def run_calls(calls, speed):
+    """Starts every call at offset / speed (back to back when speed is None); returns (wall seconds, [(kind, latency)], errors)."""
+    latencies, errors = [], []
+
+    async def run_one(kind, call, scheduled):
+        try: await call()
+        except Exception as e: errors.append(f"{kind}: {type(e).__name__}: {e}")
+        latencies.append((kind, time.perf_counter() - scheduled))
+
+    tasks, started = [], time.perf_counter()
+    for offset, kind, call in calls:
+        if speed:
+            scheduled = started + offset / speed
+            delay = scheduled - time.perf_counter()
+            if delay > 0: await asyncio.sleep(delay)
+        else:
+            scheduled = time.perf_counter()
+            await asyncio.sleep(0) # Like the gateway reader: other tasks get to run between events
+        tasks.append(asyncio.create_task(run_one(kind, call, scheduled)))
+    await asyncio.gather(*tasks)
+    return time.perf_counter() - started, latencies, errors
+
+
+async def drain():
+    """Waits for queued replies/edits and pending deletions to reach the stub."""
+    deadline = time.perf_counter() + DRAIN_TIMEOUT
+    while (bot.outbound.backlog or bot.deletion_queue.backlog or bot.deletion_queue.tasks) and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+
+
+async def replay(args, events):
+    stub = await StubDiscord(latency=args.latency).start()
+    stub.patch_client_base()
+    try:
+        await bot.bot.login("stub-token")
+        guild = fixtures.build_guild(bot.bot, int(args.users * args.member_ratio), args.seed)
+        if not bot.bot.get_cog("GlobalErrorHandler"): await bot.bot.add_cog(bot.GlobalErrorHandler(bot.bot))
+        bot.bot.add_view(bot.StatsView())
+        bot.attendance_sessions[guild.id] = {"replay": bot.AttendanceSession("Replay", guild.id, fixtures.VOICE_CHANNEL_IDS, 0, time.time(), fixtures.OWNER_ID)}
+
+        calls, skipped = build_calls(events, guild)
+        stub.reset_counters()
+        saves_before, (_, save_seconds_before, _) = sum(bot.metrics_saves.values.values()), bot.metrics_save_seconds.merged()
+        wall, latencies, errors = await run_calls(calls, args.speed)
+        await drain()
+        saves = sum(bot.metrics_saves.values.values()) - saves_before
+        save_seconds = bot.metrics_save_seconds.merged()[1] - save_seconds_before
+        stats_path = bot.get_guild_state(guild).path
+        return {"wall": wall, "latencies": latencies, "errors": errors, "skipped": skipped, "rest_calls": dict(stub.calls),
+                "rest_bytes": stub.bytes_received, "saves": saves, "save_seconds": save_seconds,
+                "stats_bytes": os.path.getsize(stats_path) if os.path.exists(stats_path) else 0}
+    finally:
+        await bot.bot.close()
+        await stub.stop()
+
+
+def summarize(args, events, run):
+    wall, latencies = run["wall"], run["latencies"]
+    recorded = events[-1]["t"] - events[0]["t"] if events else 0.0
+    by_kind = {}
+    for kind, seconds in latencies: by_kind.setdefault(kind, []).append(seconds)
+    rows = {}
+    for kind, values in sorted(by_kind.items(), key=lambda item: -len(item[1])):
+        values.sort()
+        rows[kind] = {"count": len(values), "avg_ms": statistics.fmean(values) * 1000, "p50_ms": percentile(values, 0.5) * 1000,
+                      "p95_ms": percentile(values, 0.95) * 1000, "p99_ms": percentile(values, 0.99) * 1000, "max_ms": values[-1] * 1000}
+    all_values = sorted(seconds for _, seconds in latencies)
+    return {"events": len(latencies), "skipped": run["skipped"], "errors": len(run["errors"]), "speed": args.speed or "max",
+            "recorded_seconds": recorded, "wall_seconds": wall, "throughput_per_s": len(latencies) / wall if wall else 0.0,
+            "p50_ms": percentile(all_values, 0.5) * 1000, "p99_ms": percentile(all_values, 0.99) * 1000,
+            "max_ms": all_values[-1] * 1000 if all_values else 0.0, "kinds": rows,
+            "rest_calls": run["rest_calls"], "rest_bytes": run["rest_bytes"],
+            "saves": run["saves"], "save_seconds": run["save_seconds"], "save_share": run["save_seconds"] / wall if wall else 0.0,
+            "stats_bytes": run["stats_bytes"], "save_bytes": run["saves"] * run["stats_bytes"]}
+
+
+def print_summary(summary, run):
+    speed = summary["speed"] if summary["speed"] == "max" else f"{summary['speed']:g}x"
+    print(f"{summary['events']:,} events ({summary['skipped']:,} skipped, {summary['errors']:,} errors) at {speed}: "
+          f"{summary['recorded_seconds']:.1f}s recorded, {summary['wall_seconds']:.2f}s replayed, {summary['throughput_per_s']:,.0f} events/s")
+    print(f"latency: p50 {summary['p50_ms']:.1f}ms | p99 {summary['p99_ms']:.1f}ms | max {summary['max_ms']:.1f}ms")
+    print(f"\n{'kind':<32} {'count':>8} {'avg':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for kind, row in summary["kinds"].items():
+        print(f"{kind:<32} {row['count']:>8,} " + " ".join(f"{row[key]:>7.1f}ms" for key in ("avg_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms")))
+    print(f"\npersistence: {summary['saves']:,} stats file saves, {summary['save_seconds']:.2f}s blocking the loop "
+          f"({summary['save_share']:.0%} of the replay), {summary['save_bytes'] / 1024 / 1024:,.1f} MB written ({summary['stats_bytes'] / 1024 / 1024:.1f} MB file)")
+    print(f"REST: {sum(summary['rest_calls'].values()):,} calls, {summary['rest_bytes'] / 1024:,.0f} KB sent")
+    for route, count in sorted(summary["rest_calls"].items(), key=lambda item: -item[1]): print(f"  {count:>8,}  {route}")
+    for error in run["errors"][:5]: print(f"error: {error}")
+
+
+async def make_sample(args):
+    """Writes a synthetic recording through bot.TrafficRecorder; offsets follow the scenario instead of the clock."""
+    rng = random.Random(args.seed)
+    guild = fixtures.build_guild(bot.bot, int(args.users * args.member_ratio), args.seed)
+    bot.bot.add_view(bot.StatsView())
+    recorder = bot.TrafficRecorder(args.recording, key="sample")
+    recorder.start()
+    tracked, untracked = fixtures.tracked_members(guild, 2000), fixtures.tracked_members(guild, 500, tracked=False)
+    admins = [m for m in guild.members[:5000] if any(role.id == ADMIN_ROLE_ID for role in m.roles)][:5]
+    links, in_voice = [], {}
+    duration = args.make_sample / 10 # About 10 events per second on average
+
+    def add(offset, record, *record_args):
+        record(*record_args)
+        recorder.buffer[-1]["t"] = round(offset, 3)
+
+    def message(offset, channel_id, author, content="", attachments=0):
+        add(offset, recorder.record_message, fixtures.make_message(guild, channel_id, author, content, attachments))
+
+    commands = [lambda: "!stats", lambda: "!top messages 10", lambda: f"!stats {rng.choice(tracked).mention}",
+                lambda: "!filteruserid msgcount>100 id", lambda: f"!addevent Giveaway{rng.randint(1, 3)} {' '.join(str(m.id) for m in rng.sample(tracked, 5))}"]
+    for i in range(args.make_sample):
+        offset = i * duration / args.make_sample
+        phase = offset / duration
+        author = rng.choice(tracked if rng.random() < 0.8 else untracked)
+        if 0.2 <= phase < 0.25 or rng.random() < 0.05: # Art burst (plus a trickle), some posts with a caption
+            message(offset, fixtures.ART_CHANNEL_ID, author, "look!" if rng.random() < 0.1 else "", attachments=rng.randint(1, 3))
+        elif 0.5 <= phase < 0.6 or rng.random() < 0.05: # Link flood during a campaign: reposts and chatter get deleted
+            roll = rng.random()
+            if roll < 0.2 and links: content = rng.choice(links)
+            elif roll < 0.3: content = "nice campaign"
+            else: content = f"https://x.com/user{author.id % 1000}/status/{rng.getrandbits(60)}"; links.append(content)
+            message(offset, fixtures.LOG_CHANNEL_ID, author, content)
+        elif 0.75 <= phase < 0.78 or rng.random() < 0.02: # Stats button stampede after an announcement
+            add(offset, recorder.record_interaction, fixtures.make_interaction(guild, author, STATS_BUTTON_ID))
+        elif rng.random() < 0.05: # Voice joins, moves and leaves
+            before = in_voice.get(author.id)
+            after = None if before and rng.random() < 0.4 else rng.choice(fixtures.VOICE_CHANNEL_IDS)
+            in_voice[author.id] = after
+            add(offset, recorder.record_voice, author, fixtures.make_voice_state(guild, before), fixtures.make_voice_state(guild, after))
+        elif admins and rng.random() < 0.04:
+            message(offset, fixtures.COMMAND_CHANNEL_ID, rng.choice(admins), rng.choice(commands)())
+        else:
+            message(offset, fixtures.COMMAND_CHANNEL_ID, author, "hello " * rng.randint(1, 12))
+    await recorder.stop()
+    counts = ", ".join(f"{event}: {count:,}" for event, count in sorted(recorder.counts.items()))
+    print(f"Sample recording written to {args.recording}: {recorder.events:,} events over {duration:.0f}s ({counts}), "
+          f"{os.path.getsize(args.recording) / 1024:.0f} KB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recording", help="gzip JSONL recording (written by the traffic recorder or --make-sample)")
+    parser.add_argument("--speed", default="1", help="replay speed factor (1, 10, ...) or 'max'")
+    parser.add_argument("--users", type=fixtures.parse_size, default=10_000, help="synthetic stats users (10k, 100k, 1m or a count)")
+    parser.add_argument("--member-ratio", type=float, default=1.0, help="fraction of stats users that are guild members")
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--limit", type=int, default=None, help="only replay the first N events")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated REST latency of the stand-in (seconds)")
+    parser.add_argument("--make-sample", type=int, default=None, metavar="EVENTS", help="write a synthetic recording with this many events instead")
+    parser.add_argument("--json", default=None, help="also write the summary to this file")
+    parser.add_argument("--verbose", action="store_true", help="show bot.py's own output while replaying")
+    args = parser.parse_args()
+    args.speed = None if args.speed.lower() == "max" else float(args.speed)
+
+    # bot.py logs per load/report; keep the output readable unless --verbose
+    if not args.verbose: logging.getLogger("eventtrack").setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        stats = fixtures.make_stats(args.users, args.seed)
+        stats["config"]["track_authorized_roles"] = [ADMIN_ROLE_ID]
+        bot.GUILD_DATA_DIR = tmp
+        fixtures.write_stats(bot.GuildState(fixtures.GUILD_ID).path, stats)
+        bot.get_guild_state(fixtures.GUILD_ID) # Loads the synthetic guild's partition
+        if args.make_sample:
+            if os.path.exists(args.recording): os.remove(args.recording) # The recorder appends
+            return asyncio.run(make_sample(args))
+        events = read_recording(args.recording, args.limit)
+        run = asyncio.run(replay(args, events))
+
+    summary = summarize(args, events, run)
+    print_summary(summary, run)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f: json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+Offline benchmark suite over synthetic guilds (benchmarks/fixtures.py) at 10k / 100k / 1M users.
+
+Times on_message per handler kind, saving / loading a guild partition, generate_excel with and without
+filters, !filteruserid, !delevent and generate_user_stats_embeds (render cache cold and warm),
+then compares every result with a stored baseline and flags regressions.
+
+Timings are seconds per operation (median of the repeats). Baselines are machine specific:
+record one on the machine that runs the comparison with --save-baseline.
+
+Usage: python benchmarks/run_benchmarks.py [--sizes 10k,100k] [--baseline benchmarks/baseline.json]
+                                           [--tolerance 0.25] [--save-baseline] [--fail-on-regression] [--json out.json]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import bot  # noqa: E402
+import fixtures  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+TIME_BUDGET = 2.0 # Seconds spent repeating one benchmark (at least MIN_REPEATS runs)
+MIN_REPEATS = 3
+MAX_REPEATS = 2000
+NOISE_FLOOR = 20e-6 # Differences below 20 µs per operation are never reported as regressions
+
+
+def measure(operation, budget=TIME_BUDGET, min_repeats=MIN_REPEATS, max_repeats=MAX_REPEATS):
+    """Runs operation() until the budget is used (at least min_repeats times); returns the median seconds per run."""
+    samples, started = [], time.perf_counter()
+    while len(samples) < max_repeats and (len(samples) < min_repeats or time.perf_counter() - started < budget):
+        t = time.perf_counter()
+        operation()
+        samples.append(time.perf_counter() - t)
+    return statistics.median(samples)
+
+
+async def ameasure(make_call, budget=TIME_BUDGET, min_repeats=MIN_REPEATS, max_repeats=MAX_REPEATS):
+    """measure() for coroutines: make_call(i) returns the awaitable of run i."""
+    samples, started = [], time.perf_counter()
+    while len(samples) < max_repeats and (len(samples) < min_repeats or time.perf_counter() - started < budget):
+        call = make_call(len(samples))
+        t = time.perf_counter()
+        await call
+        samples.append(time.perf_counter() - t)
+    return statistics.median(samples)
+
+
+def message_factories(guild):
+    """on_message handler kind -> function(i) building the i-th message of that kind."""
+    posted_links = bot.get_guild_state(guild).posted_links_set
+    tracked = fixtures.tracked_members(guild, 200)
+    untracked = fixtures.tracked_members(guild, 200, tracked=False)
+    author = lambda i: tracked[i % len(tracked)]
+    existing_link = next(iter(posted_links), "https://x.com/u/status/0")
+    return {
+        "message": lambda i: fixtures.make_message(guild, fixtures.COMMAND_CHANNEL_ID, author(i), "hello there"),
+        "untracked": lambda i: fixtures.make_message(guild, fixtures.COMMAND_CHANNEL_ID, untracked[i % len(untracked)], "hello there"),
+        "link": lambda i: fixtures.make_message(guild, fixtures.LOG_CHANNEL_ID, author(i), f"https://x.com/bench/status/{time.time_ns()}{i}"),
+        "link_duplicate": lambda i: fixtures.make_message(guild, fixtures.LOG_CHANNEL_ID, author(i), existing_link),
+        "link_invalid": lambda i: fixtures.make_message(guild, fixtures.LOG_CHANNEL_ID, author(i), "not a link"),
+        "art": lambda i: fixtures.make_message(guild, fixtures.ART_CHANNEL_ID, author(i), "", attachments=1),
+        "art_invalid": lambda i: fixtures.make_message(guild, fixtures.ART_CHANNEL_ID, author(i), "caption", attachments=1),
+    }
+
+
+async def bench_on_message(guild, results):
+    # Deletions are queued with a window longer than the run, so nothing is sent to Discord
+    bot.deletion_queue = bot.DeletionCoalescer(window=3600)
+    for kind, factory in message_factories(guild).items():
+        messages = [factory(i) for i in range(MAX_REPEATS)] # Built up front: only on_message is timed
+        results[f"on_message[{kind}]"] = await ameasure(lambda i: bot.on_message(messages[i]))
+    for task in bot.deletion_queue.tasks.values(): task.cancel()
+
+
+async def bench_reports(guild, results):
+    owner = guild.members[0]
+    no_filter = bot.UserFilter()
+    numeric = [bot.parse_numeric_filter(f) for f in ("msgcount>100", "joined>=2")]
+    with_filter = bot.UserFilter([[t for f in numeric for t in bot.UserFilter.terms_from_numeric_filter(f)] + [("role", fixtures.ROLE_IDS[0], True)]])
+    results["generate_excel"] = measure(lambda: bot.generate_excel(guild, no_filter, "messages"), min_repeats=1)
+    results["generate_excel[filtered]"] = measure(lambda: bot.generate_excel(guild, with_filter, None), min_repeats=1)
+    filter_args = ("msgcount>100", f"<@&{fixtures.ROLE_IDS[0]}>")
+    results["filter_user_id"] = await ameasure(lambda i: bot.filter_user_id.callback(fixtures.make_context(bot.bot, guild, owner, "filteruserid"), *filter_args), min_repeats=1)
+
+    members = fixtures.tracked_members(guild, 500)
+    async def cold(i):
+        bot.get_guild_state(guild).render_cache.clear()
+        await bot.generate_user_stats_embeds(members[i % len(members)])
+    results["generate_user_stats_embeds[cold]"] = await ameasure(cold)
+    results["generate_user_stats_embeds[warm]"] = await ameasure(lambda i: bot.generate_user_stats_embeds(members[i % len(members)]))
+
+    # Each run deletes a different event (event0 is on most records, later ones on fewer)
+    event_names = [f"event{j}" for j in range(fixtures.EVENT_COUNT)]
+    results["del_event"] = await ameasure(lambda i: bot.del_event.callback(fixtures.make_context(bot.bot, guild, owner, "delevent"), event_name=event_names[i]),
+                                          min_repeats=1, max_repeats=len(event_names))
+
+
+def run_size(label, users, args):
+    print(f"\n=== {label}: {users:,} users ===")
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        bot.GUILD_DATA_DIR = tmp
+        bot.guild_states.clear()
+        guild_state = bot.get_guild_state(fixtures.GUILD_ID)
+        started = time.perf_counter()
+        fixtures.write_stats(guild_state.path, fixtures.make_stats(users, args.seed))
+        print(f"stats file: {os.path.getsize(guild_state.path) / 1024 / 1024:.1f} MB ({time.perf_counter() - started:.1f}s to generate)")
+
+        # Baseline names predate guild partitions: load_data is GuildState.load, save_stats a direct write
+        results["load_data"] = measure(guild_state.load, min_repeats=1, max_repeats=5)
+        results["save_stats"] = measure(guild_state.flush, min_repeats=1, max_repeats=5)
+        started = time.perf_counter()
+        guild = fixtures.build_guild(bot.bot, int(users * args.member_ratio), args.seed)
+        print(f"guild: {guild.member_count:,} members ({time.perf_counter() - started:.1f}s to build)")
+
+        async def run_async():
+            await bench_on_message(guild, results)
+            await bench_reports(guild, results)
+        asyncio.run(run_async())
+    return results
+
+
+def format_seconds(seconds):
+    if seconds >= 1: return f"{seconds:.2f}s"
+    if seconds >= 1e-3: return f"{seconds * 1e3:.1f}ms"
+    return f"{seconds * 1e6:.0f}µs"
+
+
+def compare(current, baseline, tolerance):
+    """Prints current vs baseline per benchmark; returns the list of regressions."""
+    regressions = []
+    for size, results in current.items():
+        base = baseline.get("results", {}).get(size, {})
+        print(f"\n{size:<6} {'benchmark':<36} {'current':>10} {'baseline':>10} {'change':>8}")
+        for name, seconds in results.items():
+            old = base.get(name)
+            if old is None:
+                print(f"{'':<6} {name:<36} {format_seconds(seconds):>10} {'-':>10} {'new':>8}"); continue
+            change = seconds / old - 1 if old else 0.0
+            regressed = change > tolerance and seconds - old > NOISE_FLOOR
+            flag = "  REGRESSION" if regressed else ""
+            print(f"{'':<6} {name:<36} {format_seconds(seconds):>10} {format_seconds(old):>10} {change:>+7.0%}{flag}")
+            if regressed: regressions.append(f"{size} {name}: {format_seconds(old)} -> {format_seconds(seconds)} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10k,100k", help="comma separated: 10k, 100k, 1m or user counts")
+    parser.add_argument("--member-ratio", type=float, default=1.0, help="fraction of stats users that are guild members")
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="slowdown (fraction) reported as a regression")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline (merged per size)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 if a regression is found")
+    parser.add_argument("--json", default=None, help="also write the results to this file")
+    parser.add_argument("--verbose", action="store_true", help="show bot.py's own output while benchmarking")
+    args = parser.parse_args()
+    if not args.verbose: logging.getLogger("eventtrack").setLevel(logging.WARNING) # bot.py logs per load/report
+
+    current = {}
+    for label in args.sizes.split(","):
+        current[label.strip().lower()] = run_size(label.strip(), fixtures.parse_size(label), args)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f: baseline = json.load(f)
+    regressions = compare(current, baseline, args.tolerance)
+
+    meta = {"python": platform.python_version(), "machine": platform.machine(), "platform": platform.platform(terse=True),
+            "recorded": time.strftime("%Y-%m-%d %H:%M:%S")}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f: json.dump({"meta": meta, "results": current}, f, indent=2)
+    if args.save_baseline:
+        baseline = {"meta": meta, "results": {**baseline.get("results", {}), **current}}
+        with open(args.baseline, "w", encoding="utf-8") as f: json.dump(baseline, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+    elif baseline.get("meta"):
+        print(f"\nBaseline: Python {baseline['meta'].get('python')} on {baseline['meta'].get('platform')}, recorded {baseline['meta'].get('recorded')}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.tolerance:.0%}:")
+        for line in regressions: print(f"  {line}")
+        if args.fail_on_regression: sys.exit(1)
+    else:
+        print("\nNo regressions.")
+
+
+if __name__ == "__main__":
+    main()
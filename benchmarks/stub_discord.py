@@ -0,0 +1,243 @@
+"""
+Minimal local stand-in for the Discord REST API, used by the bulk action benchmarks.
+
+Serves just enough routes for a logged-in discord.Client to fetch a guild, run bans and
+role changes, and send/edit/delete messages and interaction responses, and counts every
+request per route so benchmarks can assert how many API calls an operation makes. Point
+discord.py at it with StubDiscord.patch_client_base().
+"""
+import asyncio
+import collections
+import json
+import time
+
+import discord
+from aiohttp import web
+
+GUILD_ID = 900000000000000001
+BOT_USER_ID = 900000000000000002
+
+
+def json_response(data, status=200, headers=None):
+    """JSON reply with the exact content type discord.py checks for."""
+    return web.Response(body=json.dumps(data).encode("utf-8"), status=status, headers=headers, content_type="application/json")
+
+
+def user_payload(user_id):
+    return {"id": str(user_id), "username": f"user{user_id}", "discriminator": "0", "global_name": None, "avatar": None}
+
+
+class StubDiscord:
+    """aiohttp app holding ban/role state and per-route call counters."""
+
+    def __init__(self, banned=(), unbannable=(), members=(), role_ids=(), latency=0.0, rate_limit_every=0, role_bucket=(10, 1.0)):
+        self.banned = set(banned)
+        self.unbannable = set(unbannable) # Bulk ban reports these as failed
+        self.members = {member_id: set() for member_id in members}
+        self.role_ids = list(role_ids)
+        self.latency = latency # Simulated per-request server latency (seconds)
+        self.rate_limit_every = rate_limit_every # Answer every Nth member-role request with a 429
+        self.role_bucket = role_bucket # (requests, seconds) budget of the member-role route, sent as X-RateLimit headers
+        self._bucket_start = 0.0
+        self._bucket_used = 0
+        self.calls = collections.Counter()
+        self.bytes_received = 0 # Request bodies of message/interaction routes (uploaded reports, embeds)
+        self._message_ids = 930000000000000001
+        self.rate_limited = 0
+        self._role_requests = 0
+        self.runner = None
+        self.port = None
+
+    def reset_counters(self):
+        self.calls.clear()
+        self.bytes_received = 0
+        self.rate_limited = 0
+
+    async def _delay(self):
+        if self.latency: await asyncio.sleep(self.latency)
+
+    def _count(self, key):
+        self.calls[key] += 1
+
+    # --- Routes ---
+    async def get_me(self, request):
+        self._count("GET /users/@me")
+        return json_response({**user_payload(BOT_USER_ID), "bot": True})
+
+    async def get_application(self, request):
+        self._count("GET /oauth2/applications/@me")
+        return json_response({"id": str(BOT_USER_ID), "name": "Stub Bot", "description": "", "icon": None, "bot_public": False,
+                              "bot_require_code_grant": False, "owner": user_payload(BOT_USER_ID), "verify_key": "", "flags": 0})
+
+    async def get_user(self, request):
+        self._count("GET /users/{id}")
+        await self._delay()
+        return json_response(user_payload(int(request.match_info["user_id"])))
+
+    async def get_guild(self, request):
+        self._count("GET /guilds/{id}")
+        roles = [{"id": str(GUILD_ID), "name": "@everyone", "permissions": "0", "position": 0, "color": 0, "hoist": False, "managed": False, "mentionable": False}]
+        roles += [{"id": str(role_id), "name": f"role{role_id}", "permissions": "0", "position": i + 1, "color": 0, "hoist": False, "managed": False, "mentionable": False} for i, role_id in enumerate(self.role_ids)]
+        return json_response({"id": str(GUILD_ID), "name": "Stub Guild", "owner_id": str(BOT_USER_ID), "roles": roles, "emojis": [], "stickers": [], "features": []})
+
+    async def get_bans(self, request):
+        self._count("GET /guilds/{id}/bans")
+        await self._delay()
+        limit = int(request.query.get("limit", 1000))
+        ids = sorted(self.banned)
+        if "after" in request.query: ids = [i for i in ids if i > int(request.query["after"])][:limit]
+        elif "before" in request.query: ids = [i for i in ids if i < int(request.query["before"])][-limit:]
+        else: ids = ids[:limit]
+        return json_response([{"user": user_payload(i), "reason": None} for i in ids])
+
+    async def get_ban(self, request):
+        self._count("GET /guilds/{id}/bans/{user_id}")
+        await self._delay()
+        user_id = int(request.match_info["user_id"])
+        if user_id not in self.banned: return json_response({"message": "Unknown Ban", "code": 10026}, status=404)
+        return json_response({"user": user_payload(user_id), "reason": None})
+
+    async def put_ban(self, request):
+        self._count("PUT /guilds/{id}/bans/{user_id}")
+        await self._delay()
+        user_id = int(request.match_info["user_id"])
+        if user_id in self.unbannable: return json_response({"message": "Missing Permissions", "code": 50013}, status=403)
+        self.banned.add(user_id)
+        return web.Response(status=204)
+
+    async def bulk_ban(self, request):
+        self._count("POST /guilds/{id}/bulk-ban")
+        await self._delay()
+        payload = await request.json()
+        banned, failed = [], []
+        for raw_id in payload["user_ids"]:
+            user_id = int(raw_id)
+            if user_id in self.unbannable or user_id in self.banned: failed.append(raw_id)
+            else: self.banned.add(user_id); banned.append(raw_id)
+        return json_response({"banned_users": banned, "failed_users": failed})
+
+    def _message_payload(self, channel_id, message_id=None):
+        if message_id is None: self._message_ids += 1
+        return {"id": str(message_id or self._message_ids), "channel_id": str(channel_id), "author": {**user_payload(BOT_USER_ID), "bot": True},
+                "content": "", "timestamp": "2024-01-01T00:00:00+00:00", "edited_timestamp": None, "tts": False, "mention_everyone": False,
+                "mentions": [], "mention_roles": [], "attachments": [], "embeds": [], "pinned": False, "type": 0}
+
+    async def _read_body(self, request):
+        self.bytes_received += len(await request.read())
+        await self._delay()
+
+    async def post_message(self, request):
+        self._count("POST /channels/{id}/messages")
+        await self._read_body(request)
+        return json_response(self._message_payload(request.match_info["channel_id"]))
+
+    async def edit_message(self, request):
+        self._count("PATCH /channels/{id}/messages/{id}")
+        await self._read_body(request)
+        return json_response(self._message_payload(request.match_info["channel_id"], request.match_info["message_id"]))
+
+    async def delete_message(self, request):
+        self._count("DELETE /channels/{id}/messages/{id}")
+        await self._delay()
+        return web.Response(status=204)
+
+    async def bulk_delete(self, request):
+        self._count("POST /channels/{id}/messages/bulk-delete")
+        await self._read_body(request)
+        return web.Response(status=204)
+
+    async def typing(self, request):
+        self._count("POST /channels/{id}/typing")
+        return web.Response(status=204)
+
+    async def interaction_callback(self, request):
+        self._count("POST /interactions/{id}/{token}/callback")
+        await self._read_body(request)
+        return json_response({"interaction": {"id": request.match_info["interaction_id"], "type": 3}})
+
+    async def webhook_message(self, request):
+        self._count(f"{request.method} /webhooks/{{id}}/{{token}}")
+        await self._read_body(request)
+        return json_response(self._message_payload(0, request.match_info.get("message_id")))
+
+    def _rate_limited(self, retry_after, scope):
+        self.rate_limited += 1
+        return json_response({"message": "You are being rate limited.", "retry_after": retry_after, "global": False}, status=429,
+                             headers={"Retry-After": str(retry_after), "X-RateLimit-Scope": scope, "Via": "1.1 stub"})
+
+    async def member_role(self, request):
+        self._count(f"{request.method} /guilds/{{id}}/members/{{user_id}}/roles/{{role_id}}")
+        self._role_requests += 1
+        if self.rate_limit_every and self._role_requests % self.rate_limit_every == 0:
+            return self._rate_limited(0.05, "shared")
+
+        limit, window = self.role_bucket
+        now = time.monotonic()
+        if now - self._bucket_start >= window: self._bucket_start, self._bucket_used = now, 0
+        reset_after = window - (now - self._bucket_start)
+        if self._bucket_used >= limit: return self._rate_limited(round(reset_after, 3), "user")
+        self._bucket_used += 1
+        headers = {"X-RateLimit-Limit": str(limit), "X-RateLimit-Remaining": str(limit - self._bucket_used),
+                   "X-RateLimit-Reset-After": f"{reset_after:.3f}", "X-RateLimit-Bucket": "stub-member-roles"}
+
+        await self._delay()
+        user_id, role_id = int(request.match_info["user_id"]), int(request.match_info["role_id"])
+        if user_id not in self.members: return json_response({"message": "Unknown Member", "code": 10007}, status=404)
+        if request.method == "PUT": self.members[user_id].add(role_id)
+        else: self.members[user_id].discard(role_id)
+        return web.Response(status=204, headers=headers)
+
+    # --- Lifecycle ---
+    def app(self):
+        app = web.Application()
+        prefix = "/api/v10"
+        app.router.add_get(f"{prefix}/users/@me", self.get_me)
+        app.router.add_get(f"{prefix}/oauth2/applications/@me", self.get_application)
+        app.router.add_get(f"{prefix}/users/{{user_id}}", self.get_user)
+        app.router.add_get(f"{prefix}/guilds/{{guild_id}}", self.get_guild)
+        app.router.add_get(f"{prefix}/guilds/{{guild_id}}/bans", self.get_bans)
+        app.router.add_get(f"{prefix}/guilds/{{guild_id}}/bans/{{user_id}}", self.get_ban)
+        app.router.add_put(f"{prefix}/guilds/{{guild_id}}/bans/{{user_id}}", self.put_ban)
+        app.router.add_post(f"{prefix}/guilds/{{guild_id}}/bulk-ban", self.bulk_ban)
+        app.router.add_put(f"{prefix}/guilds/{{guild_id}}/members/{{user_id}}/roles/{{role_id}}", self.member_role)
+        app.router.add_delete(f"{prefix}/guilds/{{guild_id}}/members/{{user_id}}/roles/{{role_id}}", self.member_role)
+        app.router.add_post(f"{prefix}/channels/{{channel_id}}/messages", self.post_message)
+        app.router.add_post(f"{prefix}/channels/{{channel_id}}/messages/bulk-delete", self.bulk_delete)
+        app.router.add_patch(f"{prefix}/channels/{{channel_id}}/messages/{{message_id}}", self.edit_message)
+        app.router.add_delete(f"{prefix}/channels/{{channel_id}}/messages/{{message_id}}", self.delete_message)
+        app.router.add_post(f"{prefix}/channels/{{channel_id}}/typing", self.typing)
+        app.router.add_post(f"{prefix}/interactions/{{interaction_id}}/{{token}}/callback", self.interaction_callback)
+        app.router.add_post(f"{prefix}/webhooks/{{application_id}}/{{token}}", self.webhook_message)
+        app.router.add_patch(f"{prefix}/webhooks/{{application_id}}/{{token}}/messages/{{message_id}}", self.webhook_message)
+        return app
+
+    async def start(self):
+        self.runner = web.AppRunner(self.app())
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self.runner: await self.runner.cleanup()
+
+    def patch_client_base(self):
+        """Routes every discord.py REST request to this server."""
+        discord.http.Route.BASE = f"http://127.0.0.1:{self.port}/api/v10"
+
+
+async def connect(stub):
+    """Logs a discord.Client in against the stub and returns (client, guild)."""
+    stub.patch_client_base()
+    client = discord.Client(intents=discord.Intents.none())
+    await client.login("stub-token")
+    guild = await client.fetch_guild(GUILD_ID)
+    stub.reset_counters()
+    return client, guild
+
+
+def timed():
+    """Returns a callable giving seconds elapsed since creation."""
+    start = time.perf_counter()
+    return lambda: time.perf_counter() - start
@@ -13,6 +13,173 @@ import traceback
 import string
 from dotenv import load_dotenv
 import time as time_module
+import io
+import operator
+import bisect
+from collections import OrderedDict
+import numpy as np
+import aiohttp
+import heapq
+import itertools
+import csv
+import contextlib
+import contextvars
+import threading
+import cProfile
+import pstats
+import tracemalloc
+import marshal
+import array
+import sys
+import logging
+import logging.handlers
+from collections import deque
+import gzip
+import hashlib
+import queue
+import atexit
+import shutil
+import socket
+import sqlite3
+import concurrent.futures
+from discord.ext.commands.view import StringView
+from aiohttp import web
+
+load_dotenv() # Load .env at import so module-level settings can read it
+
+# --- LOGGING ---
+# Records are queued from the event loop and written (formatted, tracebacks included) by a background thread
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_LEVELS = os.getenv("LOG_LEVELS", "") # Per subsystem, e.g. "scan=DEBUG,moderation=WARNING,discord=WARNING"
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower() # "text" or "json" (one object per line, for log shipping)
+LOG_FILE_PATH = os.getenv("LOG_FILE_PATH", "") # Optional rotating log file, in addition to stdout
+LOG_FILE_MAX_BYTES = 10 * 1024 * 1024
+LOG_FILE_BACKUPS = 5
+LOG_QUEUE_SIZE = 10000 # Records waiting for the writer thread; further records are dropped (and counted)
+LOG_DUPLICATE_WINDOW = float(os.getenv("LOG_DUPLICATE_WINDOW", "60")) # Seconds over which repeats of one message are limited
+LOG_DUPLICATE_BURST = int(os.getenv("LOG_DUPLICATE_BURST", "5")) # Repeats let through per window (0 disables suppression)
+LOG_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "suppressed"}
+
+class JsonLogFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, any extra= fields and the formatted exception."""
+    def format(self, record):
+        entry = {"time": datetime.datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+                 "level": record.levelname, "logger": record.name, "message": record.getMessage()}
+        entry.update((key, value) for key, value in vars(record).items() if key not in LOG_RECORD_FIELDS)
+        if getattr(record, "suppressed", 0): entry["suppressed"] = record.suppressed
+        if record.exc_info: entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class TextLogFormatter(logging.Formatter):
+    def format(self, record):
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        return f"{text} ({suppressed} similar message(s) suppressed)" if suppressed else text
+
+class DuplicateLogFilter(logging.Filter):
+    """
+    Lets through LOG_DUPLICATE_BURST records per message template (logger, level, unformatted message) per window and
+    drops the rest; the first record after a suppressed stretch carries the number dropped. Thread-safe.
+    """
+    def __init__(self, window=LOG_DUPLICATE_WINDOW, burst=LOG_DUPLICATE_BURST):
+        super().__init__()
+        self.window, self.burst = window, burst
+        self.windows = {} # (logger, level, template) -> [window start, records let through, records dropped]
+        self.suppressed = 0
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.burst <= 0: return True
+        key, now = (record.name, record.levelno, str(record.msg)), time_module.monotonic()
+        with self._lock:
+            state = self.windows.get(key)
+            if state is None or now - state[0] >= self.window:
+                if len(self.windows) > 10000: self.windows.clear() # Bound memory if messages are not templated
+                record.suppressed = state[2] if state else 0
+                self.windows[key] = [now, 1, 0]
+                return True
+            if state[1] < self.burst:
+                state[1] += 1
+                record.suppressed, state[2] = state[2], 0
+                return True
+            state[2] += 1
+            self.suppressed += 1
+            return False
+
+class LogQueueHandler(logging.handlers.QueueHandler):
+    """Non-blocking handler for the event loop: merges the message arguments, leaves formatting to the writer thread."""
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        record.msg, record.args = record.getMessage(), None # Freeze the arguments; they may change after the call
+        return record
+
+    def enqueue(self, record):
+        try: self.queue.put_nowait(record)
+        except queue.Full: self.dropped += 1 # Never block the loop on a slow stdout
+
+class LogWriter(logging.handlers.QueueListener):
+    """Writer thread; loggers registered in 'routes' (file-only logs) go to their own handlers instead of the shared ones."""
+    def __init__(self, log_queue, *handlers):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.routes = {}
+
+    def handle(self, record):
+        for handler in self.routes.get(record.name, self.handlers):
+            if record.levelno >= handler.level: handler.handle(record)
+
+def parse_log_levels(spec):
+    """'scan=DEBUG,discord=WARNING' -> {'eventtrack.scan': DEBUG, 'discord': WARNING}; bare names are bot subsystems."""
+    levels = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, level = part.partition("=")
+        name, level = name.strip(), logging.getLevelName(level.strip().upper())
+        if not isinstance(level, int):
+            logging.getLogger("eventtrack").warning("Ignoring invalid log level in LOG_LEVELS: %s", part)
+            continue
+        levels[name if name == "discord" or name.startswith(("eventtrack", "discord.")) else f"eventtrack.{name}"] = level
+    return levels
+
+log_queue = queue.Queue(LOG_QUEUE_SIZE)
+log_queue_handler = LogQueueHandler(log_queue)
+log_duplicate_filter = DuplicateLogFilter()
+log_queue_handler.addFilter(log_duplicate_filter)
+
+def setup_logging():
+    """Routes the bot's and discord.py's loggers through the queue to stdout (and LOG_FILE_PATH); starts the writer thread."""
+    formatter = JsonLogFormatter() if LOG_FORMAT == "json" else TextLogFormatter("%(asctime)s %(levelname)-7s %(name)s: %(message)s")
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if LOG_FILE_PATH: handlers.append(logging.handlers.RotatingFileHandler(LOG_FILE_PATH, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUPS, encoding="utf-8"))
+    for handler in handlers: handler.setFormatter(formatter)
+    for name in ("eventtrack", "discord"):
+        logger = logging.getLogger(name)
+        logger.setLevel(LOG_LEVEL.upper())
+        logger.addHandler(log_queue_handler)
+        logger.propagate = False
+    for name, level in parse_log_levels(LOG_LEVELS).items(): logging.getLogger(name).setLevel(level)
+    writer = LogWriter(log_queue, *handlers)
+    writer.start()
+    return writer
+
+def stop_logging():
+    """Writes out what is still queued and stops the writer thread (safe to call twice)."""
+    if log_writer._thread: log_writer.stop()
+
+log_writer = setup_logging()
+atexit.register(stop_logging)
+log = logging.getLogger("eventtrack") # Startup, shutdown and anything without a subsystem
+log_data = logging.getLogger("eventtrack.data") # Guild stats files, jobs.json, report store
+log_commands = logging.getLogger("eventtrack.commands")
+log_tracking = logging.getLogger("eventtrack.tracking") # on_message link/art/message tracking
+log_moderation = logging.getLogger("eventtrack.moderation") # Deletion queue
+log_scan = logging.getLogger("eventtrack.scan") # Channel history scans
+log_reports = logging.getLogger("eventtrack.reports")
+log_jobs = logging.getLogger("eventtrack.jobs")
+log_outbound = logging.getLogger("eventtrack.outbound")
+log_stats_button = logging.getLogger("eventtrack.stats_button")
+log_perf = logging.getLogger("eventtrack.perf") # Metrics endpoint, loop watchdog, traffic recorder
 
 # --- BOT SETUP ---
 intents = discord.Intents.default()
@@ -22,7 +189,21 @@ intents.guilds = True
 intents.members = True
 intents.voice_states = True
 
-class SilentBot(commands.Bot):
+def parse_shard_ids(spec):
+    """'0-3,6' -> [0, 1, 2, 3, 6] (empty spec -> None: every shard)."""
+    shard_ids = []
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        first, _, last = part.partition("-")
+        shard_ids.extend(range(int(first), int(last or first) + 1))
+    return sorted(set(shard_ids)) or None
+
+# Sharding: SHARD_COUNT alone runs every shard in this process (AutoShardedBot); with SHARD_IDS each process
+# runs its own shard range, and processes share state through the storage coordinator (STORAGE_DB_PATH)
+SHARD_COUNT = os.getenv("SHARD_COUNT", "").strip().lower() # Total shards, or "auto" for Discord's recommendation; empty: no sharding
+SHARD_IDS = parse_shard_ids(os.getenv("SHARD_IDS", "")) # Shards run by this process, e.g. "0-3" (needs a numeric SHARD_COUNT)
+SHARDED = bool(SHARD_COUNT or SHARD_IDS)
+
+class SilentBot(commands.AutoShardedBot if SHARDED else commands.Bot):
     async def on_command_error(self, ctx, error):
         # Silently delete message on CheckFailure or MissingPermissions errors
         if isinstance(error, commands.CheckFailure) or isinstance(error, commands.MissingPermissions):
@@ -40,33 +221,642 @@ class SilentBot(commands.Bot):
             if cog:
                 await cog.on_command_error(ctx, error)
             else: # If Cog not found (could happen at startup), print basic error
-                print(f"GlobalErrorHandler Cog not found. Unhandled error: {error}")
-                traceback.print_exception(type(error), error, error.__traceback__)
+                log_commands.error("GlobalErrorHandler Cog not found. Unhandled error: %s", error, exc_info=error)
         except Exception as e:
-            print(f"Error occurred while calling error handler: {e}")
-            traceback.print_exception(type(error), error, error.__traceback__)
+            log_commands.error("Error occurred while calling error handler: %s", e, exc_info=error)
+
+
+# Lean memory mode: no member list download at startup, only members in voice channels stay cached (attendance) and a
+# small message cache; reports and bulk role jobs fetch the members they need in bulk (fetch_members)
+LEAN_MEMORY = os.getenv("LEAN_MEMORY", "").strip().lower() in ("1", "true", "yes")
+LEAN_MAX_MESSAGES = int(os.getenv("LEAN_MAX_MESSAGES", "100")) # Message cache size in lean mode (discord.py default: 1000; 0 disables it)
+
+bot_options = {"shard_ids": SHARD_IDS} if SHARD_IDS else {}
+if SHARD_COUNT and SHARD_COUNT != "auto": bot_options["shard_count"] = int(SHARD_COUNT)
+if LEAN_MEMORY:
+    member_cache_flags = discord.MemberCacheFlags.none()
+    member_cache_flags.voice = True
+    bot_options.update(chunk_guilds_at_startup=False, member_cache_flags=member_cache_flags, max_messages=LEAN_MAX_MESSAGES or None)
+bot = SilentBot(command_prefix="!", intents=intents, case_insensitive=True, **bot_options)
+
+# --- METRICS ---
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1") # Local only by default
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108")) # 0 disables the HTTP endpoint
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+def _format_metric_value(value):
+    value = float(value)
+    if value == float("inf"): return "+Inf"
+    return str(int(value)) if value.is_integer() else repr(value)
+
+def _format_labels(names, values):
+    if not names: return ""
+    escape = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{n}="{escape(v)}"' for n, v in zip(names, values)) + "}"
+
+class Metric:
+    """One metric family: a value per label tuple, or a callback read at export time (fn)."""
+    kind = "untyped"
+    def __init__(self, name, help_text, labels=(), fn=None):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.fn = fn # Returns a number, or {label value (or tuple): number}
+        self.values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def get(self, **labels):
+        return self.collect().get(self._key(labels), 0)
+
+    def collect(self):
+        """{label tuple: value}"""
+        if self.fn is None: return dict(self.values)
+        values = self.fn()
+        if not isinstance(values, dict): return {(): values}
+        return {key if isinstance(key, tuple) else (str(key),): value for key, value in values.items()}
+
+    def samples(self):
+        return [(self.name, self.label_names, key, value) for key, value in sorted(self.collect().items())]
+
+class Counter(Metric):
+    kind = "counter"
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(Metric):
+    kind = "gauge"
+    def set(self, value, **labels):
+        self.values[self._key(labels)] = value
+
+class Histogram(Metric):
+    """
+    Cumulative-bucket histogram (seconds by default); quantiles are interpolated inside buckets
+    and clamped to the smallest and largest value observed, so they never exceed the real maximum.
+    """
+    kind = "histogram"
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+        self.values = {} # label tuple -> [per-bucket counts (+Inf last), sum, count, min, max]
+
+    def observe(self, value, **labels):
+        series = self.values.get(self._key(labels))
+        if series is None:
+            series = self.values[self._key(labels)] = [[0] * (len(self.buckets) + 1), 0.0, 0, value, value]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+        if value < series[3]:
+            series[3] = value
+        elif value > series[4]:
+            series[4] = value
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Observes the duration of the with-block."""
+        started = time_module.perf_counter()
+        try: yield
+        finally: self.observe(time_module.perf_counter() - started, **labels)
+
+    def _matching(self, labels):
+        wanted = {self.label_names.index(n): str(v) for n, v in labels.items()}
+        return [series for key, series in self.values.items() if all(key[i] == v for i, v in wanted.items())]
+
+    def merged(self, **labels):
+        """(bucket counts, sum, count) over all series matching the given labels (others are merged)."""
+        counts, total, count = [0] * (len(self.buckets) + 1), 0.0, 0
+        for series_counts, series_sum, series_count, _, _ in self._matching(labels):
+            counts = [a + b for a, b in zip(counts, series_counts)]
+            total += series_sum
+            count += series_count
+        return counts, total, count
+
+    def quantile(self, q, **labels):
+        matching = self._matching(labels)
+        counts, _, count = self.merged(**labels)
+        if not count: return 0.0
+        smallest = min(series[3] for series in matching)
+        largest = max(series[4] for series in matching)
+        rank, seen = q * count, 0
+        for i, bucket_count in enumerate(counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else largest
+                estimate = lower + (upper - lower) * (rank - seen) / bucket_count
+                return min(max(estimate, smallest), largest)
+            seen += bucket_count
+        return largest
+
+    def samples(self):
+        out = []
+        names = self.label_names + ("le",)
+        for key, (counts, total, count, _, _) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                out.append((f"{self.name}_bucket", names, key + (_format_metric_value(bound),), cumulative))
+            out.append((f"{self.name}_sum", self.label_names, key, total))
+            out.append((f"{self.name}_count", self.label_names, key, count))
+        return out
+
+class MetricsRegistry:
+    """Holds the bot's metrics and renders them in the Prometheus text format."""
+    def __init__(self):
+        self.metrics = {}
+
+    def _add(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labels=(), fn=None): return self._add(Counter(name, help_text, labels, fn))
+    def gauge(self, name, help_text, labels=(), fn=None): return self._add(Gauge(name, help_text, labels, fn))
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS): return self._add(Histogram(name, help_text, labels, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            try: samples = metric.samples()
+            except Exception as e: # A failing callback must not break the whole scrape
+                log_perf.warning("Metric %s could not be collected: %s", metric.name, e)
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, label_names, key, value in samples:
+                lines.append(f"{name}{_format_labels(label_names, key)} {_format_metric_value(value)}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+METRICS_STARTED = time_module.time()
+metrics.gauge("eventtrack_start_time_seconds", "Unix time the bot process started.", fn=lambda: METRICS_STARTED)
+metrics.gauge("eventtrack_gateway_latency_seconds", "Discord gateway heartbeat latency.", fn=lambda: bot.latency if bot.latency == bot.latency else 0) # NaN before connecting
+# Message pipeline
+metrics_messages = metrics.counter("eventtrack_messages_total", "Guild messages handled by on_message, per handler kind.", ("kind",))
+metrics_message_seconds = metrics.histogram("eventtrack_on_message_seconds", "Time spent in on_message tracking logic (before command processing), per handler kind.", ("kind",))
+metrics_moderation_deletes = metrics.counter("eventtrack_moderation_deletes_total", "Messages queued for deletion in moderated channels, per reason.", ("reason",))
+metrics.counter("eventtrack_deleted_messages_total", "Messages deleted by the deletion queue.", fn=lambda: deletion_queue.counters["deleted"])
+metrics.counter("eventtrack_delete_api_calls_total", "Delete requests made by the deletion queue, per type.", ("type",),
+                fn=lambda: {"bulk": deletion_queue.counters["bulk_calls"], "single": deletion_queue.counters["single_calls"]})
+# Persistence
+metrics_saves = metrics.counter("eventtrack_stats_saves_total", "Stats file writes (GuildState.flush()), per result.", ("result",))
+metrics_save_seconds = metrics.histogram("eventtrack_stats_save_seconds", "Time a stats file write blocks the event loop.")
+metrics_stats_bytes = metrics.gauge("eventtrack_stats_file_bytes", "Size of a guild's stats file (or storage document) after its last save.", ("guild",))
+# Reports
+metrics_reports = metrics.counter("eventtrack_reports_total", "Excel reports built, per result.", ("result",))
+metrics_report_seconds = metrics.histogram("eventtrack_report_build_seconds", "Time generate_excel() takes to build a report.")
+# Queues and caches
+metrics.gauge("eventtrack_outbound_backlog", "Sends/edits/operations waiting in the outbound scheduler.", fn=lambda: outbound.backlog)
+metrics.gauge("eventtrack_deletion_backlog", "Messages waiting in the deletion queue.", fn=lambda: deletion_queue.backlog)
+metrics.gauge("eventtrack_bulk_jobs_running", "Bulk jobs currently running.", fn=lambda: len(bulk_jobs.tasks))
+metrics.gauge("eventtrack_attendance_sessions", "Events with open attendance tracking.", fn=lambda: sum(len(s) for s in attendance_sessions.values()))
+metrics.counter("eventtrack_render_cache_requests_total", "Stats embed render cache lookups (all guilds), per result.", ("result",),
+                fn=lambda: {"hit": sum(gs.render_cache.hits for gs in list(guild_states.values())), "miss": sum(gs.render_cache.misses for gs in list(guild_states.values()))})
+metrics.gauge("eventtrack_render_cache_entries", "Stats embeds held in the render caches of all guilds.", fn=lambda: sum(len(gs.render_cache) for gs in list(guild_states.values())))
+metrics.gauge("eventtrack_guild_partitions", "Guild state partitions loaded.", fn=lambda: len(guild_states))
+metrics.gauge("eventtrack_cached_members", "Members in discord.py's member cache (all guilds).", fn=lambda: sum(len(guild.members) for guild in bot.guilds))
+metrics.gauge("eventtrack_member_lru_entries", "Fetched members held by the lean memory mode LRU.", fn=lambda: len(member_lru))
+# Logging
+metrics.gauge("eventtrack_log_queue_depth", "Log records waiting for the log writer thread.", fn=lambda: log_queue.qsize())
+metrics.counter("eventtrack_log_records_dropped_total", "Log records dropped because the log queue was full.", fn=lambda: log_queue_handler.dropped)
+metrics.counter("eventtrack_log_records_suppressed_total", "Repeated log records dropped by the duplicate filter.", fn=lambda: log_duplicate_filter.suppressed)
+
+async def handle_metrics_request(request):
+    return web.Response(text=metrics.render(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+metrics_runner = None
+
+async def start_metrics_server():
+    """Serves GET /metrics on METRICS_HOST:METRICS_PORT (skipped when METRICS_PORT is 0)."""
+    global metrics_runner
+    if not METRICS_PORT or metrics_runner: return
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics_request)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try: await web.TCPSite(runner, METRICS_HOST, METRICS_PORT).start()
+    except OSError as e:
+        log_perf.error("Could not start metrics endpoint on %s:%s: %s", METRICS_HOST, METRICS_PORT, e)
+        await runner.cleanup()
+        return
+    metrics_runner = runner
+    log_perf.info("Metrics endpoint: http://%s:%s/metrics", METRICS_HOST, METRICS_PORT)
+
+async def stop_metrics_server():
+    global metrics_runner
+    if metrics_runner: await metrics_runner.cleanup()
+    metrics_runner = None
+
+# --- COMMAND TRACING ---
+SLOW_COMMAND_THRESHOLD = float(os.getenv("SLOW_COMMAND_THRESHOLD", "5.0")) # Seconds; slower invocations go to the slow-command log
+SLOW_COMMAND_LOG_PATH = os.getenv("SLOW_COMMAND_LOG_PATH", "slow_commands.log")
+SLOW_COMMAND_LOG_MAX_BYTES = 1024 * 1024 # Rotated at 1 MB
+SLOW_COMMAND_LOG_BACKUPS = 3
+TRACE_MAX_SPANS = 200 # Span details kept per invocation (totals per kind always include every span)
+SIZE_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000)
+
+current_trace = contextvars.ContextVar("current_trace", default=None) # CommandTrace of the command running in this task
+recent_slow_commands = deque(maxlen=10) # One-line summaries for !perf
+
+metrics_command_seconds = metrics.histogram("eventtrack_command_seconds", "Command latency from before_invoke to after_invoke, per command and status.", ("command", "status"))
+metrics_command_span_seconds = metrics.histogram("eventtrack_command_span_seconds", "Time a command spent in persistence/REST/report work, per command and span kind.", ("command", "kind"))
+metrics_command_arg_size = metrics.histogram("eventtrack_command_arg_size", "Argument sizes per command (ids, filters, attachment_bytes...).", ("command", "arg"),
+                                             buckets=SIZE_BUCKETS + (1 << 20, 8 << 20))
+metrics_slow_commands = metrics.counter("eventtrack_slow_commands_total", "Invocations slower than SLOW_COMMAND_THRESHOLD, per command.", ("command",))
+
+class CommandTrace:
+    """Timing of one command invocation: argument sizes and spans (persistence, rest, report) inside it."""
+    def __init__(self, ctx):
+        self.command = ctx.command.qualified_name
+        self.where = f"guild={ctx.guild.id if ctx.guild else None} channel={ctx.channel.id} user={ctx.author.id}"
+        self.started = time_module.perf_counter()
+        self.args = {}
+        self.spans = [] # (kind, name, offset from start, seconds), first TRACE_MAX_SPANS only
+        self.totals = {} # kind -> [seconds, count]
+        self.finished = False
+
+    def add_span(self, kind, name, started, ended=None):
+        if self.finished: return # Background work (e.g. a bulk job) outliving the command
+        seconds = (ended or time_module.perf_counter()) - started
+        total = self.totals.setdefault(kind, [0.0, 0])
+        total[0] += seconds
+        total[1] += 1
+        if len(self.spans) < TRACE_MAX_SPANS: self.spans.append((kind, name, started - self.started, seconds))
+
+    def format(self, elapsed, status):
+        """Multi-line slow-command log entry with the span breakdown."""
+        args = " ".join(f"{k}={v}" for k, v in self.args.items()) or "-"
+        in_spans = sum(seconds for seconds, _ in self.totals.values())
+        breakdown = " | ".join(f"{kind} {seconds:.3f}s ({count})" for kind, (seconds, count) in sorted(self.totals.items(), key=lambda item: -item[1][0]))
+        breakdown = (breakdown + " | " if breakdown else "") + f"other {max(0.0, elapsed - in_spans):.3f}s" # Concurrent spans can add up to more than the total
+        longest = sorted(self.spans, key=lambda span: -span[3])[:20]
+        lines = [f"!{self.command} {elapsed:.3f}s {status} {self.where} args: {args}", f"  spans: {breakdown}"]
+        lines += [f"    {kind:<11} {seconds:8.3f}s  at +{offset:.3f}s  {name}" for kind, name, offset, seconds in longest]
+        if len(self.spans) >= TRACE_MAX_SPANS: lines.append(f"    (first {TRACE_MAX_SPANS} spans recorded)")
+        return "\n".join(lines)
+
+def trace_note(**fields):
+    """Records argument sizes (e.g. ids=1200) on the running command's trace, if any."""
+    trace = current_trace.get()
+    if trace is not None and not trace.finished: trace.args.update(fields)
+
+def record_span(kind, name, started):
+    """Adds a span that began at perf_counter() 'started' and ends now to the running command's trace, if any."""
+    trace = current_trace.get()
+    if trace is not None: trace.add_span(kind, name, started)
+
+@contextlib.contextmanager
+def trace_span(kind, name):
+    started = time_module.perf_counter()
+    try: yield
+    finally: record_span(kind, name, started)
+
+def open_rotating_log(name, path, max_bytes=SLOW_COMMAND_LOG_MAX_BYTES, backups=SLOW_COMMAND_LOG_BACKUPS):
+    """
+    File-only logger writing timestamped entries to a rotating file (created on the first entry; no file if path is empty).
+    Entries go through the log queue, so the file is written by the log writer thread.
+    """
+    logger = logging.getLogger(name)
+    logger.propagate = False # File only
+    logger.setLevel(logging.INFO)
+    if path and not logger.handlers:
+        handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8", delay=True)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        log_writer.routes[name] = [handler]
+        logger.addHandler(LogQueueHandler(log_queue)) # No duplicate filter: every entry is kept
+    return logger
+
+slow_command_log = open_rotating_log("eventtrack.slow_commands", SLOW_COMMAND_LOG_PATH)
+
+@bot.before_invoke
+async def start_command_trace(ctx):
+    """Starts the invocation's trace (runs after checks and argument conversion)."""
+    trace = CommandTrace(ctx)
+    values = []
+    for value in list(ctx.args[2 if ctx.cog else 1:]) + list(ctx.kwargs.values()): # Skip self/ctx
+        values.extend(value if isinstance(value, (list, tuple)) else [value])
+    trace.args["args"] = len(values)
+    trace.args["ids"] = sum(1 for v in values if isinstance(v, str) and (v.isdigit() or MENTION_ID_PATTERN.match(v)))
+    if ctx.message.attachments:
+        trace.args["attachments"] = len(ctx.message.attachments)
+        trace.args["attachment_bytes"] = sum(a.size for a in ctx.message.attachments)
+    current_trace.set(trace)
+
+@bot.after_invoke
+async def finish_command_trace(ctx):
+    """Records the invocation's latency, argument sizes and spans; writes slow ones to the slow-command log."""
+    trace = current_trace.get()
+    if trace is None or trace.finished: return
+    trace.finished = True
+    current_trace.set(None)
+    elapsed = time_module.perf_counter() - trace.started
+    status = "error" if ctx.command_failed else "ok"
+    metrics_command_seconds.observe(elapsed, command=trace.command, status=status)
+    for arg, size in trace.args.items(): metrics_command_arg_size.observe(size, command=trace.command, arg=arg)
+    for kind, (seconds, _) in trace.totals.items(): metrics_command_span_seconds.observe(seconds, command=trace.command, kind=kind)
+    if elapsed >= SLOW_COMMAND_THRESHOLD:
+        metrics_slow_commands.inc(command=trace.command)
+        recent_slow_commands.append(f"{datetime.datetime.now().strftime('%m-%d %H:%M:%S')} !{trace.command} {elapsed:.1f}s {status}")
+        slow_command_log.info(trace.format(elapsed, status)) # Written by the log writer thread
+
+# --- EVENT LOOP WATCHDOG ---
+LOOP_LAG_INTERVAL = 0.25 # Seconds between lag samples
+LOOP_STALL_THRESHOLD = float(os.getenv("LOOP_STALL_THRESHOLD", "0.5")) # Lag (seconds) counted as a stall
+LOOP_STALL_LOG_PATH = os.getenv("LOOP_STALL_LOG_PATH", "loop_stalls.log")
+LOOP_STACK_MAX_FRAMES = 40 # Innermost frames kept from a captured stack
+
+metrics_loop_lag = metrics.histogram("eventtrack_loop_lag_seconds", "Event loop lag: how late a sleep of LOOP_LAG_INTERVAL woke up.")
+metrics_loop_stalls = metrics.counter("eventtrack_loop_stalls_total", "Event loop stalls at or above LOOP_STALL_THRESHOLD.")
+
+class LoopWatchdog:
+    """
+    A ticker task samples event loop lag every 'interval' seconds. A daemon thread watches the ticks and,
+    once the loop has been blocked for 'threshold' seconds, captures the loop thread's stack
+    (sys._current_frames) and the running task while the blocking code is still on it.
+    The stall is logged with its full duration when the loop ticks again.
+    """
+    def __init__(self, interval=LOOP_LAG_INTERVAL, threshold=LOOP_STALL_THRESHOLD, log=None):
+        self.interval = interval
+        self.threshold = threshold
+        self.log = log
+        self.loop = None
+        self.loop_thread_id = None
+        self.task = None
+        self.thread = None
+        self.last_tick = 0.0 # time.monotonic() of the last tick (read by the watchdog thread)
+        self.capture = None # (task description, stack text) of the stall in progress
+        self.stalls = deque(maxlen=20) # (timestamp, seconds, task description, stack text)
+        self.max_lag = 0.0
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Starts the ticker on the running loop and the watchdog thread (no-op if already running)."""
+        if self.task and not self.task.done(): return
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread_id = threading.get_ident()
+        self.last_tick = time_module.monotonic()
+        self._stop.clear()
+        self.task = asyncio.create_task(self._tick(), name="loop-watchdog-ticker")
+        self.thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self.thread.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self.task: self.task.cancel()
+        if self.thread: await asyncio.to_thread(self.thread.join, 1.0)
+
+    async def _tick(self):
+        while True:
+            expected = time_module.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time_module.monotonic()
+            self.last_tick = now
+            lag = max(0.0, now - expected)
+            metrics_loop_lag.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+            with self._lock: capture, self.capture = self.capture, None
+            if lag >= self.threshold: self._record_stall(lag, capture)
+
+    def _watch(self):
+        while not self._stop.wait(min(self.interval, self.threshold) / 2):
+            blocked = time_module.monotonic() - self.last_tick - self.interval
+            if blocked < self.threshold or self.capture is not None: continue
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is None: continue
+            stack = "".join(traceback.format_stack(frame, limit=LOOP_STACK_MAX_FRAMES))
+            del frame
+            task = asyncio.current_task(self.loop) # Reads the loop's current-task slot; safe from another thread
+            task_desc = f"{task.get_name()} ({task.get_coro().__qualname__})" if task else "no task (loop callback)"
+            with self._lock:
+                if self.last_tick + self.interval + self.threshold <= time_module.monotonic(): self.capture = (task_desc, stack)
+
+    def _record_stall(self, lag, capture):
+        task_desc, stack = capture or ("unknown (not captured; stall ended between watchdog checks)", "")
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.stalls.append((timestamp, lag, task_desc, stack))
+        metrics_loop_stalls.inc()
+        log_perf.warning("Event loop stalled for %.2fs (task: %s).%s", lag, task_desc, f" Stack written to {LOOP_STALL_LOG_PATH}." if self.log and self.log.handlers else "",
+                         extra={"stall_seconds": round(lag, 3)})
+        if self.log: self.log.warning(f"loop stalled {lag:.3f}s (threshold {self.threshold:g}s), task: {task_desc}\n{stack}")
+
+loop_watchdog = LoopWatchdog(log=open_rotating_log("eventtrack.loop_stalls", LOOP_STALL_LOG_PATH))
+
+# --- STORAGE COORDINATOR ---
+# Shared store for processes that each run a range of shards: guild partitions and bulk jobs are documents in one
+# SQLite database (WAL mode: readers never block the writer). Every write is appended to a change feed; each process
+# polls it and reloads whatever another process changed, so its own caches (stats tables, leaderboards, render caches)
+# never serve stale data. Guilds belong to exactly one shard, so a partition normally has a single writer.
+STORAGE_DB_PATH = os.getenv("STORAGE_DB_PATH", "") # SQLite file shared by all shard processes on this host (empty: JSON files)
+STORAGE_POLL_INTERVAL = float(os.getenv("STORAGE_POLL_INTERVAL", "1.0")) # Seconds between change feed polls
+STORAGE_CHANGES_KEEP = 10000 # Change feed rows kept (older ones are pruned; processes only read rows newer than their last poll)
+STORAGE_PRUNE_INTERVAL = 60.0
+STORAGE_BUSY_TIMEOUT = 0.05 # Seconds SQLite itself waits for a lock on the storage thread before raising
+STORAGE_LOCK_TIMEOUT = 30.0 # Seconds a call keeps retrying while another process holds the write lock
+STORAGE_RETRY_DELAY = 0.05 # First retry delay; doubled per retry up to 1 s
+metrics_storage_retries = metrics.counter("eventtrack_storage_retries_total", "Storage calls retried because another process held the database lock.")
+metrics_storage_invalidations = metrics.counter("eventtrack_storage_invalidations_total", "Documents reloaded because another process changed them, per kind.", ("kind",))
+
+class StorageCoordinator:
+    """
+    Versioned JSON documents ('guild:<id>', 'job:<id>') and counters in a SQLite database shared by several processes.
+    Every database call runs on one dedicated thread that owns the connection, so the event loop never waits for
+    SQLite. Writes run in BEGIN IMMEDIATE transactions with a short busy timeout; while another process holds the
+    write lock they are retried with backoff (asyncio.sleep) for up to STORAGE_LOCK_TIMEOUT seconds.
+    Writes append to the 'changes' table; poll() hands documents changed by other writers to the watch() callbacks.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS documents (key TEXT PRIMARY KEY, data BLOB NOT NULL, version INTEGER NOT NULL,
+                                              writer TEXT NOT NULL, updated REAL NOT NULL);
+        CREATE TABLE IF NOT EXISTS changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, writer TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+    """
 
+    def __init__(self, path, writer):
+        self.path = path
+        self.writer = writer # Identifies this process in the change feed (its own writes are not reloaded)
+        self.db = None # Opened on the storage thread by start()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="storage")
+        self.last_seq = 0
+        self.watchers = [] # (key prefix, callback(key, data or None))
+        self._task = None
+        self._last_prune = 0.0
+
+    # Storage thread side
+    def _connect(self):
+        if self.db is not None: return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        db = sqlite3.connect(self.path, timeout=STORAGE_BUSY_TIMEOUT, isolation_level=None) # Autocommit; transactions are explicit
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL") # Durable at checkpoints; a power loss can only drop the last commits
+            db.executescript(self.SCHEMA)
+            self.last_seq = db.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0] # Older changes are already in the documents
+        except sqlite3.Error:
+            db.close()
+            raise
+        self.db = db
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.db
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        self.db.execute("COMMIT")
+
+    def _get(self, key):
+        row = self.db.execute("SELECT data FROM documents WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _items(self, prefix):
+        return self.db.execute("SELECT key, data FROM documents WHERE substr(key, 1, ?) = ? ORDER BY key", (len(prefix), prefix)).fetchall()
+
+    def _put(self, key, data):
+        with self._transaction() as db:
+            db.execute("INSERT INTO documents (key, data, version, writer, updated) VALUES (?, ?, 1, ?, ?) "
+                       "ON CONFLICT(key) DO UPDATE SET data = excluded.data, version = version + 1, writer = excluded.writer, updated = excluded.updated",
+                       (key, data, self.writer, time_module.time()))
+            db.execute("INSERT INTO changes (key, writer) VALUES (?, ?)", (key, self.writer))
+
+    def _delete(self, key):
+        with self._transaction() as db:
+            if db.execute("DELETE FROM documents WHERE key = ?", (key,)).rowcount:
+                db.execute("INSERT INTO changes (key, writer) VALUES (?, ?)", (key, self.writer))
+
+    def _next_id(self, name, minimum):
+        with self._transaction() as db:
+            db.execute("INSERT INTO counters (name, value) VALUES (?, MAX(1, ?)) ON CONFLICT(name) DO UPDATE SET value = MAX(value + 1, ?)",
+                       (name, minimum, minimum))
+            return db.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()[0]
+
+    def _changes(self):
+        """(key, current data or None) of the documents other writers changed since the last call, each key once, in change order."""
+        rows = self.db.execute("SELECT seq, key, writer FROM changes WHERE seq > ? ORDER BY seq", (self.last_seq,)).fetchall()
+        if not rows: return []
+        changed = list(dict.fromkeys(key for _, key, writer in rows if writer != self.writer))
+        changes = [(key, self._get(key)) for key in changed]
+        self.last_seq = rows[-1][0] # Only advanced once the documents were read
+        return changes
+
+    def _prune(self):
+        with self._transaction() as db:
+            db.execute("DELETE FROM changes WHERE seq <= (SELECT MAX(seq) FROM changes) - ?", (STORAGE_CHANGES_KEEP,))
+
+    def _call(self, function, *args):
+        self._connect()
+        return function(*args)
+
+    def _close(self):
+        if self.db is not None: self.db.close()
+        self.db = None
+
+    @staticmethod
+    def _is_busy(error):
+        return isinstance(error, sqlite3.OperationalError) and ("locked" in str(error) or "busy" in str(error))
+
+    # Event loop side
+    async def run(self, function, *args):
+        """Runs function(*args) on the storage thread, retrying while the database is locked by another process."""
+        loop = asyncio.get_running_loop()
+        deadline, delay = loop.time() + STORAGE_LOCK_TIMEOUT, STORAGE_RETRY_DELAY
+        while True:
+            try:
+                return await loop.run_in_executor(self.executor, self._call, function, *args)
+            except sqlite3.OperationalError as e:
+                if not self._is_busy(e) or loop.time() + delay > deadline: raise
+                metrics_storage_retries.inc()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+    def run_blocking(self, function, *args):
+        """run() for code without a running event loop (import, tests) and first use of a guild that was not preloaded."""
+        deadline, delay = time_module.monotonic() + STORAGE_LOCK_TIMEOUT, STORAGE_RETRY_DELAY
+        while True:
+            try:
+                return self.executor.submit(self._call, function, *args).result()
+            except sqlite3.OperationalError as e:
+                if not self._is_busy(e) or time_module.monotonic() + delay > deadline: raise
+                metrics_storage_retries.inc()
+            time_module.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+    async def get(self, key):
+        """Document data (bytes), or None."""
+        return await self.run(self._get, key)
+
+    def put_blocking(self, key, data):
+        """put() that waits on the calling thread, for code running without an event loop."""
+        self.run_blocking(self._put, key, data)
+
+    def get_blocking(self, key):
+        """get() that waits on the calling thread; WAL reads do not wait for writers, so this stays short."""
+        return self.run_blocking(self._get, key)
+
+    async def items(self, prefix):
+        """(key, data) of every document whose key starts with prefix."""
+        return await self.run(self._items, prefix)
+
+    async def put(self, key, data):
+        await self.run(self._put, key, data)
+
+    async def delete(self, key):
+        await self.run(self._delete, key)
+
+    async def next_id(self, name, minimum=1):
+        """Allocates the next value of a counter shared by all processes (never below minimum)."""
+        return await self.run(self._next_id, name, minimum)
+
+    def watch(self, prefix, callback):
+        """callback(key, data) runs for every key starting with prefix that another process changed (data None: deleted)."""
+        self.watchers.append((prefix, callback))
+
+    async def poll(self):
+        """Dispatches the documents other processes changed since the last poll; returns how many were dispatched."""
+        changes = await self.run(self._changes)
+        for key, data in changes:
+            for prefix, callback in self.watchers:
+                if not key.startswith(prefix): continue
+                try: callback(key, data)
+                except Exception as e: log_data.exception("Reloading %s after an external change failed: %s", key, e)
+        return len(changes)
+
+    async def prune(self):
+        await self.run(self._prune)
+
+    async def start(self):
+        """Opens the database (on the storage thread) and starts polling the change feed."""
+        await self.run(self._connect)
+        if self._task is None: self._task = asyncio.create_task(self._poll_loop(), name="storage-poll")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError): await self._task
+            self._task = None
+        await asyncio.get_running_loop().run_in_executor(self.executor, self._close)
+
+    async def _poll_loop(self):
+        while True:
+            await asyncio.sleep(STORAGE_POLL_INTERVAL)
+            try:
+                await self.poll()
+                if time_module.monotonic() - self._last_prune >= STORAGE_PRUNE_INTERVAL:
+                    self._last_prune = time_module.monotonic()
+                    await self.prune()
+            except sqlite3.Error as e:
+                log_data.warning("Storage change feed poll failed: %s", e)
 
-bot = SilentBot(command_prefix="!", intents=intents, case_insensitive=True)
+storage = StorageCoordinator(STORAGE_DB_PATH, f"{socket.gethostname()}:{os.getpid()}") if STORAGE_DB_PATH else None
 
 # --- CONFIGURATION & DATA ---
-STATS_FILE_PATH = "stats.json"
-stats_data = {}
-config_data = {}
-posted_links_list = []
-posted_links_set = set()
-# << MODIFIED: Store lists of channel IDs >>
-twitter_log_channel_ids = [] # List of Twitter log channel IDs
-art_channel_ids = []       # List of Art channel IDs
-AUTHORIZED_ROLES = [] # Initialize empty, load from config
-TARGET_ROLES = [] # Initialize empty, load from config
-STATS_AUTHORIZED_ROLES = [] # Initialize empty, load from config
-stats_channel_id = None
-stats_message_id = None
-stats_cooldowns = {}
-user_last_stats_click = {}
-# << NEW: Track when cooldown message was last sent >>
-user_last_cooldown_message_sent = {} # Stores {user_id_str: timestamp}
+STATS_FILE_PATH = "stats.json" # Legacy single-guild file, moved into GUILD_DATA_DIR on first start
+GUILD_DATA_DIR = os.getenv("GUILD_DATA_DIR", "guilds") # One stats file per guild: <dir>/<guild ID>.json
+LEGACY_GUILD_ID = os.getenv("LEGACY_GUILD_ID") # Guild that owns the legacy stats.json (guessed from its channels if unset)
+STATS_FLUSH_DELAY = float(os.getenv("STATS_FLUSH_DELAY", "0")) # Seconds a guild's changes may wait to be saved (0: save immediately)
 
 DEFAULT_USER_TEMPLATE = lambda: {
     "events": [],
@@ -76,101 +866,864 @@ DEFAULT_USER_TEMPLATE = lambda: {
     "art_count": 0 # Art Counter
 }
 
-def load_data():
-    """Loads statistics and configuration data from the JSON file."""
-    global stats_data, config_data, posted_links_list, posted_links_set
-    global twitter_log_channel_ids, art_channel_ids, AUTHORIZED_ROLES, TARGET_ROLES, STATS_AUTHORIZED_ROLES
-    global stats_channel_id, stats_message_id, stats_cooldowns, user_last_stats_click
-    global user_last_cooldown_message_sent # << NEW >>
-
-    if os.path.exists(STATS_FILE_PATH):
-        try:
-            with open(STATS_FILE_PATH, "r", encoding='utf-8') as f:
-                stats_data = json.load(f)
-            print(f"'{STATS_FILE_PATH}' loaded successfully.")
-        except (json.JSONDecodeError, IOError) as e:
-            print(f"ERROR: Failed to load {STATS_FILE_PATH}: {e}. Starting with empty stats.")
-            stats_data = {}
-    else:
-        print(f"'{STATS_FILE_PATH}' not found. Starting with empty stats.")
-        stats_data = {}
+# --- COLUMNAR STATS TABLE ---
+# Numeric per-user fields mirrored into NumPy columns (same names as the parse_numeric_filter fields)
+STATS_TABLE_FIELDS = ("total_message_count", "tweet_count", "joined", "won", "art_count")
 
-    # Get config data or create default
-    config_data = stats_data.setdefault("config", {})
-
-    # << MODIFIED: Load lists of channel IDs >>
-    twitter_log_channel_ids = config_data.get("twitter_log_channel_ids", []) # Load list or default empty
-    art_channel_ids = config_data.get("art_channel_ids", [])             # Load list or default empty
-
-    # Use .get with default empty list for roles
-    AUTHORIZED_ROLES = config_data.get("track_authorized_roles", [])
-    TARGET_ROLES = config_data.get("track_target_roles", [])
-    STATS_AUTHORIZED_ROLES = config_data.get("stats_authorized_roles", [])
-    stats_channel_id = config_data.get("stats_channel_id")
-    stats_message_id = config_data.get("stats_message_id")
-    # Ensure keys are strings when loading cooldowns
-    stats_cooldowns = {str(k): v for k, v in config_data.get("stats_cooldowns", {}).items()}
-
-    # Load user data
-    posted_links_list = stats_data.setdefault("posted_twitter_links", [])
-    posted_links_set = set(posted_links_list)
-    # Ensure keys are strings when loading user click times
-    user_last_stats_click = {str(k): v for k, v in stats_data.setdefault("user_last_stats_click", {}).items()}
-    # << NEW: Load cooldown message sent times >>
-    user_last_cooldown_message_sent = {str(k): v for k, v in stats_data.setdefault("user_last_cooldown_message_sent", {}).items()}
-
-
-    # Check/update existing users for the new art_count field
-    for uid, data in stats_data.items():
-        # Skip special keys like 'config', process only user IDs
-        if uid.isdigit() and isinstance(data, dict):
-            data.setdefault("art_count", 0)
-
-
-load_data() # Load data when the bot starts
+class UserStatsTable:
+    """
+    Columnar in-memory mirror of the per-user numeric stats, stored in NumPy arrays.
+    Write paths keep it in sync through get_user_data() / notify_user_changed(), and reports run
+    vectorized UserFilter masks and argsorts on it instead of walking stats_data.
+    Member presence, target-role tracking and role bitmasks are refreshed lazily for rows marked stale.
+    """
+    MAX_ROLE_BITS = 64
+
+    def __init__(self, capacity=1024):
+        self.size = 0
+        self.capacity = 0
+        self.user_ids = [] # row -> user ID string
+        self.row_of = {} # user ID string -> row
+        self.columns = {field: np.zeros(0, dtype=np.int64) for field in STATS_TABLE_FIELDS}
+        self.role_mask = np.zeros(0, dtype=np.uint64) # Bit set per registered filter role
+        self.tracked = np.zeros(0, dtype=bool) # In the guild and (if target roles set) has a target role
+        self.member_stale = np.zeros(0, dtype=bool) # Member-derived columns need a refresh
+        self.role_bits = {} # role ID -> bit index in role_mask
+        self.guild_id = None
+        self.target_roles = ()
+        self._grow(capacity)
+
+    def _grow(self, min_capacity):
+        new_capacity = max(min_capacity, self.capacity * 2, 1024)
+        def grown(arr):
+            out = np.zeros(new_capacity, dtype=arr.dtype)
+            out[:self.size] = arr[:self.size]
+            return out
+        self.columns = {field: grown(col) for field, col in self.columns.items()}
+        self.role_mask = grown(self.role_mask)
+        self.tracked = grown(self.tracked)
+        self.member_stale = grown(self.member_stale)
+        self.capacity = new_capacity
+
+    @staticmethod
+    def field_values(data):
+        """Numeric values of a user record, in STATS_TABLE_FIELDS order."""
+        return (data.get("total_message_count", 0), len(data.get("twitter_links", ())),
+                len(data.get("events", ())), len(data.get("winners", ())), data.get("art_count", 0))
+
+    def rebuild(self, user_records):
+        """Rebuilds the whole table from (user ID string, record) pairs."""
+        records = list(user_records)
+        self.size = 0
+        self.user_ids = [uid for uid, _ in records]
+        self.row_of = {uid: row for row, uid in enumerate(self.user_ids)}
+        self.role_bits = {}
+        if len(records) > self.capacity: self._grow(len(records))
+        n = len(records)
+        values = [self.field_values(data) for _, data in records]
+        for idx, field in enumerate(STATS_TABLE_FIELDS):
+            self.columns[field][:n] = np.fromiter((v[idx] for v in values), dtype=np.int64, count=n)
+        self.role_mask[:n] = 0
+        self.tracked[:n] = False
+        self.member_stale[:n] = True
+        self.size = n
+
+    def update_user(self, user_id_str, values):
+        """Inserts or updates one user's numeric columns (O(1)). 'values' come from field_values()."""
+        row = self.row_of.get(user_id_str)
+        if row is None:
+            if self.size == self.capacity: self._grow(self.size + 1)
+            row = self.size
+            self.size += 1
+            self.row_of[user_id_str] = row
+            self.user_ids.append(user_id_str)
+            self.role_mask[row] = 0
+            self.member_stale[row] = True
+        for field, value in zip(STATS_TABLE_FIELDS, values):
+            self.columns[field][row] = value
+
+    def mark_member_stale(self, user_id_str):
+        """Flags a user's member-derived columns (presence/roles) for refresh on the next query."""
+        row = self.row_of.get(user_id_str)
+        if row is not None: self.member_stale[row] = True
+
+    def _member_role_mask(self, member):
+        mask = 0
+        for role in member.roles:
+            bit = self.role_bits.get(role.id)
+            if bit is not None: mask |= 1 << bit
+        return mask
+
+    def _ensure_role_bits(self, guild, role_ids, members=None):
+        """Assigns bits to roles used by a filter and fills them from role.members (once per role; from 'members' in lean mode)."""
+        missing = [rid for rid in dict.fromkeys(role_ids) if rid not in self.role_bits]
+        if not missing: return
+        if len(self.role_bits) + len(missing) > self.MAX_ROLE_BITS:
+            # Start over with only the roles needed now
+            self.role_bits = {}
+            self.role_mask[:self.size] = 0
+            missing = list(dict.fromkeys(role_ids))
+        for role_id in missing:
+            bit = len(self.role_bits)
+            self.role_bits[role_id] = bit
+            if members is not None: continue # Filled when every row is refreshed from 'members'
+            role = guild.get_role(role_id)
+            if role is None: continue
+            rows = [self.row_of[str(m.id)] for m in role.members if str(m.id) in self.row_of]
+            if rows: self.role_mask[rows] |= np.uint64(1 << bit)
+
+    def _refresh_members(self, guild, target_roles, members=None):
+        """Refreshes presence/tracking/role bits for stale rows (all rows after a guild or target role change, or with 'members')."""
+        target_roles = tuple(target_roles)
+        if self.guild_id != guild.id or self.target_roles != target_roles or members is not None:
+            self.guild_id, self.target_roles = guild.id, target_roles
+            self.member_stale[:self.size] = True
+        get_member = members.get if members is not None else guild.get_member
+        stale_rows = np.flatnonzero(self.member_stale[:self.size])
+        for row in stale_rows.tolist():
+            member = get_member(int(self.user_ids[row]))
+            if member is None:
+                self.tracked[row] = False
+                self.role_mask[row] = 0
+                continue
+            self.tracked[row] = not target_roles or any(role.id in target_roles for role in member.roles)
+            self.role_mask[row] = self._member_role_mask(member)
+        self.member_stale[stale_rows] = False
+
+    def query(self, guild, user_filter, target_roles, members=None):
+        """
+        Returns row indices of tracked guild members that pass 'user_filter' (vectorized).
+        'members' (user ID -> Member, from fetch_members) replaces the guild's member cache in lean memory mode.
+        """
+        filter_role_ids = [term[1] for clause in user_filter.clauses for term in clause if term[0] == "role"]
+        self._ensure_role_bits(guild, filter_role_ids, members)
+        self._refresh_members(guild, target_roles, members)
+        mask = self.tracked[:self.size].copy()
+        if user_filter.clauses: mask &= user_filter.mask(self)
+        return np.flatnonzero(mask)
+
+    def candidate_ids(self, user_filter):
+        """User IDs (int) that can pass 'user_filter' by their numbers alone: the members a lean mode report has to fetch."""
+        return [int(self.user_ids[row]) for row in np.flatnonzero(user_filter.mask(self, roles=False)).tolist()]
+
+    def role_bit(self, role_id):
+        return np.uint64(1 << self.role_bits[role_id])
+
+
+# --- LEADERBOARDS ---
+# !top metric name -> (STATS_TABLE_FIELDS field, display label)
+LEADERBOARD_METRICS = {
+    "messages": ("total_message_count", "Messages"),
+    "tweets": ("tweet_count", "Tweets"),
+    "art": ("art_count", "Art Posts"),
+    "won": ("won", "Events Won"),
+    "joined": ("joined", "Events Joined"),
+}
+LEADERBOARD_ALIASES = {"msgcount": "messages", "twtcount": "tweets", "artcount": "art", "wins": "won", "events": "joined"}
 
-# --- HELPER FUNCTIONS ---
-def save_stats():
-    """Saves the current statistics and configuration data to the JSON file."""
-    global twitter_log_channel_ids, art_channel_ids, stats_channel_id, stats_message_id
-    global user_last_cooldown_message_sent # << NEW >>
-    try:
-        # Update config data (taking from global variables)
-        # << MODIFIED: Save lists of channel IDs >>
-        config_data["twitter_log_channel_ids"] = twitter_log_channel_ids
-        config_data["art_channel_ids"] = art_channel_ids
-        config_data["track_authorized_roles"] = AUTHORIZED_ROLES
-        config_data["track_target_roles"] = TARGET_ROLES
-        config_data["stats_authorized_roles"] = STATS_AUTHORIZED_ROLES
-        config_data["stats_channel_id"] = stats_channel_id
-        config_data["stats_message_id"] = stats_message_id
-        # Ensure keys are strings when saving cooldowns
-        config_data["stats_cooldowns"] = {str(k): v for k, v in stats_cooldowns.items()}
-
-        # Add config and other lists/dicts to the main stats_data
-        stats_data["config"] = config_data
-        stats_data["posted_twitter_links"] = sorted(list(posted_links_set))
-        # Ensure keys are strings when saving user click times
-        stats_data["user_last_stats_click"] = {str(k): v for k, v in user_last_stats_click.items()}
-        # << NEW: Save cooldown message sent times >>
-        stats_data["user_last_cooldown_message_sent"] = {str(k): v for k, v in user_last_cooldown_message_sent.items()}
-
-
-        # Ensure all user data has art_count before saving (safety check)
+class Leaderboard:
+    """
+    Incrementally maintained ranking for one metric.
+    Users are grouped in buckets by value, with a sorted list of the distinct values; each bucket keeps its
+    user IDs sorted as it is updated, so an update is a bisect and reading the top K walks the highest
+    buckets in order without sorting. Zero values are not ranked.
+    """
+    def __init__(self):
+        self._scores = {} # user ID string -> value
+        self._buckets = {} # value -> sorted list of int user IDs (tie order)
+        self._values = [] # Distinct values, ascending
+
+    def __len__(self):
+        return len(self._scores)
+
+    def update(self, user_id_str, value):
+        old_value = self._scores.get(user_id_str)
+        if old_value == value: return
+        if old_value is not None: self._remove(user_id_str, old_value)
+        if value > 0:
+            self._scores[user_id_str] = value
+            bucket = self._buckets.get(value)
+            if bucket is None:
+                bucket = self._buckets[value] = []
+                bisect.insort(self._values, value)
+            bisect.insort(bucket, int(user_id_str))
+
+    def _remove(self, user_id_str, value):
+        del self._scores[user_id_str]
+        bucket = self._buckets[value]
+        user_id = int(user_id_str)
+        index = bisect.bisect_left(bucket, user_id)
+        if index < len(bucket) and bucket[index] == user_id:
+            del bucket[index]
+        if not bucket:
+            del self._buckets[value]
+            del self._values[bisect.bisect_left(self._values, value)]
+
+    def clear(self):
+        self._scores.clear()
+        self._buckets.clear()
+        self._values.clear()
+
+    def rebuild(self, scores):
+        """Replaces the ranking with (user ID string, value) pairs, sorting each bucket once."""
+        self.clear()
+        for user_id_str, value in scores:
+            if value <= 0: continue
+            self._scores[user_id_str] = value
+            self._buckets.setdefault(value, []).append(int(user_id_str))
+        for bucket in self._buckets.values():
+            bucket.sort()
+        self._values.extend(sorted(self._buckets))
+
+    def iter_top(self):
+        """Yields (user ID string, value) from the highest value down (ties by user ID)."""
+        for value in reversed(self._values):
+            for user_id in self._buckets[value]:
+                yield str(user_id), value
+
+# --- STATS EMBED RENDER CACHE ---
+RENDER_CACHE_MAX_ENTRIES = 1000 # Per guild
+
+class RenderCache:
+    """LRU cache of rendered stats embeds (as dicts), keyed by user ID and validated by the user's data version."""
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict() # user ID string -> (version, [embed dicts])
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id_str, version):
+        entry = self._entries.get(user_id_str)
+        if entry is None or entry[0] != version:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id_str)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, user_id_str, version, payload):
+        self._entries[user_id_str] = (version, payload)
+        self._entries.move_to_end(user_id_str)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+# --- LEAN MEMBER CACHE ---
+# In lean memory mode (LEAN_MEMORY) the gateway member cache only holds members in voice channels. Commands that
+# need other members fetch them in bulk with fetch_members(); results are kept in a small LRU for a few minutes.
+LEAN_MEMBER_CACHE_SIZE = int(os.getenv("LEAN_MEMBER_CACHE_SIZE", "20000")) # Fetched members kept between lookups (upper limit)
+LEAN_MEMBER_CACHE_SHARE = 0.1 # The LRU also keeps at most this share of the members of all guilds
+LEAN_MEMBER_TTL = 300.0 # Seconds a fetched member (or "not a member") is reused; updates of uncached members are not received
+MEMBER_QUERY_BATCH = 100 # User IDs per gateway member request (Discord's limit)
+MEMBER_LIST_PAGE = 1000 # Members per page of the REST member list
+metrics_member_fetches = metrics.counter("eventtrack_member_fetches_total", "Member lookups by fetch_members() in lean memory mode, per source (cache, query, list).", ("source",))
+
+class MemberLRU:
+    """LRU cache of fetched members, keyed by (guild ID, user ID); None records a user who is not a member."""
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict() # (guild ID, user ID) -> (fetched at, Member or None)
+
+    def get(self, guild_id, user_id):
+        """(True, Member or None) for a fresh entry, (False, None) otherwise."""
+        entry = self._entries.get((guild_id, user_id))
+        if entry is None or time_module.monotonic() - entry[0] > self.ttl: return False, None
+        self._entries.move_to_end((guild_id, user_id))
+        return True, entry[1]
+
+    def put(self, guild_id, user_id, member):
+        self._entries[(guild_id, user_id)] = (time_module.monotonic(), member)
+        self._entries.move_to_end((guild_id, user_id))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def resize(self, max_entries):
+        self.max_entries = max_entries
+        while len(self._entries) > max_entries:
+            self._entries.popitem(last=False)
+
+    def discard(self, guild_id, user_id):
+        self._entries.pop((guild_id, user_id), None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+member_lru = MemberLRU(LEAN_MEMBER_CACHE_SIZE, LEAN_MEMBER_TTL)
+
+def lean_member_cache_limit():
+    """LRU size: LEAN_MEMBER_CACHE_SHARE of the members of all guilds, capped at LEAN_MEMBER_CACHE_SIZE (at least one query batch)."""
+    members = sum(guild.member_count or 0 for guild in bot.guilds)
+    return max(MEMBER_QUERY_BATCH, min(LEAN_MEMBER_CACHE_SIZE, int(members * LEAN_MEMBER_CACHE_SHARE)))
+
+async def fetch_members(guild, user_ids):
+    """
+    {user ID: Member} for those of 'user_ids' who are members of the guild. Outside lean memory mode this reads the
+    member cache. In lean mode, members that are neither cached nor in the LRU are fetched in bulk: gateway member
+    queries of 100 IDs, or one pass over the REST member list when that takes fewer requests (large reports).
+    """
+    found = {}
+    if not LEAN_MEMORY:
+        for user_id in user_ids:
+            member = guild.get_member(user_id)
+            if member is not None: found[user_id] = member
+        return found
+    missing = []
+    for user_id in dict.fromkeys(user_ids):
+        member = guild.get_member(user_id) # Members in voice channels are still cached
+        if member is None:
+            hit, member = member_lru.get(guild.id, user_id)
+            if not hit:
+                missing.append(user_id)
+                continue
+        if member is not None: found[user_id] = member
+    metrics_member_fetches.inc(len(found), source="cache")
+    if not missing: return found
+
+    fetched = {}
+    if len(missing) / MEMBER_QUERY_BATCH > (guild.member_count or 0) / MEMBER_LIST_PAGE:
+        source, wanted = "list", set(missing)
+        with trace_span("rest", "fetch_members"):
+            async for member in guild.fetch_members(limit=None):
+                if member.id in wanted: fetched[member.id] = member
+    else:
+        source, started = "query", time_module.perf_counter()
+        for start in range(0, len(missing), MEMBER_QUERY_BATCH):
+            batch = missing[start:start + MEMBER_QUERY_BATCH]
+            for member in await guild.query_members(user_ids=batch, limit=len(batch), cache=False):
+                fetched[member.id] = member
+        record_span("rest", "query_members", started) # Gateway requests, counted with REST time
+    member_lru.resize(lean_member_cache_limit()) # Follows guild joins and member count changes
+    for user_id in missing: member_lru.put(guild.id, user_id, fetched.get(user_id))
+    metrics_member_fetches.inc(len(missing), source=source)
+    log_perf.debug("Fetched %d of %d members of guild %s (%s).", len(fetched), len(missing), guild.id, source)
+    found.update(fetched)
+    return found
+
+# --- RATE LIMITING ---
+RATE_LIMIT_SWEEP_INTERVAL = 300 # Seconds between sweeps of refilled (idle) buckets
+STATS_COMMAND_RATE = (3, 30) # !stats: 3 uses per 30 seconds per user
+ALLSTATS_COMMAND_RATE = (2, 60) # !allstats: 2 reports per 60 seconds per guild
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated", "period", "notified")
+    def __init__(self, tokens, updated, period=None, notified=False):
+        self.tokens = tokens
+        self.updated = updated # Unix timestamp of the last refill calculation
+        self.period = period # Seconds per token (None until first use after a restore)
+        self.notified = notified # A denial message was already sent while this bucket is empty
+
+class TokenBucketLimiter:
+    """
+    Per-key token buckets (capacity tokens, one token refilled every 'period' seconds).
+    Role-specific periods are precompiled into an int role ID -> seconds map; the shortest period among
+    a member's roles applies. Buckets that have refilled completely are swept, so idle keys cost nothing.
+    """
+    def __init__(self, capacity=1, period=0, role_periods=None):
+        self.capacity = capacity
+        self.period = period
+        self.role_periods = {}
+        self._buckets = {}
+        self._last_sweep = time_module.time()
+        if role_periods: self.compile_role_periods(role_periods)
+
+    def compile_role_periods(self, role_periods):
+        """Precompiles {role ID (str/int): seconds} into an integer-keyed map, skipping invalid entries."""
+        compiled = {}
+        for role_id, seconds in role_periods.items():
+            try: role_id, seconds = int(role_id), int(seconds)
+            except (TypeError, ValueError):
+                log_data.warning("Invalid cooldown value (%s) found for role ID %s.", seconds, role_id)
+                continue
+            if seconds >= 0: compiled[role_id] = seconds # Ignore negative values
+        self.role_periods = compiled
+
+    def period_for(self, member):
+        """Shortest role-specific period for the member, or the default period if no role applies."""
+        if not self.role_periods or not isinstance(member, discord.Member): return self.period
+        applicable = [seconds for role_id, seconds in self.role_periods.items() if member.get_role(role_id) is not None]
+        return min(applicable) if applicable else self.period
+
+    def hit(self, key, period=None):
+        """
+        Tries to consume a token for 'key'.
+        Returns (allowed, retry_after_seconds, first_denial); first_denial is True only for the first
+        denied attempt while the bucket is empty (to avoid repeating cooldown messages).
+        """
+        period = self.period if period is None else period
+        if period <= 0: return True, 0.0, False
+        now = time_module.time()
+        if now - self._last_sweep > RATE_LIMIT_SWEEP_INTERVAL: self.sweep(now)
+
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.capacity, now, period)
+        else:
+            bucket.tokens = min(self.capacity, bucket.tokens + max(0.0, now - bucket.updated) / period)
+            bucket.updated, bucket.period = now, period
+
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            bucket.notified = False
+            return True, 0.0, False
+        first_denial = not bucket.notified
+        bucket.notified = True
+        return False, (1 - bucket.tokens) * period, first_denial
+
+    def refund(self, key):
+        """Gives back a token (e.g. when the rate-limited action failed)."""
+        bucket = self._buckets.get(key)
+        if bucket: bucket.tokens = min(self.capacity, bucket.tokens + 1)
+
+    def sweep(self, now=None):
+        """Drops buckets that have refilled completely."""
+        now = now or time_module.time()
+        self._last_sweep = now
+        fallback_period = max(self.role_periods.values(), default=self.period)
+        full = [key for key, b in self._buckets.items()
+                if b.updated + (self.capacity - b.tokens) * (b.period or fallback_period) <= now]
+        for key in full: del self._buckets[key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def export(self):
+        """Snapshot for persistence: {key: [tokens, updated, notified]} (only buckets still refilling)."""
+        self.sweep()
+        return {str(key): [round(b.tokens, 4), b.updated, b.notified] for key, b in self._buckets.items()}
+
+    def restore(self, snapshot):
+        self._buckets = {}
+        for key, (tokens, updated, notified) in snapshot.items():
+            self._buckets[int(key)] = TokenBucket(tokens, updated, None, notified)
+
+stats_command_limiter = TokenBucketLimiter(capacity=STATS_COMMAND_RATE[0], period=STATS_COMMAND_RATE[1])
+allstats_command_limiter = TokenBucketLimiter(capacity=ALLSTATS_COMMAND_RATE[0], period=ALLSTATS_COMMAND_RATE[1])
+
+# --- VOICE ATTENDANCE ---
+ATTENDANCE_DEFAULT_MIN_SECONDS = 600 # Default minimum time in the event's channels to count as joined
+
+class IntervalSet:
+    """Disjoint, sorted time intervals kept in two parallel lists; add() finds overlaps with bisect and merges them."""
+    __slots__ = ("starts", "ends")
+
+    def __init__(self, starts=None, ends=None):
+        self.starts = starts or []
+        self.ends = ends or []
+
+    def add(self, start, end):
+        if end <= start: return
+        i = bisect.bisect_left(self.ends, start) # First interval ending at/after start
+        j = bisect.bisect_right(self.starts, end) # Intervals i..j-1 overlap or touch [start, end]
+        if i < j:
+            start = min(start, self.starts[i])
+            end = max(end, self.ends[j - 1])
+        self.starts[i:j] = [start]
+        self.ends[i:j] = [end]
+
+    def total(self):
+        return sum(e - s for s, e in zip(self.starts, self.ends))
+
+class AttendanceSession:
+    """Voice/stage attendance for one event: per-user interval sets plus the open join time of members currently inside."""
+    def __init__(self, event_name, guild_id, channel_ids, min_seconds, opened_at, opened_by):
+        self.event_name = event_name
+        self.guild_id = guild_id
+        self.channel_ids = set(channel_ids)
+        self.min_seconds = min_seconds
+        self.opened_at = opened_at
+        self.opened_by = opened_by
+        self.intervals = {} # user_id (int) -> IntervalSet
+        self.active = {} # user_id (int) -> time they entered a tracked channel
+
+    def join(self, user_id, now):
+        self.active.setdefault(user_id, now)
+
+    def leave(self, user_id, now):
+        start = self.active.pop(user_id, None)
+        if start is not None: self.intervals.setdefault(user_id, IntervalSet()).add(start, now)
+
+    def totals(self, now):
+        """Attendance seconds per user, counting members who are still inside up to 'now'."""
+        totals = {user_id: intervals.total() for user_id, intervals in self.intervals.items()}
+        for user_id, start in self.active.items():
+            intervals = IntervalSet(list(self.intervals[user_id].starts), list(self.intervals[user_id].ends)) if user_id in self.intervals else IntervalSet()
+            intervals.add(start, now)
+            totals[user_id] = intervals.total()
+        return totals
+
+    def export(self, now):
+        """JSON snapshot; members still inside are stored as attending up to 'now' (reconciled on ready)."""
+        intervals = {}
+        for user_id in set(self.intervals) | set(self.active):
+            current = self.intervals.get(user_id, IntervalSet())
+            merged = IntervalSet(list(current.starts), list(current.ends))
+            if user_id in self.active: merged.add(self.active[user_id], now)
+            intervals[str(user_id)] = [[round(s, 1), round(e, 1)] for s, e in zip(merged.starts, merged.ends)]
+        return {"event_name": self.event_name, "guild_id": self.guild_id, "channel_ids": sorted(self.channel_ids), "min_seconds": self.min_seconds,
+                "opened_at": self.opened_at, "opened_by": self.opened_by, "intervals": intervals}
+
+    @classmethod
+    def restore(cls, data):
+        session = cls(data["event_name"], data["guild_id"], data["channel_ids"], data["min_seconds"], data["opened_at"], data.get("opened_by"))
+        for user_id, pairs in data.get("intervals", {}).items():
+            session.intervals[int(user_id)] = IntervalSet([p[0] for p in pairs], [p[1] for p in pairs])
+        return session
+
+attendance_sessions = {} # guild_id -> {standardized event name: AttendanceSession}
+
+def export_attendance(guild_id):
+    now = time_module.time()
+    return [session.export(now) for session in attendance_sessions.get(guild_id, {}).values()]
+
+def restore_attendance(snapshot):
+    """Restores persisted sessions that are not already open in memory."""
+    for data in snapshot:
+        try:
+            sessions = attendance_sessions.setdefault(data["guild_id"], {})
+            key = data["event_name"].strip().lower() # standardize_event_name() is defined further down
+            sessions.setdefault(key, AttendanceSession.restore(data))
+        except (KeyError, TypeError, IndexError) as e:
+            log_data.warning("Skipping invalid attendance session data: %s", e)
+
+def reconcile_attendance(guild):
+    """Marks members who are already in a tracked channel as inside (session opened or bot restarted mid-event)."""
+    now = time_module.time()
+    for session in attendance_sessions.get(guild.id, {}).values():
+        present = set()
+        for channel_id in session.channel_ids:
+            channel = guild.get_channel(channel_id)
+            if channel: present.update(m.id for m in channel.members if not m.bot)
+        for user_id in present: session.join(user_id, now)
+        for user_id in [uid for uid in session.active if uid not in present]: session.leave(user_id, now)
+
+class GuildState:
+    """
+    State partition of one guild: its stats records and config (one JSON file per guild, or one storage document), the derived
+    indexes (stats table, leaderboards, render cache), its report store, the stats button limiter and its
+    own save schedule.
+    Commands and handlers resolve it with get_guild_state(guild), so guilds never see each other's data.
+    """
+    def __init__(self, guild_id):
+        self.guild_id = guild_id
+        self.path = os.path.join(GUILD_DATA_DIR, f"{guild_id}.json")
+        self.storage_key = f"guild:{guild_id}"
+        self.stats_data = {}
+        self.config_data = {}
+        self.posted_links_set = set()
+        self.twitter_log_channel_ids = [] # X.com log channel IDs
+        self.art_channel_ids = []
+        self.authorized_roles = []
+        self.target_roles = []
+        self.stats_authorized_roles = []
+        self.stats_channel_id = None
+        self.stats_message_id = None
+        self.stats_cooldowns = {} # role ID string -> seconds
+        self.stats_table = UserStatsTable()
+        self.leaderboards = {metric: Leaderboard() for metric in LEADERBOARD_METRICS}
+        self.user_data_versions = {} # user ID string -> version, bumped whenever the record or member roles change
+        self.render_cache = RenderCache(RENDER_CACHE_MAX_ENTRIES)
+        self.report_store = ArtifactStore(os.path.join(ARTIFACT_STORE_DIR, str(guild_id)), ARTIFACT_STORE_MAX_BYTES)
+        # Stats button: per-user, periods from stats_cooldowns (no role cooldown -> no limit)
+        self.stats_button_limiter = TokenBucketLimiter(capacity=1, period=0)
+        self.pending_save = None # asyncio.TimerHandle of a delayed save (STATS_FLUSH_DELAY)
+        self.unwritten = None # Latest storage document not yet handed to the storage thread
+        self.write_task = None # Task writing 'unwritten' to storage
+
+    def load(self, document=None, preloaded=False):
+        """
+        Loads the guild's statistics and configuration data from storage (if configured) or its JSON file.
+        'preloaded': 'document' is the storage document, already read off the event loop (None: not in storage).
+        """
+        if storage is not None and not preloaded:
+            document = storage.get_blocking(self.storage_key)
+        if document is not None:
+            self.stats_data = json.loads(document)
+            log_data.info("Guild %s loaded from storage.", self.guild_id)
+        elif os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding='utf-8') as f:
+                    self.stats_data = json.load(f)
+                log_data.info("'%s' loaded successfully.%s", self.path, " It moves into storage on the next save." if storage is not None else "")
+            except (json.JSONDecodeError, IOError) as e:
+                log_data.error("Failed to load %s: %s. Starting with empty stats.", self.path, e)
+                self.stats_data = {}
+        else:
+            log_data.info("'%s' not found. Starting with empty stats.", self.path)
+            self.stats_data = {}
+        stats_data = self.stats_data
+
+        # Get config data or create default
+        config_data = self.config_data = stats_data.setdefault("config", {})
+        self.twitter_log_channel_ids = config_data.get("twitter_log_channel_ids", [])
+        self.art_channel_ids = config_data.get("art_channel_ids", [])
+        self.authorized_roles = config_data.get("track_authorized_roles", [])
+        self.target_roles = config_data.get("track_target_roles", [])
+        self.stats_authorized_roles = config_data.get("stats_authorized_roles", [])
+        self.stats_channel_id = config_data.get("stats_channel_id")
+        self.stats_message_id = config_data.get("stats_message_id")
+        # Ensure keys are strings when loading cooldowns
+        self.stats_cooldowns = {str(k): v for k, v in config_data.get("stats_cooldowns", {}).items()}
+        self.stats_button_limiter.compile_role_periods(self.stats_cooldowns)
+
+        self.posted_links_set = set(stats_data.setdefault("posted_twitter_links", []))
+        # Stats button rate-limit state (migrated from the old last-click / message-sent timestamps if needed)
+        last_clicks = stats_data.pop("user_last_stats_click", None)
+        cooldown_msgs_sent = stats_data.pop("user_last_cooldown_message_sent", None) or {}
+        bucket_snapshot = stats_data.setdefault("stats_button_buckets", {})
+        if last_clicks and not bucket_snapshot:
+            bucket_snapshot.update({str(uid): [0, ts, cooldown_msgs_sent.get(str(uid), 0) >= ts] for uid, ts in last_clicks.items()})
+        self.stats_button_limiter.restore(bucket_snapshot)
+        # Open voice attendance sessions of this guild
+        restore_attendance([data for data in stats_data.setdefault("attendance_sessions", []) if isinstance(data, dict) and data.get("guild_id") == self.guild_id])
+
+        # Check/update existing users for the new art_count field
         for uid, data in stats_data.items():
+            # Skip special keys like 'config', process only user IDs
             if uid.isdigit() and isinstance(data, dict):
                 data.setdefault("art_count", 0)
 
-        # Write to file
-        with open(STATS_FILE_PATH, "w", encoding="utf-8") as f:
-            json.dump(stats_data, f, indent=2, ensure_ascii=False) # ensure_ascii=False for non-ASCII chars
-        # print("Stats saved successfully.") # For debugging
-    except IOError as e:
-        print(f"ERROR: Could not save stats: {e}")
-    except Exception as e:
-        print(f"UNEXPECTED ERROR (save_stats): {e}")
-        traceback.print_exc()
+        # Rebuild the columnar mirror and leaderboards from the loaded records
+        self.stats_table.rebuild((uid, data) for uid, data in stats_data.items() if uid.isdigit() and isinstance(data, dict))
+        self.rebuild_leaderboards()
+        self.render_cache.clear()
+
+    def reload(self, document):
+        """Reloads the partition after another process saved it (unless changes made here are still waiting to be saved)."""
+        if self.pending_save is not None or self.unwritten is not None:
+            log_data.warning("Guild %s was saved by another process while a save is pending here; keeping this process's data.", self.guild_id)
+            return
+        self.load(document, preloaded=True)
+
+    def rebuild_leaderboards(self):
+        """Rebuilds all leaderboards from the columnar stats table (used after loading data)."""
+        table = self.stats_table
+        for metric, (field, _) in LEADERBOARD_METRICS.items():
+            column = table.columns[field][:table.size]
+            rows = np.flatnonzero(column > 0).tolist()
+            self.leaderboards[metric].rebuild((table.user_ids[row], int(column[row])) for row in rows)
+
+    def bump_user_version(self, user_id_str):
+        """Invalidates cached renders for a user."""
+        self.user_data_versions[user_id_str] = self.user_data_versions.get(user_id_str, 0) + 1
+
+    def notify_user_changed(self, user_id_str):
+        """Must be called after a user's record changes; keeps derived indexes (stats table, leaderboards) in sync."""
+        data = self.stats_data.get(user_id_str)
+        if isinstance(data, dict):
+            values = UserStatsTable.field_values(data)
+            self.stats_table.update_user(user_id_str, values)
+            for metric, (field, _) in LEADERBOARD_METRICS.items():
+                self.leaderboards[metric].update(user_id_str, values[STATS_TABLE_FIELDS.index(field)])
+        self.bump_user_version(user_id_str)
+
+    def get_user_data(self, user_id_str):
+        """Returns the user's stats record, creating (and indexing) it if it doesn't exist yet."""
+        data = self.stats_data.get(user_id_str)
+        if data is None:
+            data = self.stats_data[user_id_str] = DEFAULT_USER_TEMPLATE()
+            self.notify_user_changed(user_id_str)
+        return data
+
+    def is_tracked(self, member):
+        """True if the member's activity is counted (has a target role, or no target roles are set)."""
+        return isinstance(member, discord.Member) and (not self.target_roles or any(role.id in self.target_roles for role in member.roles))
+
+    def save_stats(self):
+        """Saves the guild's data now, or once within STATS_FLUSH_DELAY seconds if a delay is set (coalescing the saves in between)."""
+        if STATS_FLUSH_DELAY <= 0:
+            self.flush()
+            return
+        try: loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        if self.pending_save is None:
+            self.pending_save = loop.call_later(STATS_FLUSH_DELAY, self.flush)
+
+    def flush(self):
+        """Writes the guild's statistics and configuration data to storage (if configured) or its JSON file."""
+        if self.pending_save is not None:
+            self.pending_save.cancel()
+            self.pending_save = None
+        started = time_module.perf_counter()
+        stats_data, config_data = self.stats_data, self.config_data
+        try:
+            config_data["twitter_log_channel_ids"] = self.twitter_log_channel_ids
+            config_data["art_channel_ids"] = self.art_channel_ids
+            config_data["track_authorized_roles"] = self.authorized_roles
+            config_data["track_target_roles"] = self.target_roles
+            config_data["stats_authorized_roles"] = self.stats_authorized_roles
+            config_data["stats_channel_id"] = self.stats_channel_id
+            config_data["stats_message_id"] = self.stats_message_id
+            # Ensure keys are strings when saving cooldowns
+            config_data["stats_cooldowns"] = {str(k): v for k, v in self.stats_cooldowns.items()}
+
+            # Add config and other lists/dicts to the guild's stats_data
+            stats_data["config"] = config_data
+            stats_data["posted_twitter_links"] = sorted(self.posted_links_set)
+            # Stats button buckets that are still refilling (keeps cooldowns across restarts)
+            stats_data["stats_button_buckets"] = self.stats_button_limiter.export()
+            # Voice attendance of events that are still open
+            stats_data["attendance_sessions"] = export_attendance(self.guild_id)
+
+            # Ensure all user data has art_count before saving (safety check)
+            for uid, data in stats_data.items():
+                if uid.isdigit() and isinstance(data, dict):
+                    data.setdefault("art_count", 0)
+
+            if storage is not None:
+                # One compact document, written by the storage thread; other shard processes reload it from the change feed
+                document = json.dumps(stats_data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+                metrics_stats_bytes.set(len(document), guild=self.guild_id)
+                self.write_document(document)
+                return
+            # Write to file
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(stats_data, f, indent=2, ensure_ascii=False) # ensure_ascii=False for non-ASCII chars
+                metrics_stats_bytes.set(f.tell(), guild=self.guild_id)
+            metrics_saves.inc(result="ok")
+            log_data.debug("Stats of guild %s saved.", self.guild_id)
+        except (IOError, sqlite3.Error) as e:
+            metrics_saves.inc(result="error")
+            log_data.error("Could not save stats of guild %s: %s", self.guild_id, e)
+        except Exception as e:
+            metrics_saves.inc(result="error")
+            log_data.exception("Unexpected error saving stats of guild %s: %s", self.guild_id, e)
+        finally:
+            metrics_save_seconds.observe(time_module.perf_counter() - started)
+            record_span("persistence", "save_stats", started)
+
+    def write_document(self, document):
+        """
+        Queues the serialized partition for the storage thread. Saves made while a write is in flight are coalesced:
+        only the latest document is written next. Without a running event loop the document is written right away.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            try:
+                storage.put_blocking(self.storage_key, document)
+            except sqlite3.Error as e:
+                self._document_written(e)
+            else:
+                self._document_written(None)
+            return
+        self.unwritten = document
+        if self.write_task is None or self.write_task.done():
+            self.write_task = asyncio.create_task(self._write_unwritten(), name=f"storage-write-{self.guild_id}")
+
+    async def _write_unwritten(self):
+        while self.unwritten is not None:
+            document = self.unwritten
+            try:
+                await storage.put(self.storage_key, document)
+            except sqlite3.Error as e:
+                self._document_written(e)
+            else:
+                self._document_written(None)
+            if self.unwritten is document:
+                self.unwritten = None
+
+    def _document_written(self, error):
+        metrics_saves.inc(result="error" if error else "ok")
+        if error:
+            log_data.error("Could not save stats of guild %s: %s", self.guild_id, error)
+        else:
+            log_data.debug("Stats of guild %s saved.", self.guild_id)
+
+guild_states = {} # guild ID -> GuildState
+
+def get_guild_state(guild):
+    """
+    Returns the state partition of a guild (Guild or ID), loading it from its file on first use.
+    With storage, partitions are preloaded by load_guild_states(); a partition used before that is read here (a short WAL read).
+    """
+    guild_id = guild if isinstance(guild, int) else guild.id
+    state = guild_states.get(guild_id)
+    if state is None:
+        state = guild_states[guild_id] = GuildState(guild_id)
+        state.load()
+    return state
+
+async def load_guild_states(guild_ids):
+    """Loads the partitions of 'guild_ids' that are not loaded yet, reading storage documents off the event loop."""
+    for guild_id in guild_ids:
+        if guild_id in guild_states: continue
+        state = GuildState(guild_id)
+        document = await storage.get(state.storage_key) if storage is not None else None
+        if guild_id in guild_states: continue # Loaded on first use while the document was read
+        state.load(document, preloaded=True)
+        guild_states[guild_id] = state
+
+def reload_guild_state(key, document):
+    """Storage watcher: another process saved a guild partition ('guild:<id>')."""
+    guild_state = guild_states.get(int(key.partition(":")[2]))
+    if guild_state is None: return # Not loaded here; first use reads the new version
+    metrics_storage_invalidations.inc(kind="guild")
+    guild_state.reload(document)
+
+if storage is not None: storage.watch("guild:", reload_guild_state)
+
+async def flush_guild_states():
+    """Writes guilds whose delayed save is still pending and waits for queued storage writes (on shutdown)."""
+    for state in list(guild_states.values()):
+        if state.pending_save is not None: state.flush()
+    writes = [state.write_task for state in guild_states.values() if state.write_task is not None]
+    if writes: await asyncio.gather(*writes, return_exceptions=True)
+
+async def migrate_legacy_stats(guilds):
+    """
+    Moves a pre-partition stats.json into the file of the guild it belongs to (LEGACY_GUILD_ID, else the
+    guild owning its configured channels, else the only guild). Runs before any partition is loaded.
+    """
+    if not os.path.exists(STATS_FILE_PATH): return
+    guild_id = int(LEGACY_GUILD_ID) if LEGACY_GUILD_ID else None
+    if guild_id is None:
+        try:
+            with open(STATS_FILE_PATH, "r", encoding="utf-8") as f:
+                config = json.load(f).get("config", {})
+        except (json.JSONDecodeError, IOError, AttributeError) as e:
+            log_data.error("Cannot migrate %s: %s", STATS_FILE_PATH, e)
+            return
+        channel_ids = config.get("twitter_log_channel_ids", []) + config.get("art_channel_ids", []) + [config.get("stats_channel_id")]
+        owners = {guild.id for guild in guilds for channel_id in channel_ids if channel_id and guild.get_channel(channel_id)}
+        if len(owners) == 1: guild_id = owners.pop()
+        elif not owners and len(guilds) == 1 and not SHARD_IDS: guild_id = guilds[0].id # A shard range only sees some guilds
+    if guild_id is None:
+        log_data.warning("Cannot tell which guild %s belongs to; set LEGACY_GUILD_ID to migrate it.", STATS_FILE_PATH)
+        return
+    target_state = GuildState(guild_id)
+    target = target_state.path
+    if os.path.exists(target) or (storage is not None and await storage.get(target_state.storage_key) is not None):
+        log_data.warning("Not migrating %s: guild %s already has stats.", STATS_FILE_PATH, guild_id)
+        return
+    os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+    shutil.move(STATS_FILE_PATH, target)
+    # Reports stored before partitioning belong to the same guild
+    reports = [name for name in os.listdir(ARTIFACT_STORE_DIR) if name.endswith(ARTIFACT_EXTENSIONS)] if os.path.isdir(ARTIFACT_STORE_DIR) else []
+    if reports:
+        report_dir = os.path.join(ARTIFACT_STORE_DIR, str(guild_id))
+        os.makedirs(report_dir, exist_ok=True)
+        for name in reports: shutil.move(os.path.join(ARTIFACT_STORE_DIR, name), os.path.join(report_dir, name))
+    guild_states.pop(guild_id, None)
+    log_data.info("Migrated %s to %s (guild %s, %d stored reports).", STATS_FILE_PATH, target, guild_id, len(reports))
 
+# --- HELPER FUNCTIONS ---
 def admin_only():
     """Decorator check for authorized roles or bot owner."""
     async def predicate(ctx):
@@ -178,15 +1731,41 @@ def admin_only():
         # Bot owner is always authorized
         if await bot.is_owner(ctx.author):
             return True
-        # Authorized if user has one of the roles in AUTHORIZED_ROLES
+        # Authorized if user has one of the guild's authorized roles
         # Ensure ctx.author.roles exists (usually does in guild context)
-        if isinstance(ctx.author, discord.Member) and any(role.id in AUTHORIZED_ROLES for role in ctx.author.roles):
+        authorized_roles = get_guild_state(ctx.guild).authorized_roles
+        if isinstance(ctx.author, discord.Member) and any(role.id in authorized_roles for role in ctx.author.roles):
             return True
         # If not authorized, raise CheckFailure (SilentBot might delete message)
         raise commands.CheckFailure("User is not an admin or does not have authorized roles.")
     return commands.check(predicate)
 
 
+class RateLimitExceeded(commands.CommandOnCooldown):
+    """CommandOnCooldown raised by rate_limited(); 'notify' is False for repeated denials within one cooldown."""
+    def __init__(self, cooldown, retry_after, bucket_type, notify):
+        super().__init__(cooldown, retry_after, bucket_type)
+        self.notify = notify
+
+
+def rate_limited(limiter, per_guild=False, authorize=None):
+    """
+    Decorator check that rate-limits a command with a TokenBucketLimiter (per user, or per guild).
+    'authorize(ctx)' runs first, so unauthorized users fail silently (CheckFailure) without spending a token.
+    Only the first denial in a cooldown is answered by the global error handler.
+    """
+    async def predicate(ctx):
+        if authorize is not None and not await authorize(ctx):
+            raise commands.CheckFailure("User is not authorized for this command.")
+        key = ctx.guild.id if per_guild and ctx.guild else ctx.author.id
+        allowed, retry_after, first_denial = limiter.hit(key, limiter.period_for(ctx.author))
+        if not allowed:
+            bucket_type = commands.BucketType.guild if per_guild else commands.BucketType.user
+            raise RateLimitExceeded(commands.Cooldown(limiter.capacity, limiter.period), retry_after, bucket_type, notify=first_denial)
+        return True
+    return commands.check(predicate)
+
+
 async def is_admin(member: discord.Member) -> bool:
     """Checks if a member is the bot owner or has an authorized role."""
     if not isinstance(member, discord.Member): # Cannot check roles for User object (e.g., in DMs)
@@ -194,7 +1773,7 @@ async def is_admin(member: discord.Member) -> bool:
     if await bot.is_owner(member):
         return True
     # Check if roles exist (member might have left)
-    if hasattr(member, 'roles') and any(role.id in AUTHORIZED_ROLES for role in member.roles):
+    if hasattr(member, 'roles') and any(role.id in get_guild_state(member.guild).authorized_roles for role in member.roles):
         return True
     return False
 
@@ -209,13 +1788,14 @@ async def stats_authorized_check(ctx):
     if not isinstance(ctx.author, discord.Member):
         return False
 
+    guild_state = get_guild_state(ctx.guild)
     # Check if user has general authorized roles
-    if any(role.id in AUTHORIZED_ROLES for role in ctx.author.roles):
+    if any(role.id in guild_state.authorized_roles for role in ctx.author.roles):
         return True
 
     # If stats role list is not empty, check if user has one of those roles
-    if STATS_AUTHORIZED_ROLES:
-        if any(role.id in STATS_AUTHORIZED_ROLES for role in ctx.author.roles):
+    if guild_state.stats_authorized_roles:
+        if any(role.id in guild_state.stats_authorized_roles for role in ctx.author.roles):
             return True
 
     # If none of the above, user is not authorized
@@ -324,76 +1904,213 @@ def parse_numeric_filter(filter_str):
 
     return None # No match found
 
-def generate_excel(guild, filters=None, sort_key=None):
-    """Generates an Excel report with filters."""
-    excel_filename = f"{sanitize_filename(guild.name)}_statistics_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx" # English filename part
-    if os.path.exists(excel_filename):
-        try: os.remove(excel_filename)
+# --- USER FILTER ENGINE ---
+NUMPY_FILTER_OPERATORS = {">": operator.gt, "<": operator.lt, ">=": operator.ge, "<=": operator.le, "=": operator.eq, "!=": operator.ne}
+
+class UserFilter:
+    """
+    User filter: an OR of AND-clauses built from parse_numeric_filter() results and role checks.
+    Terms are ("numeric", field, op, value) or ("role", role_id, must_have); mask() evaluates them over a UserStatsTable.
+    """
+    def __init__(self, clauses=None):
+        self.clauses = [list(clause) for clause in (clauses or []) if clause]
+
+    @staticmethod
+    def terms_from_numeric_filter(filt):
+        """Converts a parse_numeric_filter() tuple (simple or range) into numeric terms."""
+        if len(filt) == 3: return [("numeric", filt[0], filt[1], filt[2])]
+        field, lower_op, lower_val, upper_op, upper_val = filt
+        return [("numeric", field, lower_op, lower_val), ("numeric", field, upper_op, upper_val)]
+
+    def mask(self, table, roles=True):
+        """Evaluates the filter over a UserStatsTable: returns a boolean array for rows [0, table.size) (roles=False: role terms pass)."""
+        n = table.size
+        if not self.clauses: return np.ones(n, dtype=bool)
+        result = np.zeros(n, dtype=bool)
+        for clause in self.clauses:
+            clause_mask = np.ones(n, dtype=bool)
+            for term in clause:
+                if term[0] == "role":
+                    if not roles: continue
+                    _, role_id, must_have = term
+                    has_role = (table.role_mask[:n] & table.role_bit(role_id)) != 0
+                    clause_mask &= has_role if must_have else ~has_role
+                else:
+                    _, field, op, value = term
+                    clause_mask &= NUMPY_FILTER_OPERATORS[op](table.columns[field][:n], value)
+            result |= clause_mask
+        return result
+
+async def parse_filter_args(ctx, args, keywords=()):
+    """
+    Parses report filter arguments into a UserFilter.
+    Supports numeric filters, @Role (must have), 'nothaverole @Role' (must not have), any number of each,
+    and 'or' between filter groups (filters inside a group are combined with AND).
+    Returns (UserFilter, list of matched keywords). Raises BadArgument with a user-facing message.
+    """
+    clauses = [[]]
+    found_keywords = []
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        lower_arg = arg.lower()
+        # Try parsing numeric filters (simple or range)
+        numeric_filter = parse_numeric_filter(arg)
+        if numeric_filter:
+            clauses[-1].extend(UserFilter.terms_from_numeric_filter(numeric_filter))
+        elif lower_arg in keywords:
+            found_keywords.append(lower_arg)
+        elif lower_arg == "or":
+            if not clauses[-1]: raise BadArgument("'or' must be placed between filters.")
+            clauses.append([])
+        elif lower_arg == "and":
+            pass # Filters in the same group are combined with AND anyway
+        elif lower_arg == "nothaverole" and i + 1 < len(args):
+            i += 1
+            next_arg = args[i]
+            try: role = await commands.RoleConverter().convert(ctx, next_arg)
+            except commands.RoleNotFound: raise BadArgument(f"Role for 'nothaverole' not found: '{next_arg}'")
+            clauses[-1].append(("role", role.id, False))
+        else: # Assume it might be a role filter
+            try: role = await commands.RoleConverter().convert(ctx, arg)
+            except commands.RoleNotFound: raise BadArgument(f"Unrecognized filter or argument: '{arg}'")
+            clauses[-1].append(("role", role.id, True))
+        i += 1
+    if len(clauses) > 1 and not clauses[-1]:
+        raise BadArgument("'or' must be placed between filters.")
+    if len({term[1] for clause in clauses for term in clause if term[0] == "role"}) > UserStatsTable.MAX_ROLE_BITS:
+        raise BadArgument(f"Too many different roles in one filter (max {UserStatsTable.MAX_ROLE_BITS}).")
+    trace_note(filters=sum(len(clause) for clause in clauses), filter_groups=len(clauses))
+    return UserFilter(clauses), found_keywords
+
+# --- REPORT ARTIFACT STORE ---
+ARTIFACT_STORE_ENABLED = os.getenv("ARTIFACT_STORE_ENABLED", "true").strip().lower() in ("1", "true", "yes") # Keep a copy of generated Excel reports on disk (for !listexcels / !getexcel)
+ARTIFACT_STORE_DIR = "reports" # One subdirectory per guild
+ARTIFACT_STORE_MAX_BYTES = int(os.getenv("ARTIFACT_STORE_MAX_MB", "200")) * 1024 * 1024 # Disk quota for stored reports, per guild
+ARTIFACT_EXTENSIONS = (".xlsx",)
+
+class ArtifactStore:
+    """Persists generated report files in a directory with a disk quota and LRU retention."""
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict() # filename -> size in bytes (least recently used first)
+        self._total_bytes = 0
+        self._loaded = False
+
+    def _ensure_loaded(self):
+        """Indexes files already in the store directory (oldest modification time first)."""
+        if self._loaded: return
+        self._loaded = True
+        if not os.path.isdir(self.directory): return
+        found = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(ARTIFACT_EXTENSIONS) and os.path.isfile(path):
+                try: st = os.stat(path)
+                except OSError: continue
+                found.append((st.st_mtime, name, st.st_size))
+        for _, name, size in sorted(found):
+            self._entries[name] = size
+            self._total_bytes += size
+
+    @staticmethod
+    def is_valid_name(filename):
+        """Only plain filenames with a known report extension are accepted (no paths)."""
+        return bool(filename) and os.path.basename(filename) == filename and filename.endswith(ARTIFACT_EXTENSIONS)
+
+    def _path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    def _evict(self, needed_bytes):
+        """Removes least recently used files until 'needed_bytes' fits in the quota."""
+        while self._entries and self._total_bytes + needed_bytes > self.max_bytes:
+            name, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try: os.remove(self._path(name))
+            except OSError as e: log_data.warning("Could not evict stored report '%s': %s", name, e)
+
+    def put(self, filename, data: bytes) -> bool:
+        """Stores a report. Returns False if it could not be stored (too large, invalid name, I/O error)."""
+        self._ensure_loaded()
+        if not self.is_valid_name(filename) or len(data) > self.max_bytes: return False
+        tmp_path = self._path(filename) + ".tmp" # Not a report extension, so a leftover is never indexed
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(filename)) # A failed write keeps the previous report and every other file
         except OSError as e:
-            print(f"Could not delete existing Excel: {excel_filename}, Error: {e}") # English comment
+            log_data.warning("Could not store report '%s': %s", filename, e)
+            try: os.remove(tmp_path)
+            except OSError: pass
+            return False
+        self._total_bytes -= self._entries.pop(filename, 0) # Replaced an existing file with the same name
+        self._entries[filename] = len(data)
+        self._total_bytes += len(data)
+        self._evict(0) # The new file is most recently used and fits the quota, so only older files go
+        return True
+
+    def get(self, filename) -> bytes | None:
+        """Returns the stored report bytes and marks the file as recently used."""
+        self._ensure_loaded()
+        if filename not in self._entries: return None
+        try:
+            with open(self._path(filename), "rb") as f:
+                data = f.read()
+            os.utime(self._path(filename)) # Keep LRU order across restarts
+        except OSError:
+            self._total_bytes -= self._entries.pop(filename)
             return None
+        self._entries.move_to_end(filename)
+        return data
+
+    def delete(self, filename) -> bool:
+        self._ensure_loaded()
+        size = self._entries.pop(filename, None)
+        if size is None: return False
+        self._total_bytes -= size
+        try: os.remove(self._path(filename))
+        except FileNotFoundError: pass
+        return True
 
-    numeric_filters = filters.get("numeric_filters", []) if filters else [] # Contains both simple and range filters
-    role_filter_object = filters.get("role_filter") if filters else None
-    not_have_role_object = filters.get("nothaverole") if filters else None
+    def list(self):
+        """Returns (filename, size) pairs, most recently used first."""
+        self._ensure_loaded()
+        return list(reversed(self._entries.items()))
 
-    event_list_set = set()
-    user_data_for_excel = []
-    processed_user_ids = set()
-    current_stats_data = stats_data.copy() # Work on a copy of stats_data for safety
+    @property
+    def total_bytes(self):
+        self._ensure_loaded()
+        return self._total_bytes
 
-    # Operator mapping
-    op_map = {">": lambda a, b: a > b, "<": lambda a, b: a < b, ">=": lambda a, b: a >= b, "<=": lambda a, b: a <= b, "=": lambda a, b: a == b, "!=": lambda a, b: a != b}
+def format_file_size(size_bytes):
+    """Formats a byte count for display (bytes / KB / MB)."""
+    if size_bytes > 1024 * 1024: return f"{size_bytes / (1024*1024):.2f} MB"
+    elif size_bytes > 1024: return f"{size_bytes / 1024:.2f} KB"
+    return f"{size_bytes} bytes"
 
-    for user_id_str, data in current_stats_data.items():
-        # Process only user IDs (skip config, etc.)
-        if not user_id_str.isdigit() or not isinstance(data, dict) or user_id_str in processed_user_ids:
-            continue
-        try: user_id = int(user_id_str)
-        except ValueError: continue
+def generate_excel(guild, user_filter=None, sort_key=None, members=None):
+    """
+    Generates an Excel report with filters. Returns (filename, xlsx bytes) or None on failure.
+    'members' (from fetch_members) is required in lean memory mode, where the member cache is not populated.
+    """
+    excel_filename = f"{sanitize_filename(guild.name)}_statistics_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
 
-        member = guild.get_member(user_id)
-        # Skip if member not in server or (if target roles defined) doesn't have target role
-        if not member or (TARGET_ROLES and not any(role.id in TARGET_ROLES for role in member.roles)):
-            continue
+    user_filter = user_filter or UserFilter()
+    event_list_set = set()
+    user_data_for_excel = []
+
+    # Vectorized filter over the guild's columnar table (also drops non-members / untracked users)
+    guild_state = get_guild_state(guild)
+    rows = guild_state.stats_table.query(guild, user_filter, guild_state.target_roles, members)
+    get_member = members.get if members is not None else guild.get_member
 
-        # --- Apply Filters ---
-        pass_filters = True
-        # Role Filters
-        if role_filter_object and (role_filter_object not in member.roles): pass_filters = False
-        if not_have_role_object and (not_have_role_object in member.roles): pass_filters = False
-
-        # Numeric Filters (Simple and Range)
-        if pass_filters:
-            for filt in numeric_filters:
-                user_val = 0
-                field = filt[0] # Field name is always the first element
-
-                # Get user's value for the field
-                if field == "total_message_count": user_val = data.get("total_message_count", 0)
-                elif field == "tweet_count": user_val = len(data.get("twitter_links", []))
-                elif field == "joined": user_val = len(data.get("events", []))
-                elif field == "won": user_val = len(data.get("winners", []))
-                elif field == "art_count": user_val = data.get("art_count", 0) # Get art count
-
-                # Apply filter based on tuple length
-                if len(filt) == 3: # Simple filter: (field, op, value)
-                    _, operator, filter_value = filt
-                    if operator not in op_map or not op_map[operator](user_val, filter_value):
-                        pass_filters = False; break
-                elif len(filt) == 5: # Range filter: (field, lower_op, lower_val, upper_op, upper_val)
-                    _, lower_op, lower_val, upper_op, upper_val = filt
-                    # Check lower bound
-                    if lower_op not in op_map or not op_map[lower_op](user_val, lower_val):
-                        pass_filters = False; break
-                    # Check upper bound
-                    if upper_op not in op_map or not op_map[upper_op](user_val, upper_val):
-                        pass_filters = False; break
-
-        if not pass_filters: continue # Skip user if any filter fails
-        # --- Filters End ---
-
-        processed_user_ids.add(user_id_str) # Mark this user as processed
+    for row in rows.tolist():
+        user_id_str = guild_state.stats_table.user_ids[row]
+        data = guild_state.stats_data.get(user_id_str)
+        member = get_member(int(user_id_str))
+        if not isinstance(data, dict) or not member: continue
 
         # Collect all unique event names (joined or won)
         all_user_events = set(data.get("events", [])) | set(data.get("winners", []))
@@ -414,19 +2131,21 @@ def generate_excel(guild, filters=None, sort_key=None):
 
     # Sort all unique event names found (for Excel columns)
     sorted_event_list = sorted(list(event_list_set))
-    print(f"{len(user_data_for_excel)} members passed filters. Sorting...") # English comment
-
-    # Sort the data
-    if sort_key == "messages": user_data_for_excel.sort(key=lambda x: (-x["total_message_count"], x["member"].display_name.lower()))
-    elif sort_key == "tweets": user_data_for_excel.sort(key=lambda x: (-x["tweet_count"], x["member"].display_name.lower()))
-    # Sorting by art_count could be added:
-    # elif sort_key == "artcount": user_data_for_excel.sort(key=lambda x: (-x["art_count"], x["member"].display_name.lower()))
-    else: # Default sort by display name
-        user_data_for_excel.sort(key=lambda x: x["member"].display_name.lower())
-
-    print("Writing Excel file...") # English comment
+    log_reports.debug("%d members passed filters. Sorting...", len(user_data_for_excel))
+
+    # Sort the data: count descending, then display name (vectorized argsort)
+    if user_data_for_excel:
+        name_keys = np.array([x["member"].display_name.lower() for x in user_data_for_excel])
+        count_field = {"messages": "total_message_count", "tweets": "tweet_count"}.get(sort_key)
+        if count_field: order = np.lexsort((name_keys, -np.array([x[count_field] for x in user_data_for_excel], dtype=np.int64)))
+        else: order = np.argsort(name_keys, kind="stable") # Default sort by display name
+        user_data_for_excel = [user_data_for_excel[i] for i in order.tolist()]
+
+    log_reports.debug("Writing Excel file...")
+    output = io.BytesIO()
     try:
-        workbook = xlsxwriter.Workbook(excel_filename)
+        # Build the workbook entirely in memory (no temp file on disk)
+        workbook = xlsxwriter.Workbook(output, {'in_memory': True})
         sheet = workbook.add_worksheet("Statistics") # English sheet name
 
         # Headers (English headers)
@@ -497,29 +2216,38 @@ def generate_excel(guild, filters=None, sort_key=None):
         if tw_col_idx is not None:
             sheet.set_column(tw_col_idx, tw_col_idx, 50) # Wider for links
 
-        # Close the workbook (saves to disk)
+        # Close the workbook (writes the xlsx into the buffer)
         workbook.close()
-        print(f"Excel '{excel_filename}' generated ({guild.name}). {len(user_data_for_excel)} members processed.") # English comment
-        return excel_filename # Return filename on success
+        log_reports.info("Excel '%s' generated (%s). %d members processed.", excel_filename, guild.name, len(user_data_for_excel))
+        return excel_filename, output.getvalue() # Return filename and file content on success
     except Exception as e:
-        print(f"ERROR writing Excel: {e}") # English comment
-        traceback.print_exc()
-        # Try to close workbook and delete potentially corrupt file on error
+        log_reports.exception("Error writing Excel: %s", e)
+        # Try to close workbook on error (the buffer is simply discarded)
         if 'workbook' in locals() and workbook:
             try: workbook.close()
             except: pass
-        if os.path.exists(excel_filename):
-            try: os.remove(excel_filename)
-            except: pass
         return None # Return None on failure
 
 async def generate_user_stats_embeds(member: discord.Member) -> list[discord.Embed]:
-    """Generates statistics embeds for a given member."""
+    """Returns statistics embeds for a given member, served from the render cache when the user is unchanged."""
+    user_id = str(member.id)
+    guild_state = get_guild_state(member.guild)
+    # Ensure user data exists (creating it bumps the version)
+    user_data = guild_state.get_user_data(user_id)
+    version = guild_state.user_data_versions.get(user_id, 0)
+
+    payload = guild_state.render_cache.get(user_id, version)
+    if payload is None:
+        payload = [embed.to_dict() for embed in build_user_stats_embeds(member, user_data)]
+        guild_state.render_cache.put(user_id, version, payload)
+    # Fresh Embed objects every time so callers can't modify the cached payload
+    return [discord.Embed.from_dict(embed_dict) for embed_dict in payload]
+
+def build_user_stats_embeds(member: discord.Member, user_data: dict) -> list[discord.Embed]:
+    """Builds statistics embeds for a given member from their stats record."""
     user_id = str(member.id)
     embeds = []
 
-    # Ensure user data exists and has art_count using setdefault
-    user_data = stats_data.setdefault(user_id, DEFAULT_USER_TEMPLATE())
     # Ensure art_count exists for data loaded before this field was added
     user_data.setdefault("art_count", 0)
 
@@ -541,11 +2269,10 @@ async def generate_user_stats_embeds(member: discord.Member) -> list[discord.Emb
     art_count = user_data.get("art_count", 0) # Get art count
 
     # Get and format user roles (excluding @everyone, sorted descending by ID)
-    member_roles = sorted(
-        [role.mention for role in member.roles if role.name != "@everyone"],
-        key=lambda mention: int(mention.strip('<@&>')), # Sort by ID
-        reverse=True # Higher roles usually preferred at the top
-    )
+    member_roles = [
+        role.mention for role in sorted(member.roles, key=lambda role: role.id, reverse=True) # Higher roles usually preferred at the top
+        if role.name != "@everyone"
+    ]
     roles_text = ", ".join(member_roles) if member_roles else "No Roles" # English text
 
     # Main statistics embed (English field names)
@@ -626,6 +2353,297 @@ async def generate_user_stats_embeds(member: discord.Member) -> list[discord.Emb
 
     return embeds
 
+# --- OUTBOUND MESSAGE SCHEDULER ---
+PRIORITY_MODERATION = 0 # Deletions and other moderation actions go first
+PRIORITY_INFO = 1 # Replies, progress edits
+OUTBOUND_MAX_CHARS = 2000 # Discord message length limit (merged text stays below it)
+PROGRESS_EDIT_INTERVAL = float(os.getenv("PROGRESS_EDIT_INTERVAL", "3.0")) # Min seconds between edits of one progress message
+
+class OutboundScheduler:
+    """
+    Per-channel queue for outgoing sends, edits and moderation operations, drained by one task per channel.
+    Lower priority values go first (moderation before informational replies). Consecutive plain-text sends
+    to the same channel are merged into one message (up to 2000 chars), and a queued edit of a message is
+    replaced by newer edits of it instead of queuing another request.
+    Every call returns a future resolving to the API result (the merged Message for merged sends).
+    """
+    def __init__(self):
+        self.queues = {} # channel_id -> heap of [priority, seq, kind, target, kwargs, futures, trace]
+        self.tasks = {} # channel_id -> drain task
+        self.pending_edits = {} # message_id -> queued edit entry
+        self._seq = 0
+        self.counters = {"sends": 0, "merged_sends": 0, "edits": 0, "coalesced_edits": 0, "operations": 0, "errors": 0}
+
+    @property
+    def backlog(self):
+        return sum(len(queue) for queue in self.queues.values())
+
+    def _future(self):
+        future = asyncio.get_running_loop().create_future()
+        # Fire-and-forget callers never await; mark failures as retrieved (they are logged by the drain task)
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        return future
+
+    def _push(self, channel_id, priority, kind, target, kwargs):
+        self._seq += 1
+        entry = [priority, self._seq, kind, target, kwargs, [self._future()], current_trace.get()]
+        heapq.heappush(self.queues.setdefault(channel_id, []), entry)
+        task = self.tasks.get(channel_id)
+        if task is None or task.done():
+            self.tasks[channel_id] = asyncio.create_task(self._drain(channel_id))
+        return entry
+
+    def send(self, destination, content=None, *, priority=PRIORITY_INFO, **kwargs):
+        """Queues channel.send(content, **kwargs); 'destination' is a Context or a channel."""
+        channel = destination.channel if isinstance(destination, commands.Context) else destination
+        if content is not None: kwargs["content"] = content
+        return self._push(channel.id, priority, "send", channel, kwargs)[5][0]
+
+    def edit(self, message, *, priority=PRIORITY_INFO, **kwargs):
+        """Queues message.edit(**kwargs), folding it into an edit of the same message that has not been sent yet."""
+        entry = self.pending_edits.get(message.id)
+        if entry is not None:
+            entry[4].update(kwargs)
+            entry[5].append(self._future())
+            self.counters["coalesced_edits"] += 1
+            return entry[5][-1]
+        entry = self._push(message.channel.id, priority, "edit", message, kwargs)
+        self.pending_edits[message.id] = entry
+        return entry[5][0]
+
+    def submit(self, channel, operation, *, priority=PRIORITY_MODERATION):
+        """Queues an arbitrary coroutine function (e.g. a batch of deletions) on the channel's queue."""
+        return self._push(channel.id, priority, "call", operation, {})[5][0]
+
+    @staticmethod
+    def _is_plain_text(entry):
+        return entry[2] == "send" and list(entry[4]) == ["content"]
+
+    async def _drain(self, channel_id):
+        queue = self.queues[channel_id]
+        while queue:
+            entry = heapq.heappop(queue)
+            priority, _, kind, target, kwargs, futures, trace = entry
+            current_trace.set(trace) # REST time counts towards the command that queued the operation
+            if kind == "edit": self.pending_edits.pop(target.id, None)
+            if self._is_plain_text(entry):
+                parts, size = [kwargs["content"]], len(kwargs["content"])
+                while queue and self._is_plain_text(queue[0]) and queue[0][0] == priority and size + 1 + len(queue[0][4]["content"]) <= OUTBOUND_MAX_CHARS:
+                    following = heapq.heappop(queue)
+                    parts.append(following[4]["content"])
+                    size += 1 + len(following[4]["content"])
+                    futures.extend(following[5])
+                    self.counters["merged_sends"] += 1
+                kwargs = {"content": "\n".join(parts)}
+            span_name = f"outbound {kind}" + (" (file)" if "file" in kwargs or "files" in kwargs else "")
+            try:
+                with trace_span("rest", span_name):
+                    if kind == "send":
+                        result = await target.send(**kwargs)
+                        self.counters["sends"] += 1
+                    elif kind == "edit":
+                        result = await target.edit(**kwargs)
+                        self.counters["edits"] += 1
+                    else:
+                        result = await target()
+                        self.counters["operations"] += 1
+            except Exception as e:
+                self.counters["errors"] += 1
+                log_outbound.warning("Outbound %s in channel %s failed: %s", kind, channel_id, e)
+                for future in futures:
+                    if not future.done(): future.set_exception(e)
+            else:
+                for future in futures:
+                    if not future.done(): future.set_result(result)
+        self.queues.pop(channel_id, None)
+        self.tasks.pop(channel_id, None)
+
+outbound = OutboundScheduler()
+
+
+# --- PAGINATED OUTPUT ---
+PAGINATOR_TIMEOUT = 600 # Seconds before page controls are disabled (below the 15 min interaction token lifetime)
+PAGE_MAX_CHARS = 1800 # Keep pages below Discord's 2000 character message limit
+
+class TextPageSource:
+    """
+    Pages over result sections: [(header or None, [lines...]), ...].
+    Page boundaries are computed from line lengths only; a page's text is rendered when it is shown.
+    Lines are shown in code blocks under their section header (repeated with '(cont.)' on later pages).
+    """
+    def __init__(self, sections, title=None, filename="results.txt", max_chars=PAGE_MAX_CHARS):
+        self.sections = [(header, list(lines)) for header, lines in sections if lines]
+        self.title = title
+        self.filename = filename
+        self.max_chars = max_chars
+        self._rows = [] # (section index, line index or None for the header row)
+        for si, (header, lines) in enumerate(self.sections):
+            if header: self._rows.append((si, None))
+            self._rows.extend((si, li) for li in range(len(lines)))
+        self._page_starts = self._paginate()
+
+    def _row_text(self, row):
+        si, li = row
+        return self.sections[si][0] if li is None else self.sections[si][1][li][:self.max_chars // 2]
+
+    def _paginate(self):
+        starts, i = [0], 0
+        reserve = len(self.title or "") + 40 # Title, footer and code fences
+        while i < len(self._rows):
+            size = reserve
+            si, li = self._rows[i]
+            if li is not None and self.sections[si][0]: size += len(self.sections[si][0]) + 10 # '(cont.)' header
+            start = i
+            while i < len(self._rows):
+                cost = len(self._row_text(self._rows[i])) + (9 if self._rows[i][1] is None else 1)
+                if i > start and size + cost > self.max_chars: break
+                size += cost
+                i += 1
+            if i < len(self._rows): starts.append(i)
+        return starts
+
+    @property
+    def page_count(self):
+        return len(self._page_starts)
+
+    def render(self, index):
+        start = self._page_starts[index]
+        end = self._page_starts[index + 1] if index + 1 < self.page_count else len(self._rows)
+        parts = [f"**{self.title}**"] if self.title else []
+        in_block = False
+        if start < end and self._rows[start][1] is not None and self.sections[self._rows[start][0]][0]:
+            parts.append(self.sections[self._rows[start][0]][0] + " (cont.)")
+        for row in self._rows[start:end]:
+            if row[1] is None:
+                if in_block:
+                    parts.append("```")
+                    in_block = False
+                parts.append(self._row_text(row))
+            else:
+                if not in_block:
+                    parts.append("```")
+                    in_block = True
+                parts.append(self._row_text(row))
+        if in_block: parts.append("```")
+        if self.page_count > 1: parts.append(f"Page {index + 1}/{self.page_count}")
+        return {"content": "\n".join(parts) or "ℹ️ No results.", "embed": None}
+
+    def as_text(self):
+        """Full, unpaginated text (for the download button)."""
+        out = [self.title] if self.title else []
+        for header, lines in self.sections:
+            if header: out.append(header)
+            out.extend(lines)
+        return "\n".join(out) + "\n"
+
+class EmbedPageSource:
+    """One embed per page (e.g. stats overview followed by link pages)."""
+    def __init__(self, embeds, filename="results.txt"):
+        self.embeds = embeds
+        self.filename = filename
+
+    @property
+    def page_count(self):
+        return len(self.embeds)
+
+    def render(self, index):
+        embed = self.embeds[index]
+        if self.page_count > 1:
+            embed = embed.copy()
+            embed.set_footer(text=f"Page {index + 1}/{self.page_count}")
+        return {"content": None, "embed": embed}
+
+    def as_text(self):
+        out = []
+        for embed in self.embeds:
+            if embed.title: out.append(embed.title)
+            if embed.description: out.append(embed.description)
+            out.extend(f"{field.name}: {field.value}" for field in embed.fields)
+            out.append("")
+        return "\n".join(out)
+
+class JumpToPageModal(discord.ui.Modal, title="Jump to page"):
+    page_number = discord.ui.TextInput(label="Page number", max_length=6)
+
+    def __init__(self, paginator):
+        super().__init__()
+        self.paginator = paginator
+
+    async def on_submit(self, interaction: discord.Interaction):
+        try: index = int(self.page_number.value) - 1
+        except ValueError: return await interaction.response.send_message("❌ Invalid page number.", ephemeral=True)
+        await self.paginator.show_page(interaction, index)
+
+class PaginatorView(discord.ui.View):
+    """Prev / Next / Jump / Download controls over a page source; one message for the whole result."""
+    def __init__(self, source, author_id=None, timeout=PAGINATOR_TIMEOUT):
+        super().__init__(timeout=timeout)
+        self.source = source
+        self.author_id = author_id
+        self.page = 0
+        self.message = None
+        self._update_buttons()
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if self.author_id is None or interaction.user.id == self.author_id: return True
+        await interaction.response.send_message("❌ Only the person who ran this can use these controls.", ephemeral=True)
+        return False
+
+    def _update_buttons(self):
+        self.prev_page.disabled = self.page <= 0
+        self.next_page.disabled = self.page >= self.source.page_count - 1
+
+    async def show_page(self, interaction: discord.Interaction, index: int):
+        self.page = max(0, min(index, self.source.page_count - 1))
+        self._update_buttons()
+        await interaction.response.edit_message(**self.source.render(self.page), view=self)
+
+    @discord.ui.button(label="◀ Prev", style=discord.ButtonStyle.secondary)
+    async def prev_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, self.page - 1)
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, self.page + 1)
+
+    @discord.ui.button(label="Jump", style=discord.ButtonStyle.secondary)
+    async def jump(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.send_modal(JumpToPageModal(self))
+
+    @discord.ui.button(label="Download", emoji="📄", style=discord.ButtonStyle.secondary)
+    async def download(self, interaction: discord.Interaction, button: discord.ui.Button):
+        data = self.source.as_text().encode("utf-8")
+        await interaction.response.send_message(file=discord.File(io.BytesIO(data), filename=self.source.filename), ephemeral=True)
+
+    async def on_timeout(self):
+        for item in self.children: item.disabled = True
+        if self.message:
+            try: await self.message.edit(view=self)
+            except discord.HTTPException: pass
+
+async def send_paginated(destination, source, *, author_id=None, ephemeral=False, message=None):
+    """
+    Shows the first page of 'source' (with page controls if there are several pages) as a single message.
+    'destination' is a Context/Messageable or an already-responded Interaction (sent as followup).
+    If 'message' is given, that message is edited instead of sending a new one.
+    """
+    payload = source.render(0)
+    view = PaginatorView(source, author_id) if source.page_count > 1 else None
+    kwargs = {key: value for key, value in payload.items() if value is not None}
+    if view: kwargs["view"] = view
+    if message is not None:
+        await outbound.edit(message, **payload, view=view) # Ordered after any queued progress edit of this message
+        sent = message
+    elif isinstance(destination, discord.Interaction):
+        with trace_span("rest", "paginated followup"):
+            sent = await destination.followup.send(**kwargs, ephemeral=ephemeral, wait=True)
+    else:
+        with trace_span("rest", "paginated send"):
+            sent = await destination.send(**kwargs)
+    if view: view.message = sent
+    return sent
+
+
 class StatsView(discord.ui.View):
     """A persistent view with the 'Show My Stats' button."""
     def __init__(self):
@@ -636,8 +2654,6 @@ class StatsView(discord.ui.View):
     async def show_stats_callback(self, interaction: discord.Interaction, button: discord.ui.Button):
         """Callback for the stats button."""
         user = interaction.user
-        user_id_str = str(user.id)
-        current_time = time_module.time() # Current time as Unix timestamp
 
         # --- Cooldown Check ---
         # Ensure user is a Member object to access roles
@@ -646,75 +2662,37 @@ class StatsView(discord.ui.View):
              await interaction.response.send_message("Could not retrieve your roles.", ephemeral=True) # English text
              return
 
-        user_roles_ids = {str(role.id) for role in user.roles} # User's role IDs as strings
-        shortest_cooldown = float('inf') # Start with infinity
-        has_specific_cooldown = False
-
-        # Check each role defined in stats_cooldowns
-        for role_id_str, cooldown_sec in stats_cooldowns.items():
-            if role_id_str in user_roles_ids:
-                # Make sure cooldown_sec is an int/float
-                try:
-                    current_role_cooldown = int(cooldown_sec)
-                    if current_role_cooldown >= 0: # Ignore negative values
-                         has_specific_cooldown = True
-                         shortest_cooldown = min(shortest_cooldown, current_role_cooldown)
-                except (ValueError, TypeError):
-                     print(f"Warning: Invalid cooldown value ({cooldown_sec}) found for role ID {role_id_str}.") # English comment
-                     continue # Skip invalid cooldown values
-
-        # Use the shortest cooldown found if any specific one applies
-        applicable_cooldown = shortest_cooldown if has_specific_cooldown and shortest_cooldown != float('inf') else 0
-
-        # Get the user's last click time
-        last_click_time = user_last_stats_click.get(user_id_str, 0.0) # Default to 0.0 if not found
-        time_elapsed = current_time - last_click_time
-
-        # Check if cooldown is active
-        if applicable_cooldown > 0 and time_elapsed < applicable_cooldown:
-            # << NEW: Cooldown Message Spam Prevention >>
-            last_cooldown_msg_time = user_last_cooldown_message_sent.get(user_id_str, 0.0) # When msg was last sent
-
-            # If a cooldown message was already sent *during this specific cooldown period*
-            if last_cooldown_msg_time >= last_click_time:
-                # Acknowledge interaction silently to prevent "Interaction failed"
+        # Token bucket with the shortest cooldown among the user's roles in this guild (in memory, no disk I/O)
+        guild_state = get_guild_state(interaction.guild)
+        allowed, retry_after, first_denial = guild_state.stats_button_limiter.hit(user.id, guild_state.stats_button_limiter.period_for(user))
+        if not allowed:
+            if not first_denial:
+                # Cooldown message already sent during this cooldown: acknowledge silently to prevent "Interaction failed"
                 try:
                     await interaction.response.defer(ephemeral=True)
                 except discord.NotFound: # Interaction might expire quickly
                     pass
                 except Exception as e:
-                    print(f"Error deferring interaction during cooldown msg check: {e}")
+                    log_stats_button.warning("Error deferring interaction during cooldown msg check: %s", e)
                 return # Don't send another message
 
             # --- Send Cooldown Message (First time for this cooldown) ---
-            remaining_time = applicable_cooldown - time_elapsed
             # Format remaining time for better readability
-            if remaining_time > 3600: time_str = f"{remaining_time / 3600:.1f} hours"
-            elif remaining_time > 60: time_str = f"{remaining_time / 60:.1f} minutes"
-            else: time_str = f"{remaining_time:.0f} seconds"
+            if retry_after > 3600: time_str = f"{retry_after / 3600:.1f} hours"
+            elif retry_after > 60: time_str = f"{retry_after / 60:.1f} minutes"
+            else: time_str = f"{retry_after:.0f} seconds"
 
             try:
                 await interaction.response.send_message(
                     f"❌ You need to wait {time_str} more to use this button again.",
                     ephemeral=True # Only visible to the user
                 )
-                # Record that the message was sent now
-                user_last_cooldown_message_sent[user_id_str] = current_time
-                save_stats() # Save the updated message sent time
             except discord.NotFound: # Interaction might expire
                 pass
             except Exception as e:
-                print(f"Error sending cooldown message or saving state: {e}")
+                log_stats_button.warning("Error sending cooldown message: %s", e)
             return # Stop processing further
 
-        # --- Proceed if cooldown check passed ---
-        # Reset the cooldown message sent time if the user successfully uses the button
-        # Do this *before* potentially long stat generation
-        needs_save_after_stats = False
-        if user_id_str in user_last_cooldown_message_sent:
-            del user_last_cooldown_message_sent[user_id_str]
-            needs_save_after_stats = True # Mark that save is needed later
-
         try:
             # Defer the interaction first, especially if generating stats takes time
             await interaction.response.defer(ephemeral=True, thinking=True)
@@ -722,57 +2700,18 @@ class StatsView(discord.ui.View):
             # Generate the stats embeds
             stats_embeds = await generate_user_stats_embeds(user)
 
-            # Discord embed limit is 6000 characters
-            # Send embeds in multiple messages if needed
-            MAX_EMBEDS_PER_MESSAGE = 10  # Limit embeds per message
-            MAX_CHARS_PER_MESSAGE = 5000  # Keep below Discord's 6000 char limit to be safe
-
-            if len(stats_embeds) <= MAX_EMBEDS_PER_MESSAGE:
-                # Calculate total characters in all embeds
-                total_chars = sum(len(embed.title or "") + 
-                                 len(embed.description or "") + 
-                                 sum(len(field.name) + len(field.value) for field in embed.fields)
-                                 for embed in stats_embeds)
-                
-                # If total characters are within limit, send all embeds at once
-                if total_chars <= MAX_CHARS_PER_MESSAGE:
-                    await interaction.followup.send(embeds=stats_embeds, ephemeral=True)
-                else:
-                    # Otherwise send embeds one by one
-                    for i, embed in enumerate(stats_embeds):
-                        await interaction.followup.send(embed=embed, ephemeral=True)
-            else:
-                # If there are too many embeds, split them into multiple messages
-                for i in range(0, len(stats_embeds), MAX_EMBEDS_PER_MESSAGE):
-                    chunk = stats_embeds[i:i+MAX_EMBEDS_PER_MESSAGE]
-                    # Calculate characters in this chunk
-                    chunk_chars = sum(len(embed.title or "") + 
-                                    len(embed.description or "") + 
-                                    sum(len(field.name) + len(field.value) for field in embed.fields)
-                                    for embed in chunk)
-                    
-                    if chunk_chars <= MAX_CHARS_PER_MESSAGE:
-                        # Send chunk if within character limit
-                        await interaction.followup.send(embeds=chunk, ephemeral=True)
-                    else:
-                        # Otherwise send embeds in this chunk one by one
-                        for embed in chunk:
-                            await interaction.followup.send(embed=embed, ephemeral=True)
-
-            # Update the last click time
-            user_last_stats_click[user_id_str] = current_time
-            # Save stats (includes updated click time and potentially cleared cooldown msg state)
-            save_stats()
+            # One ephemeral message; link pages are browsed with the page controls
+            await send_paginated(interaction, EmbedPageSource(stats_embeds, filename=f"stats_{user.id}.txt"), author_id=user.id, ephemeral=True)
 
         except Exception as e:
-            print(f"ERROR (Stats Button Callback - Post Cooldown): {e}")
-            traceback.print_exc()
+            log_stats_button.exception("Stats button callback failed: %s", e, extra={"user_id": user.id})
+            guild_state.stats_button_limiter.refund(user.id) # Don't charge the user for a failed attempt
             try:
                 # Try to send an error message as followup
                 if not interaction.is_expired():
                      await interaction.followup.send("❌ An error occurred while fetching your statistics.", ephemeral=True) # English text
             except Exception as inner_e:
-                 print(f"ERROR (Stats Button Error Send): {inner_e}") # English comment
+                 log_stats_button.warning("Could not send the stats button error message: %s", inner_e)
 
 
 # --- ROLE MANAGEMENT COMMANDS ---
@@ -780,10 +2719,10 @@ class StatsView(discord.ui.View):
 @bot.command(name="settrackauthorizedrole")
 @admin_only()
 async def set_track_authorized_role(ctx, role: discord.Role):
-    global AUTHORIZED_ROLES
-    if role.id not in AUTHORIZED_ROLES:
-        AUTHORIZED_ROLES.append(role.id)
-        save_stats()
+    guild_state = get_guild_state(ctx.guild)
+    if role.id not in guild_state.authorized_roles:
+        guild_state.authorized_roles.append(role.id)
+        guild_state.save_stats()
         await ctx.send(f"✅ Role {role.mention} has been added to track authorized roles.") # English text
     else:
         await ctx.send(f"ℹ️ Role {role.mention} is already set as a track authorized role.") # English text
@@ -791,15 +2730,15 @@ async def set_track_authorized_role(ctx, role: discord.Role):
 @bot.command(name="settracktargetrole")
 @admin_only()
 async def set_track_target_role(ctx, *roles: discord.Role):
-    global TARGET_ROLES
+    guild_state = get_guild_state(ctx.guild)
     added_roles = []
     if not roles: return await ctx.send("❌ Error: You must specify at least one role.") # English text
     for role in roles:
-        if role.id not in TARGET_ROLES:
-            TARGET_ROLES.append(role.id)
+        if role.id not in guild_state.target_roles:
+            guild_state.target_roles.append(role.id)
             added_roles.append(role.mention)
     if added_roles:
-        save_stats()
+        guild_state.save_stats()
         await ctx.send(f"✅ Added to track target roles: {', '.join(added_roles)}.") # English text
     else:
         await ctx.send("ℹ️ The specified roles were already target roles.") # English text
@@ -807,17 +2746,17 @@ async def set_track_target_role(ctx, *roles: discord.Role):
 @bot.command(name="removeauthorizedrole")
 @admin_only()
 async def remove_authorized_role(ctx, *roles: discord.Role):
-    global AUTHORIZED_ROLES
+    guild_state = get_guild_state(ctx.guild)
     removed = []
     if not roles: return await ctx.send("❌ Error: You must specify at least one role.") # English text
     for role in roles:
-        if role.id in AUTHORIZED_ROLES:
+        if role.id in guild_state.authorized_roles:
             try:
-                AUTHORIZED_ROLES.remove(role.id)
+                guild_state.authorized_roles.remove(role.id)
                 removed.append(role.mention)
             except ValueError: pass
     if removed:
-        save_stats()
+        guild_state.save_stats()
         await ctx.send(f"✅ Removed from track authorized roles: {', '.join(removed)}.") # English text
     else:
         await ctx.send("ℹ️ No matching authorized roles found to remove.") # English text
@@ -825,17 +2764,17 @@ async def remove_authorized_role(ctx, *roles: discord.Role):
 @bot.command(name="removetargetrole")
 @admin_only()
 async def remove_target_role(ctx, *roles: discord.Role):
-    global TARGET_ROLES
+    guild_state = get_guild_state(ctx.guild)
     removed = []
     if not roles: return await ctx.send("❌ Error: You must specify at least one role.") # English text
     for role in roles:
-        if role.id in TARGET_ROLES:
+        if role.id in guild_state.target_roles:
             try:
-                TARGET_ROLES.remove(role.id)
+                guild_state.target_roles.remove(role.id)
                 removed.append(role.mention)
             except ValueError: pass
     if removed:
-        save_stats()
+        guild_state.save_stats()
         await ctx.send(f"✅ Removed from track target roles: {', '.join(removed)}.") # English text
     else:
         await ctx.send(f"ℹ️ The specified roles were not set as track target roles.") # English text
@@ -843,15 +2782,15 @@ async def remove_target_role(ctx, *roles: discord.Role):
 @bot.command(name="setstatsroleauthorized")
 @admin_only()
 async def set_stats_role_authorized(ctx, *roles: discord.Role):
-    global STATS_AUTHORIZED_ROLES
+    guild_state = get_guild_state(ctx.guild)
     added = []
     if not roles: return await ctx.send("❌ Error: You must specify at least one role.") # English text
     for role in roles:
-        if role.id not in STATS_AUTHORIZED_ROLES:
-            STATS_AUTHORIZED_ROLES.append(role.id)
+        if role.id not in guild_state.stats_authorized_roles:
+            guild_state.stats_authorized_roles.append(role.id)
             added.append(role.mention)
     if added:
-        save_stats()
+        guild_state.save_stats()
         await ctx.send(f"✅ Added to stats authorized roles: {', '.join(added)}.") # English text
     else:
         await ctx.send("ℹ️ The specified roles were already authorized for `!stats`.") # English text
@@ -859,17 +2798,17 @@ async def set_stats_role_authorized(ctx, *roles: discord.Role):
 @bot.command(name="removestatsroleauthorized")
 @admin_only()
 async def remove_stats_role_authorized(ctx, *roles: discord.Role):
-    global STATS_AUTHORIZED_ROLES
+    guild_state = get_guild_state(ctx.guild)
     removed = []
     if not roles: return await ctx.send("❌ Error: You must specify at least one role.") # English text
     for role in roles:
-        if role.id in STATS_AUTHORIZED_ROLES:
+        if role.id in guild_state.stats_authorized_roles:
             try:
-                STATS_AUTHORIZED_ROLES.remove(role.id)
+                guild_state.stats_authorized_roles.remove(role.id)
                 removed.append(role.mention)
             except ValueError: pass
     if removed:
-        save_stats()
+        guild_state.save_stats()
         await ctx.send(f"✅ Removed from stats authorized roles: {', '.join(removed)}.") # English text
     else:
         await ctx.send(f"ℹ️ The specified roles were not set as stats authorized roles.") # English text
@@ -880,21 +2819,22 @@ async def remove_stats_role_authorized(ctx, *roles: discord.Role):
 @admin_only()
 async def add_art_channel(ctx, channel: discord.TextChannel):
     """Adds a channel to the list of monitored Art Channels and scans its history."""
-    global art_channel_ids, stats_data # << MODIFIED: Use list variable >>
+    guild_state = get_guild_state(ctx.guild)
 
     if not channel:
         return await ctx.send("❌ Error: Valid text channel not found.")
 
-    if channel.id in art_channel_ids:
+    if channel.id in guild_state.art_channel_ids:
         return await ctx.send(f"ℹ️ {channel.mention} is already in the list of art channels.")
 
     # Add the channel to the list
-    art_channel_ids.append(channel.id)
-    save_stats() # Save the updated list first
-    await ctx.send(f"✅ Added {channel.mention} to the list of Art Channels. Only media posts without text (for non-admins) will be allowed and counted in this channel.")
+    guild_state.art_channel_ids.append(channel.id)
+    guild_state.save_stats() # Save the updated list first
+    # Awaited so the confirmation is not merged into scan_msg, which the scan below edits
+    await outbound.send(ctx, f"✅ Added {channel.mention} to the list of Art Channels. Only media posts without text (for non-admins) will be allowed and counted in this channel.")
 
     # --- History Scan (Only runs for the newly added channel) ---
-    scan_msg = await ctx.send(f"⏳ Scanning {channel.mention}'s history (up to 10k messages) for past art posts...")
+    scan_msg = await outbound.send(ctx, f"⏳ Scanning {channel.mention}'s history (up to 10k messages) for past art posts...")
     history_limit = 10000 # <<< YOU CAN CHANGE THIS NUMBER >>>
     history_posts_found_count = 0 # Total posts found in scan
     history_scan_users_updated = 0 # Users whose count was updated by scan
@@ -919,10 +2859,10 @@ async def add_art_channel(ctx, channel: discord.TextChannel):
                 author_member = message.author # History messages usually have Member
                 author_id_str = str(message.author.id)
                 should_track_author = False
-                if isinstance(author_member, discord.Member) and TARGET_ROLES:
-                    if any(role.id in TARGET_ROLES for role in author_member.roles):
+                if isinstance(author_member, discord.Member) and guild_state.target_roles:
+                    if any(role.id in guild_state.target_roles for role in author_member.roles):
                         should_track_author = True
-                elif isinstance(author_member, discord.Member) and not TARGET_ROLES: # Track everyone if no target roles
+                elif isinstance(author_member, discord.Member) and not guild_state.target_roles: # Track everyone if no target roles
                     should_track_author = True
 
                 if should_track_author:
@@ -933,22 +2873,23 @@ async def add_art_channel(ctx, channel: discord.TextChannel):
 
         # --- Update stats_data AFTER scan is complete using max() ---
         if history_changed:
-            print(f"Art History Scan ({channel.name}): Found {history_posts_found_count} potential posts by {len(scanned_users_art)} users.")
+            log_scan.info("Art History Scan (%s): Found %d potential posts by %d users.", channel.name, history_posts_found_count, len(scanned_users_art))
             data_actually_changed = False # Flag if save_stats is really needed
             # Update the main stats_data with the counts found during the scan, ensuring we don't decrease the count
             for user_id_str, scanned_count in scanned_users_art.items():
-                user_data = stats_data.setdefault(user_id_str, DEFAULT_USER_TEMPLATE())
+                user_data = guild_state.get_user_data(user_id_str)
                 current_count = user_data.get("art_count", 0)
                 # Set the count to the maximum of the current count and the count found in the scan
                 new_count = max(current_count, scanned_count)
                 if new_count != current_count:
                     user_data["art_count"] = new_count
-                    print(f"Updated art_count for {user_id_str} from {current_count} to {new_count} based on history scan (used max).")
+                    guild_state.notify_user_changed(user_id_str)
+                    log_scan.debug("Updated art_count for %s from %d to %d based on history scan (used max).", user_id_str, current_count, new_count)
                     history_scan_users_updated += 1
                     data_actually_changed = True # Mark that a save is needed
 
             if data_actually_changed:
-                save_stats() # Save stats only if counts were actually updated
+                guild_state.save_stats() # Save stats only if counts were actually updated
                 await scan_msg.edit(content=f"✅ Added {channel.mention} to Art Channels.\n✅ History scan complete. Updated art counts for {history_scan_users_updated} users based on {history_posts_found_count} past posts found (preserving existing count).")
             else:
                  await scan_msg.edit(content=f"✅ Added {channel.mention} to Art Channels.\n✅ History scan complete. Posts found in scan did not change existing counts.")
@@ -960,8 +2901,7 @@ async def add_art_channel(ctx, channel: discord.TextChannel):
         await scan_msg.edit(content=f"❌ Error scanning history: Missing permission to read history in {channel.mention}.")
     except Exception as e:
         await scan_msg.edit(content=f"❌ An error occurred during history scan for {channel.mention}: {e}")
-        print(f"Error during art channel history scan ({channel.name}): {e}")
-        traceback.print_exc()
+        log_scan.exception("Error during art channel history scan (%s): %s", channel.name, e)
 
 @add_art_channel.error # << MODIFIED: Error handler for the add command >>
 async def add_art_channel_error(ctx, error):
@@ -976,7 +2916,7 @@ async def add_art_channel_error(ctx, error):
         pass # Permission error (handled silently by SilentBot)
     else:
         # Other unexpected errors go to the global handler
-        print(f"Unhandled setartchannel error: {error}")
+        log_commands.error("Unhandled setartchannel error: %s", error)
         # await ctx.send(f"An unexpected error occurred: {error}") # Don't send message (Global handler does)
 
 # << MODIFIED: Command to remove an art channel >>
@@ -984,16 +2924,16 @@ async def add_art_channel_error(ctx, error):
 @admin_only()
 async def remove_art_channel(ctx, channel: discord.TextChannel):
     """Removes a specific channel from the list of monitored Art Channels."""
-    global art_channel_ids # << MODIFIED: Use list variable >>
+    guild_state = get_guild_state(ctx.guild)
 
     if not channel:
         return await ctx.send("❌ Error: Valid text channel not found.")
 
-    if channel.id in art_channel_ids:
-        art_channel_ids.remove(channel.id)
-        save_stats() # Save the updated list
+    if channel.id in guild_state.art_channel_ids:
+        guild_state.art_channel_ids.remove(channel.id)
+        guild_state.save_stats() # Save the updated list
         await ctx.send(f"✅ Removed {channel.mention} from the list of Art Channels. Monitoring disabled for this channel.")
-        print(f"Art channel removed (ID: {channel.id}).")
+        log.info("Art channel removed (ID: %s).", channel.id)
     else:
         await ctx.send(f"ℹ️ {channel.mention} was not found in the list of Art Channels.")
 
@@ -1010,7 +2950,7 @@ async def remove_art_channel_error(ctx, error):
         pass # Permission error (handled silently by SilentBot)
     else:
         # Other unexpected errors go to the global handler
-        print(f"Unhandled removeartchannel error: {error}")
+        log_commands.error("Unhandled removeartchannel error: %s", error)
 
 
 @bot.command(name="trackhelp", aliases=["thelp"])
@@ -1019,10 +2959,12 @@ async def trackhelp(ctx):
     # << MODIFIED: Updated help text for channel commands >>
     help_fields = [
         {"name": "!stats [@user or ID]", "value": "Shows statistics for the specified user (or yourself) (Includes Art Count).", "inline": False},
-        {"name": "!allstats [filters...] [sort_key]", "value": "Generates Excel report. Filters: msgcount>N, twtcount>=N, joined>=N, won>=N, artcount>N (or <, >=, <=, =), `5<artcount<10` (range), @Role, nothaverole @Rol. Sort: messages, tweets.", "inline": False},
-        {"name": "!filteruserid [filters...] [id]", "value": "Filters users based on numeric/role filters (includes artcount). Add 'id' for ID-only output.", "inline": False},
-        {"name": "!listexcels", "value": "Lists available Excel (.xlsx) files.", "inline": False},
-        {"name": "!deleteexcel <filename.xlsx>", "value": "Deletes the specified Excel file.", "inline": False},
+        {"name": "!allstats [filters...] [sort_key]", "value": "Generates Excel report. Filters: msgcount>N, twtcount>=N, joined>=N, won>=N, artcount>N (or <, >=, <=, =), `5<artcount<10` (range), @Role, nothaverole @Rol (several allowed). Use `or` between filter groups. Sort: messages, tweets.", "inline": False},
+        {"name": "!top <metric> [n]", "value": "Shows the top n users (default 10, max 50) for messages, tweets, art, won or joined.", "inline": False},
+        {"name": "!filteruserid [filters...] [id]", "value": "Filters users based on numeric/role filters (same syntax as !allstats, includes `or`). Add 'id' for ID-only output.", "inline": False},
+        {"name": "!listexcels", "value": "Lists stored Excel (.xlsx) reports.", "inline": False},
+        {"name": "!getexcel <filename.xlsx>", "value": "Sends a stored Excel report again.", "inline": False},
+        {"name": "!deleteexcel <filename.xlsx>", "value": "Deletes the specified stored Excel report.", "inline": False},
         {"name": "!twitterlog <#channel or ID>", "value": "Adds a channel for specific X.com link monitoring & scans its history.", "inline": False}, # MODIFIED
         {"name": "!removetwitterlog <#channel or ID>", "value": "Removes a specific channel from X.com link monitoring.", "inline": False}, # MODIFIED
         {"name": "!setartchannel <#channel or ID>", "value": "Adds an 'Art Channel' where only media posts are allowed, enables art counting, and scans its history.", "inline": False}, # MODIFIED (also alias: !addartchannel)
@@ -1038,19 +2980,32 @@ async def trackhelp(ctx):
         {"name": "!setstatsroleauthorized <@role or ID> [@role2...]", "value": "Allows role to use !stats command.", "inline": False},
         {"name": "!removestatsroleauthorized <@role or ID> [@role2...]", "value": "Removes role's access to !stats.", "inline": False},
         {"name": "--- Bulk Actions ---", "value": "\u200b", "inline": False},
-        {"name": "!bulkban <id1> [id2...] [reason=...]", "value": "Bans multiple users by ID.", "inline": False},
+        {"name": "!bulkban <id1> [id2...] [names] [reason=...]", "value": "Bans multiple users by ID (bulk ban API, 200 per request). Add `names` to look up usernames.", "inline": False},
         {"name": "!bulkgiverole <@role or ID> <id1> [id2...]", "value": "Gives role to multiple users by ID.", "inline": False},
+        {"name": "!bulkremoverole <@role or ID> <id1> [id2...]", "value": "Removes role from multiple users by ID.", "inline": False},
+        {"name": "!deletequeue", "value": "Shows the deletion backlog and counters for moderated channels.", "inline": False},
+        {"name": "!perf", "value": "Shows message handling, save and report latencies, queue depths and cache hit rate.", "inline": False},
+        {"name": "!profile <cpu|mem> [seconds]", "value": "Owner only: CPU (cProfile) or memory (tracemalloc + structure sizes) capture, attached as files.", "inline": False},
+        {"name": "!traffic <start [path]|stop|status>", "value": "Owner only: records anonymized messages, button clicks and voice moves for replay benchmarks.", "inline": False},
+        {"name": "!jobs", "value": "Lists recent bulk jobs (bans/role changes) and their progress.", "inline": False},
+        {"name": "!job <id>", "value": "Shows a bulk job's per-user results.", "inline": False},
+        {"name": "!canceljob <id>", "value": "Stops a running bulk job.", "inline": False},
         {"name": "--- Event Management ---", "value": "\u200b", "inline": False},
         {"name": "!addevent <event_name> <id...>", "value": "Adds users to an event ('joined').", "inline": False},
         {"name": "!eventwinners <event_name> <id...>", "value": "Marks users as winners for an event.", "inline": False},
         {"name": "!notjoined <event_name> <id...>", "value": "Removes users from an event.", "inline": False},
         {"name": "!delevent <event_name>", "value": "Deletes an event from all records.", "inline": False},
         {"name": "!copyevent <#channel or ID> <event_name>", "value": "Copies members from voice/stage channel as 'joined'.", "inline": False},
+        {"name": "!openevent <#channel...> [min=10m] <event_name>", "value": "Starts tracking voice/stage attendance for an event.", "inline": False},
+        {"name": "!closeevent <event_name>", "value": "Stops tracking and adds everyone above the minimum time as 'joined'.", "inline": False},
+        {"name": "!attendance", "value": "Lists events with open attendance tracking.", "inline": False},
+        {"name": "!importevents [dryrun] [strict]", "value": "Imports event results from an attached CSV (event, user_id, status: joined/winner/notjoined).", "inline": False},
         {"name": "!winnerlist <event_name>", "value": "Lists winners of an event (sends file).", "inline": False},
         {"name": "!joinedlist <event_name>", "value": "Lists users who only joined (sends file).", "inline": False},
         {"name": "!fixwinners <mod> <event_name> <id...>", "value": "Fixes winner status (mod: joined, notjoined).", "inline": False},
         {"name": "!fixjoined <mod> <event_name> <id...>", "value": "Fixes joined status (mod: winner, notjoined).", "inline": False},
-        {"name": "!fixnotjoined <mod> <event_name> <id...>", "value": "Fixes not-joined status (mod: joined, winner).", "inline": False}
+        {"name": "!fixnotjoined <mod> <event_name> <id...>", "value": "Fixes not-joined status (mod: joined, winner).", "inline": False},
+        {"name": "ID lists as files", "value": "Event, fix and bulk commands also accept an attached .txt/.csv of IDs (one batch, one save, one result).", "inline": False}
     ]
     MAX_FIELDS_PER_EMBED = 25
     num_embeds = (len(help_fields) + MAX_FIELDS_PER_EMBED - 1) // MAX_FIELDS_PER_EMBED
@@ -1071,14 +3026,14 @@ async def trackhelp(ctx):
 @admin_only()
 async def add_twitter_log_channel(ctx, channel: discord.TextChannel):
     """Adds a channel to the list of monitored X.com log channels and scans its history."""
-    global twitter_log_channel_ids, posted_links_set # << MODIFIED: Use list variable >>
+    guild_state = get_guild_state(ctx.guild)
     if not channel: return await ctx.send(f"❌ Error: Valid text channel not found.")
 
-    if channel.id in twitter_log_channel_ids:
+    if channel.id in guild_state.twitter_log_channel_ids:
         return await ctx.send(f"ℹ️ {channel.mention} is already in the list of X.com log channels.")
 
     # Add channel to list
-    twitter_log_channel_ids.append(channel.id)
+    guild_state.twitter_log_channel_ids.append(channel.id)
     await ctx.send(f"✅ Added {channel.mention} to the X.com log channels.\n⏳ Scanning {channel.mention}'s history (max 10k messages) for valid links...")
 
     # --- History Scan (Only for the newly added channel) ---
@@ -1100,33 +3055,33 @@ async def add_twitter_log_channel(ctx, channel: discord.TextChannel):
                 norm_url = extracted_url # Regex ensures correct format
 
                 # Add if not already posted
-                if norm_url not in posted_links_set:
-                    posted_links_set.add(norm_url) # Add to global set
+                if norm_url not in guild_state.posted_links_set:
+                    guild_state.posted_links_set.add(norm_url) # Add to the guild's set
                     # Add to user stats only if user is tracked
                     should_track_author = False
-                    if isinstance(message.author, discord.Member) and TARGET_ROLES:
-                         if any(role.id in TARGET_ROLES for role in message.author.roles):
+                    if isinstance(message.author, discord.Member) and guild_state.target_roles:
+                         if any(role.id in guild_state.target_roles for role in message.author.roles):
                              should_track_author = True
-                    elif isinstance(message.author, discord.Member) and not TARGET_ROLES: # Track everyone if no target roles
+                    elif isinstance(message.author, discord.Member) and not guild_state.target_roles: # Track everyone if no target roles
                          should_track_author = True
 
                     if should_track_author:
                         uid = str(message.author.id)
-                        udata = stats_data.setdefault(uid, DEFAULT_USER_TEMPLATE())
+                        udata = guild_state.get_user_data(uid)
                         udata.setdefault("twitter_links", []).append(norm_url)
+                        guild_state.notify_user_changed(uid)
                     added_count += 1
                     changed = True # Change requiring save occurred
     except discord.Forbidden:
-        await ctx.send(f"❌ Error: Missing permission to read {channel.mention}'s history during scan.")
+        outbound.send(ctx, f"❌ Error: Missing permission to read {channel.mention}'s history during scan.")
         # Don't revert adding the channel, admin might fix perms later
     except Exception as e:
-        await ctx.send(f"❌ Error during history scan for {channel.mention}: {e}")
-        print(f"Error (twitterlog history scan for {channel.name}): {e}")
-        traceback.print_exc()
+        outbound.send(ctx, f"❌ Error during history scan for {channel.mention}: {e}")
+        log_scan.exception("Error during twitterlog history scan (%s): %s", channel.name, e)
 
     # Save stats if links were added or channel list was modified (it was, we appended)
-    save_stats()
-    await ctx.send(f"✅ History scan for {channel.mention} complete. Added {added_count} new unique valid links to internal set. Channel is active!")
+    guild_state.save_stats()
+    await outbound.send(ctx, f"✅ History scan for {channel.mention} complete. Added {added_count} new unique valid links to internal set. Channel is active!") # Merged with any scan error above
 
 @add_twitter_log_channel.error # << MODIFIED: Error handler for add command >>
 async def add_twitter_log_channel_error(ctx, error):
@@ -1136,23 +3091,23 @@ async def add_twitter_log_channel_error(ctx, error):
     elif isinstance(error, CheckFailure): pass # Handled silently by SilentBot / Global Handler
     else:
         # Unexpected errors go to global handler
-        print(f"Unhandled twitterlog error: {error}")
+        log_commands.error("Unhandled twitterlog error: %s", error)
 
 # << MODIFIED: Command to remove a specific twitter log channel >>
 @bot.command(name="removetwitterlog")
 @admin_only()
 async def remove_twitter_log_channel(ctx, channel: discord.TextChannel):
     """Removes a specific channel from the list of monitored X.com log channels."""
-    global twitter_log_channel_ids # << MODIFIED: Use list variable >>
+    guild_state = get_guild_state(ctx.guild)
 
     if not channel:
         return await ctx.send("❌ Error: Valid text channel not found.")
 
-    if channel.id in twitter_log_channel_ids:
-        twitter_log_channel_ids.remove(channel.id)
-        save_stats()
+    if channel.id in guild_state.twitter_log_channel_ids:
+        guild_state.twitter_log_channel_ids.remove(channel.id)
+        guild_state.save_stats()
         await ctx.send(f"✅ Removed {channel.mention} from the X.com log channels. Monitoring disabled for this channel.")
-        print(f"X.com log channel removed (ID: {channel.id}).")
+        log.info("X.com log channel removed (ID: %s).", channel.id)
     else:
         await ctx.send(f"ℹ️ {channel.mention} was not found in the list of X.com log channels.")
 
@@ -1169,155 +3124,107 @@ async def remove_twitter_log_channel_error(ctx, error):
         pass # Permission error (handled silently by SilentBot)
     else:
         # Other unexpected errors go to the global handler
-        print(f"Unhandled removetwitterlog error: {error}")
+        log_commands.error("Unhandled removetwitterlog error: %s", error)
 
 
 @bot.command(name="allstats")
 @admin_only()
+@rate_limited(allstats_command_limiter, per_guild=True)
 async def allstats(ctx, *args):
     """Generates an Excel report based on filters (including artcount)."""
-    # Updated to handle new artcount filter (including range)
-    numeric_filters = [] # Holds both simple and range filters
-    role_filter_object = None
-    nothaverole_filter_object = None
-    sort_param = None
-    i = 0
-    while i < len(args):
-        arg = args[i]
-        # Try parsing numeric filters (simple or range)
-        numeric_filter = parse_numeric_filter(arg)
-        if numeric_filter:
-            numeric_filters.append(numeric_filter)
-        elif arg.lower() in ["messages", "tweets"]: # Add other sort keys if needed
-            sort_param = arg.lower()
-        elif arg.lower() == "nothaverole" and i + 1 < len(args):
-            i += 1
-            next_arg = args[i]
-            try: role = await commands.RoleConverter().convert(ctx, next_arg)
-            except commands.RoleNotFound: return await ctx.send(f"❌ Error: Role for 'nothaverole' not found: '{next_arg}'") # English text
-            except Exception as e: return await ctx.send(f"❌ Error processing 'nothaverole' role: {e}") # English text
-            if role:
-                if nothaverole_filter_object is None: nothaverole_filter_object = role
-                else: return await ctx.send("❌ Error: Only one 'nothaverole' filter allowed.") # English text
-        else: # Assume it might be a role filter
-            try: role = await commands.RoleConverter().convert(ctx, arg)
-            except commands.RoleNotFound:
-                # If it's not a role and not a known keyword, it's an error
-                if arg.lower() not in ["messages", "tweets"]: # Check against known non-role args
-                     return await ctx.send(f"❌ Error: Unrecognized filter or argument: '{arg}'") # English text
-                # Otherwise ignore (it might be a sort key handled above)
-            except Exception as e: return await ctx.send(f"❌ Error processing role filter: {e}") # English text
-
-            if role: # If RoleConverter succeeded
-                if role_filter_object is None: role_filter_object = role
-                else: return await ctx.send("❌ Error: Only one role filter allowed.") # English text
-        i += 1
+    try: user_filter, keywords = await parse_filter_args(ctx, args, keywords=("messages", "tweets"))
+    except BadArgument as e: return await ctx.send(f"❌ Error: {e}")
+    sort_param = keywords[-1] if keywords else None
 
-    filters = {"numeric_filters": numeric_filters, "role_filter": role_filter_object, "nothaverole": nothaverole_filter_object}
     msg = await ctx.send("⏳ Generating Excel report...") # English text
+    # Lean memory mode: fetch the members the report can include (users passing the numeric filters)
+    members = await fetch_members(ctx.guild, get_guild_state(ctx.guild).stats_table.candidate_ids(user_filter)) if LEAN_MEMORY else None
     # generate_excel now handles the filtering logic
-    excel_filename = generate_excel(ctx.guild, filters, sort_param)
+    with metrics_report_seconds.time(), trace_span("report", "generate_excel"):
+        report = generate_excel(ctx.guild, user_filter, sort_param, members)
+    metrics_reports.inc(result="ok" if report else "error")
 
-    if excel_filename and os.path.exists(excel_filename):
-        try:
-            await msg.edit(content="✅ Excel report generated! Sending file...") # English text
-            await ctx.send(file=discord.File(excel_filename))
-            try: os.remove(excel_filename) # Delete file after sending
-            except OSError as e: print(f"Could not delete sent Excel file: {e}") # English comment
-        except discord.HTTPException as e: # File too large or other HTTP error
-            # Try to get file size (may not always work depending on error)
-            file_size_bytes = 0
-            try:
-                file_size_bytes = os.path.getsize(excel_filename)
-            except OSError:
-                pass # Ignore if size cannot be retrieved
-
-            # Format file size for display
-            if file_size_bytes > 1024 * 1024:
-                size_str = f"{file_size_bytes / (1024*1024):.2f} MB"
-            elif file_size_bytes > 1024:
-                size_str = f"{file_size_bytes / 1024:.2f} KB"
-            else:
-                size_str = f"{file_size_bytes} bytes"
+    if report is None: # generate_excel returned None (generation error)
+        return await msg.edit(content="❌ Failed to generate Excel report (an error occurred).")
 
-            await msg.edit(content=f"❌ Error sending Excel (File size: {size_str} - Discord limit is ~25MB): {e.status} - {e.text}") # English text
-            # Try to delete the large file
-            if os.path.exists(excel_filename):
-                try: os.remove(excel_filename)
-                except: pass
-        except Exception as e:
-            await msg.edit(content=f"❌ An unexpected error occurred while sending the Excel file: {e}") # English text
-            print(f"Excel sending error: {e}") # English comment
-            traceback.print_exc()
-    elif excel_filename is None: # generate_excel returned None (generation error)
-         await msg.edit(content="❌ Failed to generate Excel report (an error occurred).") # English text
-    else: # Filename exists but file doesn't (unexpected)
-         await msg.edit(content="❌ Excel report generated but the file could not be found.") # English text
+    excel_filename, excel_bytes = report
+    with trace_span("persistence", "report_store.put"):
+        stored = ARTIFACT_STORE_ENABLED and get_guild_state(ctx.guild).report_store.put(excel_filename, excel_bytes)
+    try:
+        outbound.edit(msg, content="✅ Excel report generated! Sending file...")
+        # Upload straight from memory (queued behind the edit above on the same channel)
+        await outbound.send(ctx, file=discord.File(io.BytesIO(excel_bytes), filename=excel_filename))
+    except discord.HTTPException as e: # File too large or other HTTP error
+        size_str = format_file_size(len(excel_bytes))
+        stored_note = f"\nℹ️ The report was kept as `{excel_filename}` (see `!listexcels`)." if stored else ""
+        await msg.edit(content=f"❌ Error sending Excel (File size: {size_str} - Discord limit is ~25MB): {e.status} - {e.text}{stored_note}")
+    except Exception as e:
+        await msg.edit(content=f"❌ An unexpected error occurred while sending the Excel file: {e}")
+        log_reports.exception("Excel sending error: %s", e)
 
 
 @bot.command(name="listexcels")
 @admin_only()
 async def list_excels(ctx):
-    """Lists available Excel (.xlsx) files."""
+    """Lists Excel (.xlsx) reports kept in the guild's report store."""
+    if not ARTIFACT_STORE_ENABLED:
+        return await ctx.send("ℹ️ Report storage is disabled; reports are only sent directly.")
+    report_store = get_guild_state(ctx.guild).report_store
     try:
-        # Consider listing only files matching the bot's naming pattern for clarity
-        # pattern = r"^[a-zA-Z0-9_-]+_statistics_\d{8}_\d{6}(?:_\d)?\.xlsx$"
-        excel_files = [f for f in os.listdir('.') if f.endswith('.xlsx')] # List all .xlsx for now
-        if excel_files:
+        stored_reports = report_store.list() # Most recently used first
+        if stored_reports:
+            lines = [f"{name} ({format_file_size(size)})" for name, size in stored_reports]
             # Truncate list if too long
-            if len(excel_files) > 20:
-                 file_list = "\n".join(excel_files[:20]) + f"\n... ({len(excel_files) - 20} more)" # English text
+            if len(lines) > 20:
+                 file_list = "\n".join(lines[:20]) + f"\n... ({len(lines) - 20} more)"
             else:
-                 file_list = "\n".join(excel_files)
-            await ctx.send("📊 Available Excel files:\n```\n" + file_list + "\n```") # English text
+                 file_list = "\n".join(lines)
+            usage = f"{format_file_size(report_store.total_bytes)} / {format_file_size(report_store.max_bytes)}"
+            await ctx.send(f"📊 Stored Excel reports ({usage} used):\n```\n" + file_list + "\n```")
         else:
             await ctx.send("ℹ️ No Excel files found.") # English text
     except Exception as e:
         await ctx.send(f"❌ Error listing files: {e}") # English text
-        print(f"Error (listexcels): {e}") # English comment
+        log_commands.error("Error (listexcels): %s", e)
+
+@bot.command(name="getexcel")
+@admin_only()
+async def get_excel(ctx, *, filename: str):
+    """Sends a stored Excel report of this guild again."""
+    # Security: Prevent path traversal attacks
+    if not ArtifactStore.is_valid_name(filename):
+        return await ctx.send("❌ Error: Invalid filename or format.")
+    data = get_guild_state(ctx.guild).report_store.get(filename)
+    if data is None:
+        return await ctx.send(f"❌ File not found: {filename}")
+    await ctx.send(file=discord.File(io.BytesIO(data), filename=filename))
 
 @bot.command(name="deleteexcel")
 @admin_only()
 async def delete_excel(ctx, *, filename: str):
-    """Deletes the specified Excel file."""
+    """Deletes the specified Excel file from the guild's report store."""
     # Security: Prevent path traversal attacks
-    clean_filename = os.path.basename(filename) # Get only the filename part
-    if clean_filename != filename or not clean_filename.endswith('.xlsx'):
+    if not ArtifactStore.is_valid_name(filename):
         return await ctx.send("❌ Error: Invalid filename or format.") # English text
 
-    # File path (assuming current directory)
-    file_path = os.path.join(".", clean_filename) # Current directory
-
-    if os.path.exists(file_path):
-        try:
-            os.remove(file_path)
-            await ctx.send(f"✅ Deleted: {clean_filename}") # English text
-        except OSError as e:
-            await ctx.send(f"❌ Error deleting file: {e}") # English text
-        except Exception as e:
-             await ctx.send(f"❌ Unexpected error: {e}") # English text
-    else:
-        await ctx.send(f"❌ File not found: {clean_filename}") # English text
+    try:
+        if get_guild_state(ctx.guild).report_store.delete(filename):
+            await ctx.send(f"✅ Deleted: {filename}")
+        else:
+            await ctx.send(f"❌ File not found: {filename}")
+    except OSError as e:
+        await ctx.send(f"❌ Error deleting file: {e}")
 
 @bot.command(name="stats")
+@rate_limited(stats_command_limiter, authorize=stats_authorized_check)
 async def stats(ctx, member: discord.Member = None):
     """Shows statistics for the specified user (or yourself) (Includes Art Count)."""
-    # Authorization check (uses updated stats_authorized_check)
-    if not await stats_authorized_check(ctx):
-        # Don't send error, just try to silently delete invocation message
-        try:
-            if ctx.guild: await ctx.message.delete()
-        except (discord.Forbidden, discord.HTTPException): pass
-        return
-
     target_member = member or ctx.author # If member not specified, use command author
 
     # Use helper function to generate embeds
     stats_embeds = await generate_user_stats_embeds(target_member)
 
-    # Send embeds one by one (to avoid potential combined length issues)
-    for embed in stats_embeds:
-        await ctx.send(embed=embed)
+    await send_paginated(ctx, EmbedPageSource(stats_embeds, filename=f"stats_{target_member.id}.txt"), author_id=ctx.author.id)
 
 @stats.error
 async def stats_error(ctx, error):
@@ -1327,15 +3234,14 @@ async def stats_error(ctx, error):
 
     if isinstance(error, MemberNotFound):
         if is_authorized_now: await ctx.send("❌ Error: Member not found.") # English text
-    elif isinstance(error, CheckFailure):
-        # This handles the case where stats_authorized_check returned False
-        pass # Already handled silently by deleting the message
+    elif isinstance(error, (CheckFailure, commands.CommandOnCooldown)):
+        # Unauthorized: deleted silently by SilentBot; rate limited: answered by the global handler
+        pass
     elif isinstance(error, BadArgument):
         if is_authorized_now: await ctx.send("❌ Error: Invalid argument.") # English text
     else: # Unexpected errors
         # Log regardless of authorization
-        print(f"Error (stats): {error}") # English comment
-        traceback.print_exc()
+        log_commands.error("Error (stats): %s", error, exc_info=error)
         # Only send generic error if the user would have been authorized
         if is_authorized_now: await ctx.send(f"❌ An unexpected error occurred: {error}") # English text
 
@@ -1345,95 +3251,70 @@ async def stats_error(ctx, error):
          except: pass
 
 
+@bot.command(name="top")
+async def top(ctx, metric: str, count: int = 10):
+    """Shows the top users for a metric (messages, tweets, art, won, joined) from the guild's live leaderboards."""
+    if not await stats_authorized_check(ctx):
+        try:
+            if ctx.guild: await ctx.message.delete()
+        except (discord.Forbidden, discord.HTTPException): pass
+        return
+
+    metric = LEADERBOARD_ALIASES.get(metric.lower(), metric.lower())
+    if metric not in LEADERBOARD_METRICS:
+        return await ctx.send(f"❌ Error: Unknown metric. Use one of: {', '.join(LEADERBOARD_METRICS)}.")
+    count = max(1, min(count, 50))
+    label = LEADERBOARD_METRICS[metric][1]
+
+    guild_state = get_guild_state(ctx.guild)
+    leaderboard = guild_state.leaderboards[metric]
+    lines, seen, offset = [], set(), 0
+    while len(lines) < count:
+        # A batch of candidates at a time (fetched together in lean memory mode); a fresh iterator per batch,
+        # since the leaderboard can change while members are fetched
+        batch = list(itertools.islice(leaderboard.iter_top(), offset, offset + MEMBER_QUERY_BATCH))
+        if not batch: break
+        offset += len(batch)
+        members = await fetch_members(ctx.guild, [int(user_id_str) for user_id_str, _ in batch])
+        for user_id_str, value in batch:
+            if user_id_str in seen: continue
+            seen.add(user_id_str)
+            member = members.get(int(user_id_str))
+            # Only rank current members that are tracked
+            if not member or not guild_state.is_tracked(member): continue
+            lines.append(f"**{len(lines) + 1}.** {member.display_name} — {value:,}")
+            if len(lines) >= count: break
+
+    if not lines:
+        return await ctx.send(f"ℹ️ No {label.lower()} recorded yet.")
+    embed = discord.Embed(title=f"🏆 Top {len(lines)} — {label}", description="\n".join(lines), color=discord.Color.gold())
+    await ctx.send(embed=embed)
+
 @bot.command(name="filteruserid")
 @admin_only()
 async def filter_user_id(ctx, *args):
     """Filters users based on numeric and role filters (including artcount)."""
-    # Updated to handle artcount filter (including range)
-    numeric_filters = [] # Holds both simple and range filters
-    role_filter_object = None
-    nothaverole_filter_object = None
-    id_only = False
-    i = 0
-    while i < len(args):
-        arg = args[i]
-        if arg.lower() == "id":
-            id_only = True
-        else:
-            # Try parsing numeric filters (simple or range)
-            numeric_filter = parse_numeric_filter(arg)
-            if numeric_filter:
-                numeric_filters.append(numeric_filter)
-            elif arg.lower() == "nothaverole" and i + 1 < len(args):
-                i += 1; next_arg = args[i]
-                try: role = await commands.RoleConverter().convert(ctx, next_arg)
-                except commands.RoleNotFound: return await ctx.send(f"❌ Error: Role for 'nothaverole' not found: '{next_arg}'") # English text
-                except Exception as e: return await ctx.send(f"❌ Error processing 'nothaverole' role: {e}") # English text
-                if role:
-                    if nothaverole_filter_object is None: nothaverole_filter_object = role
-                    else: return await ctx.send("❌ Error: Only one 'nothaverole' filter allowed.") # English text
-            else: # Assume it might be a role filter
-                try: role = await commands.RoleConverter().convert(ctx, arg)
-                except commands.RoleNotFound: return await ctx.send(f"❌ Error: Unrecognized filter or argument: '{arg}'") # English text
-                except Exception as e: return await ctx.send(f"❌ Error processing role filter: {e}") # English text
-                if role:
-                    if role_filter_object is None: role_filter_object = role
-                    else: return await ctx.send("❌ Error: Only one role filter allowed.") # English text
-        i += 1
-
-    # Filter users
+    try: user_filter, keywords = await parse_filter_args(ctx, args, keywords=("id",))
+    except BadArgument as e: return await ctx.send(f"❌ Error: {e}")
+    id_only = "id" in keywords
+
+    # Filter users (vectorized over the guild's columnar table)
+    guild_state = get_guild_state(ctx.guild)
+    members = await fetch_members(ctx.guild, guild_state.stats_table.candidate_ids(user_filter)) if LEAN_MEMORY else None
+    get_member = members.get if members is not None else ctx.guild.get_member
     filtered_users = []
-    current_stats_data = stats_data.copy() # Work on a copy
-    op_map = {">": lambda a, b: a > b, "<": lambda a, b: a < b, ">=": lambda a, b: a >= b, "<=": lambda a, b: a <= b, "=": lambda a, b: a == b, "!=": lambda a, b: a != b}
-
-    for user_id_str, data in current_stats_data.items():
-        if not user_id_str.isdigit() or not isinstance(data, dict): continue
-        try: user_id = int(user_id_str)
-        except ValueError: continue
-        member = ctx.guild.get_member(user_id)
-        if not member or (TARGET_ROLES and not any(role.id in TARGET_ROLES for role in member.roles)): continue
-
-        # --- Apply Filters ---
-        pass_filters = True
-        # Role Filters
-        if role_filter_object and (role_filter_object not in member.roles): pass_filters = False
-        if not_have_role_object and (not_have_role_object in member.roles): pass_filters = False
-
-        # Numeric Filters
-        if pass_filters:
-            for filt in numeric_filters:
-                user_val = 0
-                field = filt[0]
-                # Get user value for the field
-                if field == "total_message_count": user_val = data.get("total_message_count", 0)
-                elif field == "tweet_count": user_val = len(data.get("twitter_links", []))
-                elif field == "joined": user_val = len(data.get("events", []))
-                elif field == "won": user_val = len(data.get("winners", []))
-                elif field == "art_count": user_val = data.get("art_count", 0) # NEW
-
-                # Apply filter based on tuple length
-                if len(filt) == 3: # Simple filter
-                    _, operator, filter_value = filt
-                    if operator not in op_map or not op_map[operator](user_val, filter_value):
-                        pass_filters = False; break
-                elif len(filt) == 5: # Range filter
-                    _, lower_op, lower_val, upper_op, upper_val = filt
-                    # Check lower bound
-                    if lower_op not in op_map or not op_map[lower_op](user_val, lower_val):
-                        pass_filters = False; break
-                    # Check upper bound
-                    if upper_op not in op_map or not op_map[upper_op](user_val, upper_val):
-                        pass_filters = False; break
-        # --- Filters End ---
-
-        if pass_filters: # Add if all filters passed
-            filtered_users.append((user_id_str, member.display_name))
+    for row in guild_state.stats_table.query(ctx.guild, user_filter, guild_state.target_roles, members).tolist():
+        user_id_str = guild_state.stats_table.user_ids[row]
+        member = get_member(int(user_id_str))
+        if member: filtered_users.append((user_id_str, member.display_name))
 
     # Send results
     if not filtered_users:
         return await ctx.send("ℹ️ No users match the specified filters.") # English text
 
-    filtered_users.sort(key=lambda x: x[1].lower()) # Sort by display name
+    # Sort by display name
+    order = np.argsort(np.array([name.lower() for _, name in filtered_users]), kind="stable")
+    filtered_users = [filtered_users[i] for i in order.tolist()]
 
     result_lines = []
     if id_only:
@@ -1441,41 +3322,110 @@ async def filter_user_id(ctx, *args):
     else:
         result_lines = [f"{user_id} - {name}" for user_id, name in filtered_users]
 
-    result_text = "\n".join(result_lines)
-    # Split results into chunks of 1900 chars (leaving room for code block formatting)
-    chunks = chunk_text_by_size(result_text, 1900)
-
     total_found = len(filtered_users)
-    for i, chunk in enumerate(chunks):
-        header = f"Filtered Users (Total: {total_found})" # English text
-        if len(chunks) > 1:
-            header = f"Filtered Users (Part {i+1}/{len(chunks)}, Total: {total_found})" # English text
-        # Consider sending as plain text instead of code block if mentions are desired (but they won't ping)
-        await ctx.send(f"```\n{header}\n\n{chunk}\n```")
-
+    source = TextPageSource([(None, result_lines)], title=f"Filtered Users (Total: {total_found})", filename="filtered_users.txt")
+    await send_paginated(ctx, source, author_id=ctx.author.id)
+
+
+# --- ID ATTACHMENTS ---
+ID_ATTACHMENT_EXTENSIONS = (".txt", ".csv")
+ID_ATTACHMENT_MAX_BYTES = 8 * 1024 * 1024 # ~400k IDs
+ID_ATTACHMENT_CHUNK_SIZE = 64 * 1024
+MENTION_ID_PATTERN = re.compile(r"^<@!?(\d+)>$")
+
+def id_attachments(ctx):
+    """The .txt/.csv attachments of the invoking message (raises BadArgument if one is too large)."""
+    attachments = [a for a in ctx.message.attachments if a.filename.lower().endswith(ID_ATTACHMENT_EXTENSIONS)]
+    for attachment in attachments:
+        if attachment.size > ID_ATTACHMENT_MAX_BYTES:
+            raise BadArgument(f"'{attachment.filename}' is larger than {format_file_size(ID_ATTACHMENT_MAX_BYTES)}")
+    return attachments
+
+def _line_id_tokens(line, csv_mode):
+    """ID tokens of one attachment line: the first column for .csv, every whitespace/comma separated token for .txt."""
+    text = line.decode("utf-8", errors="replace").strip().lstrip("\ufeff")
+    if not text: return []
+    tokens = [text.split(",", 1)[0]] if csv_mode else text.replace(",", " ").split()
+    out = []
+    for token in tokens:
+        token = token.strip().strip('"').strip("'")
+        mention = MENTION_ID_PATTERN.match(token)
+        if mention: token = mention.group(1)
+        if token: out.append(token)
+    return out
+
+async def iter_attachment_lines(attachment):
+    """Streams the lines (bytes, without newline) of an attachment in ID_ATTACHMENT_CHUNK_SIZE chunks."""
+    buffer = b""
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(attachment.url) as response:
+                response.raise_for_status()
+                async for chunk in response.content.iter_chunked(ID_ATTACHMENT_CHUNK_SIZE):
+                    buffer += chunk
+                    *lines, buffer = buffer.split(b"\n")
+                    for line in lines: yield line
+    except aiohttp.ClientError as e:
+        raise BadArgument(f"could not read '{attachment.filename}' ({e})")
+    if buffer: yield buffer
+
+async def iter_attachment_ids(attachment):
+    """Streams ID tokens out of a .txt/.csv attachment without loading the whole file; a non-numeric first line (CSV header) is skipped."""
+    csv_mode = attachment.filename.lower().endswith(".csv")
+    first_line = True
+    async for line in iter_attachment_lines(attachment):
+        found = _line_id_tokens(line, csv_mode)
+        if found and first_line:
+            first_line = False
+            if not found[0].isdigit(): continue # Header row
+        for token in found: yield token
+
+async def iter_command_ids(ctx, args):
+    """ID arguments followed by the IDs of any attached .txt/.csv files, so one invocation handles the whole batch."""
+    attachments = id_attachments(ctx)
+    count = 0
+    for arg in args:
+        count += 1
+        yield arg
+    for attachment in attachments:
+        async for token in iter_attachment_ids(attachment):
+            count += 1
+            yield token
+    trace_note(ids=count)
+
+async def fetch_command_members(ctx, args):
+    """
+    Collects the tokens of iter_command_ids() and fetches the members among them with one fetch_members() call
+    (lean memory mode has no full member cache). Returns (tokens in order, {user ID: Member}).
+    """
+    tokens = [token async for token in iter_command_ids(ctx, args)]
+    user_ids = [int(token.strip()) for token in tokens if token.strip().isdigit()]
+    return tokens, await fetch_members(ctx.guild, user_ids)
 
 # --- EVENT MANAGEMENT COMMANDS ---
 # (User messages translated to English)
 async def _modify_event(ctx, event_name: str, user_ids: tuple[str], action: str):
-    if not event_name or not user_ids:
-        return await ctx.send("❌ Error: Event name and at least one user ID are required.") # English text
+    guild_state = get_guild_state(ctx.guild)
+    if not event_name or not (user_ids or id_attachments(ctx)):
+        return await ctx.send("❌ Error: Event name and at least one user ID (or an attached .txt/.csv of IDs) are required.")
 
     event_name_std = standardize_event_name(event_name)
     processed, not_found, no_change = [], [], []
     changed = False
     processed_ids = set()
 
-    for id_str in user_ids:
+    id_tokens, members = await fetch_command_members(ctx, user_ids)
+    for id_str in id_tokens:
         try:
             user_id = int(id_str.strip())
             if user_id in processed_ids: continue
             processed_ids.add(user_id)
-            member = ctx.guild.get_member(user_id)
+            member = members.get(user_id)
             user_id_str = str(user_id)
             display_name = member.display_name if member else f"ID:{user_id}"
 
-            if member or user_id_str in stats_data:
-                user_data = stats_data.setdefault(user_id_str, DEFAULT_USER_TEMPLATE())
+            if member or user_id_str in guild_state.stats_data:
+                user_data = guild_state.get_user_data(user_id_str)
                 events_list = user_data.setdefault("events", [])
                 winners_list = user_data.setdefault("winners", [])
                 events_std_set = {standardize_event_name(e) for e in events_list}
@@ -1503,24 +3453,21 @@ async def _modify_event(ctx, event_name: str, user_ids: tuple[str], action: str)
                         processed.append(f"{display_name} ({user_id})"); user_modified = True
                     else: no_change.append(f"{display_name} ({user_id}) (not in event)") # English text
 
-                if user_modified: changed = True
+                if user_modified:
+                    changed = True
+                    guild_state.notify_user_changed(user_id_str)
             else: not_found.append(id_str)
         except ValueError: not_found.append(id_str)
 
-    if changed: save_stats()
-    response = ""
+    if changed: guild_state.save_stats()
     verb_map = {"addevent": "Added", "eventwinners": "Marked as winner", "notjoined": "Removed"} # English text
-    if processed: response += f"✅ {verb_map[action]} for event '{event_name}':\n```\n" + "\n".join(processed) + "\n```\n" # English text
-    if no_change: response += f"ℹ️ No change for event '{event_name}':\n```\n" + "\n".join(no_change) + "\n```\n" # English text
-    if not_found: response += f"❌ Users not found/invalid: {', '.join(not_found)}\n" # English text
-    if not response: response = "ℹ️ No valid users found to process or no changes needed." # English text
-    # Send response in chunks if too long
-    if len(response) > 2000:
-        await ctx.send(f"Results for '{action}' on event '{event_name}' (split):") # English text
-        for chunk in chunk_text_by_size(response, 1950):
-            await ctx.send(chunk)
-    elif response:
-        await ctx.send(response)
+    sections = [
+        (f"✅ {verb_map[action]} for event '{event_name}':", processed),
+        (f"ℹ️ No change for event '{event_name}':", no_change),
+        ("❌ Users not found/invalid:", not_found),
+    ]
+    if not (processed or no_change or not_found): return await ctx.send("ℹ️ No valid users found to process or no changes needed.")
+    await send_paginated(ctx, TextPageSource(sections, filename=f"{action}_results.txt"), author_id=ctx.author.id)
 
 
 @bot.command(name="addevent")
@@ -1536,26 +3483,34 @@ async def not_joined(ctx, event_name: str, *user_ids: str): await _modify_event(
 @bot.command(name="delevent")
 @admin_only()
 async def del_event(ctx, *, event_name: str):
+    guild_state = get_guild_state(ctx.guild)
     if not event_name: return await ctx.send("❌ Error: Event name is required.") # English text
     event_name_std = standardize_event_name(event_name)
     affected_users_count, changed = 0, False
-    user_ids_to_process = [uid for uid in stats_data.keys() if uid.isdigit()]
+    user_ids_to_process = [uid for uid in guild_state.stats_data.keys() if uid.isdigit()]
 
     for user_id in user_ids_to_process:
-        data = stats_data[user_id]; modified = False
+        data = guild_state.stats_data[user_id]
+        modified = False
         if not isinstance(data, dict): continue
         olen1 = len(data.get("events", [])); new_events = [e for e in data.get("events", []) if standardize_event_name(e) != event_name_std]
         if len(new_events) < olen1: data["events"] = new_events; modified = True
         olen2 = len(data.get("winners", [])); new_winners = [w for w in data.get("winners", []) if standardize_event_name(w) != event_name_std]
         if len(new_winners) < olen2: data["winners"] = new_winners; modified = True
-        if modified: affected_users_count += 1; changed = True
-
-    if changed: save_stats(); await ctx.send(f"✅ Event '{event_name}' deleted from {affected_users_count} user records.") # English text
+        if modified:
+            affected_users_count += 1
+            changed = True
+            guild_state.notify_user_changed(user_id)
+
+    if changed:
+        guild_state.save_stats()
+        await ctx.send(f"✅ Event '{event_name}' deleted from {affected_users_count} user records.")
     else: await ctx.send(f"ℹ️ No records found for event '{event_name}' to delete.") # English text
 
 @bot.command(name="copyevent")
 @admin_only()
 async def copy_event(ctx, channel: discord.VoiceChannel | discord.StageChannel, *, event_name: str):
+    guild_state = get_guild_state(ctx.guild)
     if not event_name: return await ctx.send("❌ Error: Event name is required.") # English text
     if not channel: return await ctx.send(f"❌ Error: Valid voice or stage channel not found.") # English text
 
@@ -1567,15 +3522,17 @@ async def copy_event(ctx, channel: discord.VoiceChannel | discord.StageChannel,
 
     for member in current_members:
         if member.bot: continue
-        if TARGET_ROLES and not any(role.id in TARGET_ROLES for role in member.roles):
+        if not guild_state.is_tracked(member):
             not_target_role.append(f"{member.display_name} ({member.id})"); continue
-        user_id = str(member.id); user_data = stats_data.setdefault(user_id, DEFAULT_USER_TEMPLATE())
+        user_id = str(member.id)
+        user_data = guild_state.get_user_data(user_id)
         current_events_std = {standardize_event_name(e) for e in user_data.get("events", [])}
         if event_name_std not in current_events_std:
             user_data.setdefault("events", []).append(event_name); added.append(f"{member.display_name} ({member.id})"); changed = True
+            guild_state.notify_user_changed(user_id)
         else: already_added.append(f"{member.display_name} ({member.id})")
 
-    if changed: save_stats()
+    if changed: guild_state.save_stats()
     response = ""
     if added: response += f"✅ Added {len(added)} members from {channel.mention} to event '{event_name}'.\n" # English text
     if already_added: response += f"ℹ️ {len(already_added)} members were already in event '{event_name}'.\n" # English text
@@ -1584,11 +3541,253 @@ async def copy_event(ctx, channel: discord.VoiceChannel | discord.StageChannel,
     if len(response) > 2000: response = response[:1997] + "..."
     await ctx.send(response)
 
+def format_duration(seconds):
+    """Short duration text, e.g. '1h 5m' or '45s'."""
+    hours, rest = divmod(int(seconds), 3600)
+    minutes, secs = divmod(rest, 60)
+    parts = ([f"{hours}h"] if hours else []) + ([f"{minutes}m"] if minutes else []) + ([f"{secs}s"] if secs and not hours else [])
+    return " ".join(parts) or "0s"
+
+@bot.command(name="openevent")
+@admin_only()
+async def open_event(ctx, *args):
+    """Starts attendance tracking: !openevent <#channel or ID> [more channels...] [min=10m] <event_name>"""
+    guild_state = get_guild_state(ctx.guild)
+    channels, i = [], 0
+    while i < len(args):
+        match = re.fullmatch(r"<#(\d+)>|(\d{15,20})", args[i])
+        if not match: break
+        channel = ctx.guild.get_channel(int(match.group(1) or match.group(2)))
+        if not isinstance(channel, (discord.VoiceChannel, discord.StageChannel)):
+            return await ctx.send(f"❌ Error: {args[i]} is not a voice or stage channel.")
+        if channel not in channels: channels.append(channel)
+        i += 1
+    rest = list(args[i:])
+    min_seconds = ATTENDANCE_DEFAULT_MIN_SECONDS
+    if rest and rest[0].lower().startswith("min="):
+        min_seconds = parse_cooldown_duration(rest.pop(0)[4:])
+        if min_seconds is None: return await ctx.send("❌ Error: Invalid minimum duration (e.g., 10m, 1h).")
+    event_name = " ".join(rest).strip()
+    if not channels or not event_name:
+        return await ctx.send("❌ Error: Usage: `!openevent <#channel or ID> [more channels...] [min=10m] <event_name>`")
+
+    key = standardize_event_name(event_name)
+    sessions = attendance_sessions.setdefault(ctx.guild.id, {})
+    if key in sessions: return await ctx.send(f"ℹ️ Attendance for event '{event_name}' is already open.")
+    busy = [c.mention for c in channels if any(c.id in s.channel_ids for s in sessions.values())]
+    if busy: return await ctx.send(f"❌ Error: {', '.join(busy)} already tracked by another open event.")
+
+    session = AttendanceSession(event_name, ctx.guild.id, [c.id for c in channels], min_seconds, time_module.time(), ctx.author.id)
+    sessions[key] = session
+    reconcile_attendance(ctx.guild) # Members already inside start counting now
+    guild_state.save_stats()
+    await ctx.send(f"✅ Attendance tracking opened for event '{event_name}' in {', '.join(c.mention for c in channels)}. "
+                   f"Members need at least {format_duration(min_seconds)} in total to count as joined ({len(session.active)} inside now). "
+                   f"Use `!closeevent {event_name}` to commit.")
+
+@bot.command(name="closeevent")
+@admin_only()
+async def close_event(ctx, *, event_name: str):
+    """Stops attendance tracking and adds everyone above the minimum time to the event's joined list in one batch."""
+    guild_state = get_guild_state(ctx.guild)
+    key = standardize_event_name(event_name)
+    session = attendance_sessions.get(ctx.guild.id, {}).get(key)
+    if not session: return await ctx.send(f"❌ Error: No open attendance tracking for event '{event_name}'.")
+
+    now = time_module.time()
+    for user_id in list(session.active): session.leave(user_id, now)
+    attendance_sessions[ctx.guild.id].pop(key) # Detach before any await: voice updates and a second !closeevent no longer see it
+    totals = session.totals(now)
+    event_name = session.event_name
+    members = await fetch_members(ctx.guild, list(totals)) # Attendees who left the channels are not cached in lean memory mode
+    added, already, too_short, skipped = [], [], [], []
+    for user_id, seconds in sorted(totals.items(), key=lambda item: -item[1]):
+        member = members.get(user_id)
+        label = f"{member.display_name if member else f'ID:{user_id}'} ({user_id}) - {format_duration(seconds)}"
+        if seconds < session.min_seconds:
+            too_short.append(label)
+            continue
+        if member is None:
+            skipped.append(f"{label} (left server)")
+            continue
+        if not guild_state.is_tracked(member):
+            skipped.append(f"{label} (not in target roles)")
+            continue
+        user_id_str = str(user_id)
+        user_data = guild_state.get_user_data(user_id_str)
+        if any(standardize_event_name(e) == key for e in user_data.get("events", [])):
+            already.append(label)
+            continue
+        user_data.setdefault("events", []).append(event_name)
+        guild_state.notify_user_changed(user_id_str)
+        added.append(label)
+
+    guild_state.save_stats() # Single flush for the whole event (also removes the closed session from the file)
+    sections = [
+        (f"✅ Added to event '{event_name}' ({len(added)}):", added),
+        (f"ℹ️ Already in event ({len(already)}):", already),
+        (f"⏱️ Below minimum of {format_duration(session.min_seconds)} ({len(too_short)}):", too_short),
+        (f"⚠️ Skipped ({len(skipped)}):", skipped),
+    ]
+    if not totals: return await ctx.send(f"ℹ️ Attendance for '{event_name}' closed. Nobody attended the tracked channels.")
+    title = f"Attendance for '{event_name}' closed after {format_duration(now - session.opened_at)} ({len(totals)} attendees)"
+    await send_paginated(ctx, TextPageSource(sections, title=title, filename=f"attendance_{sanitize_filename(event_name)}.txt"), author_id=ctx.author.id)
+
+@bot.command(name="attendance")
+@admin_only()
+async def attendance_status(ctx):
+    """Lists events with open attendance tracking in this server."""
+    sessions = attendance_sessions.get(ctx.guild.id, {})
+    if not sessions: return await ctx.send("ℹ️ No events with open attendance tracking.")
+    now = time_module.time()
+    lines = []
+    for session in sessions.values():
+        totals = session.totals(now)
+        qualified = sum(1 for seconds in totals.values() if seconds >= session.min_seconds)
+        channels = ", ".join(f"<#{cid}>" for cid in sorted(session.channel_ids))
+        lines.append(f"**{session.event_name}** - {channels} - open {format_duration(now - session.opened_at)}, "
+                     f"{len(session.active)} inside, {len(totals)} attended, {qualified} above {format_duration(session.min_seconds)}")
+    await ctx.send("🎙️ Open attendance tracking:\n" + "\n".join(lines))
+
+# Accepted spellings of the status column in !importevents
+EVENT_IMPORT_STATUSES = {"joined": "joined", "join": "joined", "participant": "joined", "winner": "winner", "won": "winner", "win": "winner",
+                         "notjoined": "notjoined", "remove": "notjoined", "removed": "notjoined"}
+EVENT_IMPORT_MAX_ERRORS = 1000 # Error lines kept for the report (all are counted)
+
+def parse_event_import_row(line):
+    """Parses one CSV line into (event_name, user_id_str, status); raises ValueError with the reason."""
+    fields = next(csv.reader([line]), [])
+    if len(fields) < 3: raise ValueError("expected 3 columns: event, user_id, status")
+    event_name, user_id, status = (field.strip() for field in fields[:3])
+    if not event_name: raise ValueError("empty event name")
+    if not user_id.isdigit(): raise ValueError(f"invalid user ID '{user_id}'")
+    status_key = EVENT_IMPORT_STATUSES.get(re.sub(r"[\s_-]", "", status.lower()))
+    if status_key is None: raise ValueError(f"unknown status '{status}' (use joined, winner or notjoined)")
+    return event_name, str(int(user_id)), status_key
+
+def apply_event_import(guild_state, ops_by_user):
+    """
+    Applies {user_id_str: [(event_name, status), ...]} to the guild's records in one pass, in row order per user.
+    Each user's normalized event/winner sets are built once and derived indexes are notified once.
+    Returns counts: joined / winner / notjoined (changes made), unchanged, users (records modified).
+    """
+    counts = dict.fromkeys(("joined", "winner", "notjoined", "unchanged", "users"), 0)
+    for user_id_str, ops in ops_by_user.items():
+        if user_id_str not in guild_state.stats_data and all(status == "notjoined" for _, status in ops):
+            counts["unchanged"] += len(ops) # Nothing to remove; don't create an empty record
+            continue
+        user_data = guild_state.get_user_data(user_id_str)
+        events_list = user_data.setdefault("events", [])
+        winners_list = user_data.setdefault("winners", [])
+        events_std = {standardize_event_name(e) for e in events_list}
+        winners_std = {standardize_event_name(w) for w in winners_list}
+        modified = False
+        for event_name, status in ops:
+            event_std = standardize_event_name(event_name)
+            if status == "notjoined":
+                if event_std not in events_std and event_std not in winners_std:
+                    counts["unchanged"] += 1
+                    continue
+                user_data["events"] = events_list = [e for e in events_list if standardize_event_name(e) != event_std]
+                user_data["winners"] = winners_list = [w for w in winners_list if standardize_event_name(w) != event_std]
+                events_std.discard(event_std)
+                winners_std.discard(event_std)
+                counts["notjoined"] += 1
+                modified = True
+                continue
+            changed = False
+            if event_std not in events_std:
+                events_list.append(event_name)
+                events_std.add(event_std)
+                changed = True
+            if status == "winner" and event_std not in winners_std:
+                winners_list.append(event_name)
+                winners_std.add(event_std)
+                changed = True
+            if changed:
+                counts[status] += 1
+                modified = True
+            else: counts["unchanged"] += 1
+        if modified:
+            counts["users"] += 1
+            guild_state.notify_user_changed(user_id_str)
+    return counts
+
+@bot.command(name="importevents")
+@admin_only()
+async def import_events(ctx, *options: str):
+    """Imports event results from an attached CSV (event, user_id, status). Options: dryrun, strict."""
+    guild_state = get_guild_state(ctx.guild)
+    options = {option.lower() for option in options}
+    dry_run, strict = "dryrun" in options, "strict" in options
+    attachments = [a for a in id_attachments(ctx) if a.filename.lower().endswith(".csv")]
+    if not attachments: return await ctx.send("❌ Error: Attach a .csv file with the columns: event, user_id, status.")
+
+    started = time_module.perf_counter()
+    msg = await ctx.send(f"⏳ Reading {len(attachments)} CSV file(s)...")
+    ops_by_user, errors = {}, []
+    unknown_rows = [] # (where, event, user ID, status) of rows whose user has no stats yet; checked against the server below
+    rows = valid = error_count = 0
+    for attachment in attachments:
+        line_number = 0
+        async for raw_line in iter_attachment_lines(attachment):
+            line_number += 1
+            line = raw_line.decode("utf-8", errors="replace").strip().lstrip("\ufeff")
+            if not line: continue
+            try: event_name, user_id_str, status = parse_event_import_row(line)
+            except ValueError as e:
+                fields = next(csv.reader([line]), [])
+                if line_number == 1 and not (len(fields) > 1 and fields[1].strip().isdigit()): continue # Header row
+                reason = str(e)
+            else:
+                reason = None
+                if user_id_str not in guild_state.stats_data:
+                    rows += 1
+                    unknown_rows.append((f"{attachment.filename}:{line_number}", event_name, user_id_str, status))
+                    continue
+            rows += 1
+            if reason:
+                error_count += 1
+                if len(errors) < EVENT_IMPORT_MAX_ERRORS: errors.append(f"{attachment.filename}:{line_number}: {reason}")
+                continue
+            ops_by_user.setdefault(user_id_str, []).append((event_name, status))
+            valid += 1
+    members = await fetch_members(ctx.guild, [int(user_id_str) for _, _, user_id_str, _ in unknown_rows])
+    for where, event_name, user_id_str, status in unknown_rows:
+        if int(user_id_str) not in members:
+            error_count += 1
+            if len(errors) < EVENT_IMPORT_MAX_ERRORS: errors.append(f"{where}: user {user_id_str} not found in server or stats")
+            continue
+        ops_by_user.setdefault(user_id_str, []).append((event_name, status))
+        valid += 1
+
+    applied = not dry_run and not (strict and error_count) and valid > 0
+    counts = None
+    if applied:
+        counts = apply_event_import(guild_state, ops_by_user)
+        if counts["users"]: guild_state.save_stats() # One flush for the whole import
+    elapsed = time_module.perf_counter() - started
+
+    if applied:
+        summary = [f"Joined added: {counts['joined']}", f"Winners added: {counts['winner']}", f"Removed from events: {counts['notjoined']}",
+                   f"Unchanged: {counts['unchanged']}", f"Users updated: {counts['users']}"]
+        state = "✅ Imported"
+    else:
+        summary = [f"Valid rows: {valid} for {len(ops_by_user)} users"]
+        state = "ℹ️ Dry run, nothing changed" if dry_run else ("❌ Not applied (strict mode, errors found)" if error_count else "ℹ️ Nothing to import")
+    if error_count > len(errors): errors.append(f"... {error_count - len(errors)} more errors not shown")
+    sections = [("Summary:", summary), (f"❌ Row errors ({error_count}):", errors)]
+    title = f"{state}: {rows} rows, {valid} valid, {error_count} errors ({elapsed:.1f}s)"
+    await send_paginated(ctx, TextPageSource(sections, title=title, filename="importevents_report.txt"), author_id=ctx.author.id, message=msg)
+
 async def _generate_event_list_file(ctx, event_name: str, list_type: str):
+    guild_state = get_guild_state(ctx.guild)
     if not event_name: return await ctx.send("❌ Error: Event name is required.") # English text
     event_name_std = standardize_event_name(event_name)
-    users_list = []; current_stats_data = stats_data.copy()
+    users_list = []
+    current_stats_data = guild_state.stats_data.copy()
 
+    included_ids = []
     for user_id, data in current_stats_data.items():
         if not user_id.isdigit() or not isinstance(data, dict): continue
         user_events_std = {standardize_event_name(e) for e in data.get("events", [])}
@@ -1596,28 +3795,25 @@ async def _generate_event_list_file(ctx, event_name: str, list_type: str):
         include = False
         if list_type == "winnerlist" and event_name_std in user_winners_std: include = True
         elif list_type == "joinedlist" and event_name_std in user_events_std and event_name_std not in user_winners_std: include = True
-        if include:
-            try:
-                member = ctx.guild.get_member(int(user_id))
-                if member and (not TARGET_ROLES or any(role.id in TARGET_ROLES for role in member.roles)):
-                    users_list.append((user_id, member.display_name))
-            except ValueError: continue
+        if include: included_ids.append(int(user_id))
+    # One bulk lookup (lean memory mode fetches the members that are not cached)
+    members = await fetch_members(ctx.guild, included_ids)
+    for user_id in included_ids:
+        member = members.get(user_id)
+        if member and guild_state.is_tracked(member):
+            users_list.append((str(user_id), member.display_name))
 
     list_name = "Winners" if list_type == "winnerlist" else "Joined Only" # English text
     if not users_list: return await ctx.send(f"ℹ️ No {list_name.lower()} found for event '{event_name}'.") # English text
 
     users_list.sort(key=lambda x: x[1].lower())
     filename = f"{list_type}_{sanitize_filename(event_name)}_{datetime.datetime.now().strftime('%Y%m%d')}.txt"
-    try:
-        with open(filename, "w", encoding="utf-8") as f:
-            f.write(f"{list_name} for Event '{event_name}' ({len(users_list)} users):\n\n") # English text
-            for uid, name in users_list: f.write(f"{uid} - {name}\n")
-        await ctx.send(f"📄 {list_name} list for '{event_name}':", file=discord.File(filename)) # English text
+    # Build the list in memory and upload it directly
+    lines = [f"{list_name} for Event '{event_name}' ({len(users_list)} users):\n"]
+    lines.extend(f"{uid} - {name}" for uid, name in users_list)
+    content = ("\n".join(lines) + "\n").encode("utf-8")
+    try: await ctx.send(f"📄 {list_name} list for '{event_name}':", file=discord.File(io.BytesIO(content), filename=filename))
     except Exception as e: await ctx.send(f"❌ Error creating/sending file: {e}") # English text
-    finally:
-        if os.path.exists(filename):
-            try: os.remove(filename)
-            except OSError as e: print(f"Could not delete temp file '{filename}': {e}") # English comment
 
 @bot.command(name="winnerlist")
 @admin_only()
@@ -1629,8 +3825,9 @@ async def joined_list(ctx, *, event_name: str): await _generate_event_list_file(
 # --- FIX COMMANDS ---
 # (User messages translated to English)
 async def _fix_event_status(ctx, mod: str, event_name: str, user_ids: tuple[str], fix_type: str):
+    guild_state = get_guild_state(ctx.guild)
     valid_mods = {"fixwinners": ["joined", "notjoined"], "fixjoined": ["winner", "notjoined"], "fixnotjoined": ["joined", "winner"]}
-    if not mod or not event_name or not user_ids: return await ctx.send(f"❌ Error: Mode ({'/'.join(valid_mods[fix_type])}), event name, and IDs required.") # English text
+    if not mod or not event_name or not (user_ids or id_attachments(ctx)): return await ctx.send(f"❌ Error: Mode ({'/'.join(valid_mods[fix_type])}), event name, and IDs (or an attached .txt/.csv of IDs) required.")
     mod = mod.lower()
     if mod not in valid_mods[fix_type]: return await ctx.send(f"❌ Error: Mode must be one of: {', '.join(valid_mods[fix_type])}.") # English text
 
@@ -1638,16 +3835,17 @@ async def _fix_event_status(ctx, mod: str, event_name: str, user_ids: tuple[str]
     fixed, not_found, no_change_needed, skipped = [], [], [], []
     changed = False; processed_ids = set()
 
-    for id_str in user_ids:
+    id_tokens, members = await fetch_command_members(ctx, user_ids)
+    for id_str in id_tokens:
         try:
             user_id = int(id_str.strip()); user_id_str = str(user_id)
             if user_id in processed_ids: continue
             processed_ids.add(user_id)
-            member = ctx.guild.get_member(user_id)
+            member = members.get(user_id)
             display_name = member.display_name if member else f"ID:{user_id}"
 
-            if user_id_str in stats_data or member:
-                user_data = stats_data.setdefault(user_id_str, DEFAULT_USER_TEMPLATE())
+            if user_id_str in guild_state.stats_data or member:
+                user_data = guild_state.get_user_data(user_id_str)
                 events_list = user_data.setdefault("events", [])
                 winners_list = user_data.setdefault("winners", [])
                 is_winner = event_name_std in {standardize_event_name(w) for w in winners_list}
@@ -1681,24 +3879,22 @@ async def _fix_event_status(ctx, mod: str, event_name: str, user_ids: tuple[str]
                     if mod == "joined": events_list.append(event_name); user_modified = True; action_taken = "Added to 'joined' list" # English text
                     elif mod == "winner": events_list.append(event_name); winners_list.append(event_name); user_modified = True; action_taken = "Added to 'joined' and 'winner' lists" # English text
 
-                if user_modified: fixed.append(f"{display_name} ({user_id}) - {action_taken}"); changed = True
+                if user_modified:
+                    fixed.append(f"{display_name} ({user_id}) - {action_taken}")
+                    changed = True
+                    guild_state.notify_user_changed(user_id_str)
             else: not_found.append(id_str)
         except ValueError: not_found.append(id_str)
 
-    if changed: save_stats()
-    response = ""
-    if fixed: response += f"✅ Fixed status for event '{event_name}' (mode: {mod}):\n```\n" + "\n".join(fixed) + "\n```\n" # English text
-    if no_change_needed: response += f"ℹ️ No changes needed for these users in '{event_name}':\n```\n" + "\n".join(no_change_needed) + "\n```\n" # English text
-    if skipped: response += f"⚠️ Skipped (status mismatch/not found):\n```\n" + "\n".join(skipped) + "\n```\n" # English text
-    if not_found: response += f"❌ User IDs not found/invalid: {', '.join(not_found)}\n" # English text
-    if not response: response = "ℹ️ No valid users found to process." # English text
-    # Send response in chunks if too long
-    if len(response) > 2000:
-        await ctx.send(f"Results for '{fix_type}' (mode: {mod}) on event '{event_name}' (split):") # English text
-        for chunk in chunk_text_by_size(response, 1950):
-            await ctx.send(chunk)
-    elif response:
-        await ctx.send(response)
+    if changed: guild_state.save_stats()
+    sections = [
+        (f"✅ Fixed status for event '{event_name}' (mode: {mod}):", fixed),
+        (f"ℹ️ No changes needed for these users in '{event_name}':", no_change_needed),
+        ("⚠️ Skipped (status mismatch/not found):", skipped),
+        ("❌ User IDs not found/invalid:", not_found),
+    ]
+    if not any(lines for _, lines in sections): return await ctx.send("ℹ️ No valid users found to process.")
+    await send_paginated(ctx, TextPageSource(sections, filename=f"{fix_type}_results.txt"), author_id=ctx.author.id)
 
 
 @bot.command(name="fixwinners")
@@ -1712,126 +3908,487 @@ async def fix_joined(ctx, mod: str, event_name: str, *user_ids: str): await _fix
 async def fix_not_joined(ctx, mod: str, event_name: str, *user_ids: str): await _fix_event_status(ctx, mod, event_name, user_ids, "fixnotjoined")
 
 # --- BULK ACTIONS ---
+BULK_BAN_BATCH_SIZE = 200 # Max users per request on Discord's bulk ban endpoint
+
+class ProgressMessage:
+    """Edits a status message at most once per interval (final updates use force=True)."""
+    def __init__(self, message, interval=PROGRESS_EDIT_INTERVAL):
+        self.message = message
+        self.interval = interval
+        self._last_edit = 0.0
+
+    async def update(self, content, force=False):
+        now = time_module.monotonic()
+        if not force and now - self._last_edit < self.interval: return
+        self._last_edit = now
+        outbound.edit(self.message, content=content) # Not awaited: a newer update replaces one still queued
+
+async def fetch_ban_set(guild):
+    """IDs of all banned users, from one paged walk over the ban list (1000 entries per request)."""
+    return {entry.user.id async for entry in guild.bans(limit=None)}
+
+async def resolve_user_names(guild, user_ids, fetch=False):
+    """Names for result lines from the member/user cache; only calls fetch_user for misses when 'fetch' is set."""
+    names = {}
+    for user_id in user_ids:
+        user = guild.get_member(user_id) or bot.get_user(user_id)
+        if user: names[user_id] = user.name
+        elif fetch:
+            try: names[user_id] = (await bot.fetch_user(user_id)).name
+            except discord.HTTPException: pass
+    return names
+
+async def run_bulk_ban(guild, user_ids, reason, progress=None, record=None, cancelled=None):
+    """
+    Bans 'user_ids' (ints) through the bulk ban endpoint in batches of BULK_BAN_BATCH_SIZE.
+    Existing bans are pre-checked with one paged guild.bans() fetch instead of a fetch_ban per ID.
+    'record(user_id, status)' is called as each outcome is known and 'cancelled()' is checked before every batch.
+    Returns {"banned": [...], "already_banned": [...], "failed": [...], "errors": [(id, message), ...]}.
+    """
+    result = {"banned": [], "already_banned": [], "failed": [], "errors": []}
+    def note(key, user_id, status, message=None):
+        result[key].append((user_id, message) if message else user_id)
+        if record: record(user_id, f"{status}: {message}" if message else status)
+
+    try:
+        with trace_span("rest", "fetch bans"):
+            existing = await fetch_ban_set(guild)
+    except discord.HTTPException as e:
+        log_jobs.warning("Could not read ban list for %s (%s); relying on bulk ban results.", guild.id, e)
+        existing = set()
+
+    to_ban, seen = [], set()
+    for user_id in user_ids:
+        if user_id in seen: continue
+        seen.add(user_id)
+        if user_id in existing: note("already_banned", user_id, "already")
+        else: to_ban.append(user_id)
+
+    for start in range(0, len(to_ban), BULK_BAN_BATCH_SIZE):
+        if cancelled and cancelled(): break
+        batch = to_ban[start:start + BULK_BAN_BATCH_SIZE]
+        try:
+            with trace_span("rest", "bulk_ban"):
+                ban_result = await guild.bulk_ban([discord.Object(id=user_id) for user_id in batch], reason=reason, delete_message_seconds=0)
+            for obj in ban_result.banned: note("banned", obj.id, "done")
+            for obj in ban_result.failed: note("failed", obj.id, "failed")
+        except discord.Forbidden:
+            for user_id in batch: note("errors", user_id, "error", "No permission (needs Ban Members and Manage Server)")
+        except discord.HTTPException as e:
+            for user_id in batch: note("errors", user_id, "error", f"HTTP Error during ban: {e.status}")
+        if progress:
+            done = min(start + BULK_BAN_BATCH_SIZE, len(to_ban))
+            await progress.update(f"⏳ Banning... {done}/{len(to_ban)} processed, {len(result['banned'])} banned.")
+    return result
+
+BULK_ROLE_WORKERS = 1 # Concurrent role requests; the member-role bucket is per guild, so more workers only add 429s
+BULK_ROLE_MAX_RETRIES = 4 # Retries per member after a 429 that discord.py could not absorb
+BULK_ROLE_BACKOFF_BASE = 1.0 # Seconds; doubled on every retry
+
+async def run_bulk_role_change(members, role, add, reason, progress=None, workers=BULK_ROLE_WORKERS, record=None, cancelled=None):
+    """
+    Adds (add=True) or removes 'role' for 'members' with a bounded pool of worker tasks.
+    discord.py waits out the route's rate limit bucket itself; a 429 that still surfaces pauses all
+    workers (shared backoff deadline) and the member is retried with exponential backoff.
+    'record(user_id, status)' is called per member and workers stop taking members once 'cancelled()' is true.
+    Returns {"done": [member, ...], "errors": [(member, message), ...]}.
+    """
+    queue = asyncio.Queue()
+    for member in members: queue.put_nowait(member)
+    result = {"done": [], "errors": []}
+    loop = asyncio.get_running_loop()
+    paused_until = 0.0
+    verb = "Giving" if add else "Removing"
+
+    def error(member, message):
+        result["errors"].append((member, message))
+        if record: record(member.id, f"error: {message}")
+
+    async def worker():
+        nonlocal paused_until
+        while not queue.empty():
+            if cancelled and cancelled(): return
+            member = queue.get_nowait()
+            for attempt in range(BULK_ROLE_MAX_RETRIES + 1):
+                delay = paused_until - loop.time()
+                if delay > 0: await asyncio.sleep(delay)
+                try:
+                    with trace_span("rest", "add_roles" if add else "remove_roles"):
+                        if add: await member.add_roles(role, reason=reason)
+                        else: await member.remove_roles(role, reason=reason)
+                    result["done"].append(member)
+                    if record: record(member.id, "done")
+                except discord.Forbidden: error(member, "No Permission")
+                except discord.HTTPException as e:
+                    if e.status == 429 and attempt < BULK_ROLE_MAX_RETRIES:
+                        paused_until = max(paused_until, loop.time() + BULK_ROLE_BACKOFF_BASE * 2 ** attempt)
+                        continue
+                    error(member, f"HTTP Error: {e.status}")
+                except Exception as e: error(member, f"Unknown Error: {e}")
+                break
+            if progress:
+                processed = len(result["done"]) + len(result["errors"])
+                await progress.update(f"⏳ {verb} role {role.mention}... {processed}/{len(members)} processed.")
+
+    await asyncio.gather(*(worker() for _ in range(min(workers, len(members)))))
+    return result
+
+# --- BULK JOBS ---
+JOBS_FILE_PATH = "jobs.json"
+JOB_CHECKPOINT_INTERVAL = 1.0 # Min seconds between jobs.json writes while items complete
+JOBS_KEEP_FINISHED = 50 # Finished jobs kept for !jobs / !job
+JOB_TYPES = {"ban": "Bulk ban", "giverole": "Bulk give role", "removerole": "Bulk remove role"}
+
+class BulkJobManager:
+    """
+    Bulk operations as persisted jobs. Each job stores its parameters and a status per item
+    (user ID -> "pending", "done", "already", "unchanged", "not_found", "failed", "invalid" or "error: ...").
+    Statuses are checkpointed to disk while the job runs, so after a restart only "pending" items are processed.
+    With a storage coordinator every job is a 'job:<id>' document (IDs come from a shared counter) and only
+    changed jobs are written; jobs other processes change are reloaded from the change feed.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.jobs = {} # job_id -> job dict
+        self.next_id = 1
+        self.tasks = {} # job_id -> asyncio.Task (running jobs only)
+        self.dirty = set() # Job IDs changed since the last save (storage only)
+        self.removed = set() # Pruned job IDs not yet deleted from storage
+        self.unwritten = {} # job_id -> document, or None to delete it; written by write_task (storage only)
+        self.write_task = None
+        self._last_save = 0.0
+
+    def load(self):
+        """Loads jobs.json (without a storage coordinator; load_storage() runs once storage is open)."""
+        if not os.path.exists(self.path): return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f: data = json.load(f)
+            self.jobs = {int(job["id"]): job for job in data.get("jobs", [])}
+            self.next_id = max(int(data.get("next_id", 1)), max(self.jobs, default=0) + 1)
+            log_data.info("'%s' loaded: %d unfinished job(s).", self.path, sum(1 for job in self.jobs.values() if job['status'] == 'running'))
+        except (IOError, json.JSONDecodeError, KeyError, ValueError, TypeError) as e:
+            log_data.error("Failed to load %s: %s. Starting with no jobs.", self.path, e)
+
+    async def load_storage(self):
+        """Loads the jobs from storage; on the first start with a storage coordinator, jobs.json is imported."""
+        self.jobs = {int(key.partition(":")[2]): json.loads(data) for key, data in await storage.items("job:")}
+        self.next_id = max(self.jobs, default=0) + 1
+        if self.jobs or not os.path.exists(self.path):
+            log_data.info("Jobs loaded from storage: %d unfinished job(s).", sum(1 for job in self.jobs.values() if job['status'] == 'running'))
+            return
+        self.load()
+        if not self.jobs: return
+        self.dirty.update(self.jobs)
+        self.save()
+        await self.wait_saved()
+        await storage.next_id("job", self.next_id - 1) # Keeps new IDs above the imported ones
+        log_data.info("Imported %d job(s) from '%s' into storage.", len(self.jobs), self.path)
+
+    def save(self, force=True):
+        now = time_module.monotonic()
+        if not force and now - self._last_save < JOB_CHECKPOINT_INTERVAL: return
+        self._last_save = now
+        started = time_module.perf_counter()
+        if storage is not None:
+            # Running jobs are always written: record() changes them without marking them
+            for job_id in self.dirty | set(self.tasks):
+                if job_id in self.jobs:
+                    self.unwritten[job_id] = json.dumps(self.jobs[job_id], ensure_ascii=False).encode("utf-8")
+            for job_id in self.removed:
+                self.unwritten[job_id] = None
+            self.dirty.clear()
+            self.removed.clear()
+            if self.unwritten and (self.write_task is None or self.write_task.done()):
+                self.write_task = asyncio.create_task(self._write_unwritten(), name="storage-write-jobs")
+            record_span("persistence", "jobs.save", started)
+            return
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"next_id": self.next_id, "jobs": list(self.jobs.values())}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path) # A crash mid-write keeps the previous checkpoint
+        except IOError as e:
+            log_data.error("Could not save jobs: %s", e)
+        record_span("persistence", "jobs.save", started)
+
+    async def _write_unwritten(self):
+        """Writes queued job documents on the storage thread; a job saved again meanwhile is written once, with its latest data."""
+        while self.unwritten:
+            job_id = next(iter(self.unwritten))
+            data = self.unwritten.pop(job_id)
+            try:
+                if data is None:
+                    await storage.delete(f"job:{job_id}")
+                else:
+                    await storage.put(f"job:{job_id}", data)
+            except sqlite3.Error as e:
+                log_data.error("Could not save job #%s to storage: %s", job_id, e)
+
+    async def wait_saved(self):
+        """Waits until queued job documents are written (storage only)."""
+        if self.write_task is not None:
+            await asyncio.gather(self.write_task, return_exceptions=True)
+
+    def reload(self, key, data):
+        """Storage watcher: another process changed (or pruned) a job ('job:<id>')."""
+        job_id = int(key.partition(":")[2])
+        if job_id in self.tasks or job_id in self.unwritten: return # Running or saved here; this process owns its statuses
+        metrics_storage_invalidations.inc(kind="job")
+        if data is None: self.jobs.pop(job_id, None)
+        else: self.jobs[job_id] = json.loads(data)
+
+    async def create(self, job_type, ctx, items, params):
+        """Records a new job ('items': user ID str -> initial status) and returns it; call start() to run it."""
+        finished = sorted(job_id for job_id, job in self.jobs.items() if job["status"] != "running")
+        for job_id in finished[:max(0, len(finished) - JOBS_KEEP_FINISHED + 1)]:
+            del self.jobs[job_id]
+            self.removed.add(job_id)
+        job_id = await storage.next_id("job", self.next_id) if storage is not None else self.next_id
+        job = {
+            "id": job_id, "type": job_type, "guild_id": ctx.guild.id, "channel_id": ctx.channel.id, "author_id": ctx.author.id,
+            "created": datetime.datetime.now(timezone.utc).isoformat(timespec="seconds"), "status": "running", "params": params, "items": items,
+        }
+        self.jobs[job_id] = job
+        self.dirty.add(job_id)
+        self.next_id = job_id + 1
+        self.save()
+        return job
+
+    def start(self, job):
+        task = self.tasks.get(job["id"])
+        if task and not task.done(): return
+        self.tasks[job["id"]] = asyncio.create_task(run_bulk_job(job))
+
+    def resume_all(self):
+        """Starts every unfinished job (called on ready); with shared storage, only jobs of guilds this process's shards serve."""
+        for job in list(self.jobs.values()):
+            if job["status"] != "running": continue
+            if storage is not None and bot.get_guild(job["guild_id"]) is None: continue # Another shard process resumes it
+            self.start(job)
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if not job or job["status"] != "running": return False
+        job["status"] = "cancelled" # Runners check this between items/batches
+        self.dirty.add(job_id)
+        self.save()
+        return True
+
+    def record(self, job, user_id, status):
+        job["items"][str(user_id)] = status
+        self.save(force=False)
+
+    @staticmethod
+    def counts(job):
+        counts = {}
+        for status in job["items"].values():
+            key = status.split(":", 1)[0]
+            counts[key] = counts.get(key, 0) + 1
+        return counts
+
+bulk_jobs = BulkJobManager(JOBS_FILE_PATH)
+if storage is not None: storage.watch("job:", bulk_jobs.reload)
+else: bulk_jobs.load()
+
+# Result section headers per item status ({role} is filled in for role jobs)
+JOB_STATUS_HEADERS = {
+    "ban": [("done", "✅ Successfully banned"), ("already", "ℹ️ Already banned"), ("failed", "⚠️ Not found or could not ban")],
+    "giverole": [("done", "✅ Gave role {role} to"), ("unchanged", "ℹ️ Already had role"), ("not_found", "⚠️ Not found in server")],
+    "removerole": [("done", "✅ Removed role {role} from"), ("unchanged", "ℹ️ Did not have role"), ("not_found", "⚠️ Not found in server")],
+}
+JOB_COMMON_HEADERS = [("pending", "⏸️ Not processed"), ("invalid", "❌ Invalid IDs"), ("error", "❌ Errors")]
+
+async def build_job_report(guild, job):
+    """TextPageSource listing a job's items grouped by status."""
+    by_status = {}
+    for user_id, status in job["items"].items():
+        key, _, message = status.partition(": ")
+        by_status.setdefault(key, []).append((user_id, message))
+    user_ids = [int(user_id) for user_id in job["items"] if user_id.isdigit()]
+    names = await resolve_user_names(guild, user_ids, fetch=job["params"].get("names", False)) if guild else {}
+    role = guild.get_role(job["params"]["role_id"]) if guild and "role_id" in job["params"] else None
+    role_text = role.mention if role else f"ID:{job['params'].get('role_id')}"
+
+    sections = []
+    for key, header in JOB_STATUS_HEADERS[job["type"]] + JOB_COMMON_HEADERS:
+        entries = by_status.get(key, [])
+        lines = []
+        for user_id, message in entries:
+            label = f"{names[int(user_id)]} ({user_id})" if user_id.isdigit() and int(user_id) in names else (f"ID:{user_id}" if user_id.isdigit() else f"'{user_id}'")
+            lines.append(f"{label} ({message})" if message else label)
+        sections.append((f"{header.format(role=role_text)} ({len(entries)}):", lines))
+    title = f"Job #{job['id']} - {JOB_TYPES[job['type']]} - {job['status']}"
+    return TextPageSource(sections, title=title, filename=f"job_{job['id']}_results.txt")
+
+async def run_bulk_job(job):
+    """Runs (or resumes) the pending items of a bulk job, then posts its report in the job's channel."""
+    guild = bot.get_guild(job["guild_id"])
+    if guild is None:
+        log_jobs.warning("Job #%s: guild %s not available; will retry on next start.", job['id'], job['guild_id'])
+        return
+    channel = guild.get_channel(job["channel_id"])
+    pending = [int(user_id) for user_id, status in job["items"].items() if status == "pending"]
+    record = lambda user_id, status: bulk_jobs.record(job, user_id, status)
+    cancelled = lambda: job["status"] == "cancelled"
+
+    msg = None
+    if channel:
+        try: msg = await channel.send(f"⏳ Job #{job['id']} ({JOB_TYPES[job['type']]}): {len(pending)} users to process...")
+        except discord.HTTPException as e: log_jobs.warning("Job #%s: could not post progress message: %s", job['id'], e)
+    progress = ProgressMessage(msg) if msg else None
+
+    try:
+        if job["type"] == "ban":
+            await run_bulk_ban(guild, pending, job["params"]["reason"], progress=progress, record=record, cancelled=cancelled)
+        else:
+            role = guild.get_role(job["params"]["role_id"])
+            if role is None: raise ValueError("role no longer exists")
+            add = job["type"] == "giverole"
+            members = []
+            current = await fetch_members(guild, pending)
+            for user_id in pending:
+                member = current.get(user_id)
+                if member is None: record(user_id, "not_found")
+                elif (role in member.roles) == add: record(user_id, "unchanged") # Also covers work done just before a restart
+                else: members.append(member)
+            await run_bulk_role_change(members, role, add, job["params"]["reason"], progress=progress, record=record, cancelled=cancelled)
+        if job["status"] == "running": job["status"] = "done"
+    except Exception as e:
+        log_jobs.exception("Bulk job #%s failed: %s", job['id'], e)
+        job["status"] = "failed"
+        job["error"] = str(e)
+    finally:
+        bulk_jobs.save()
+        bulk_jobs.tasks.pop(job["id"], None)
+
+    if channel:
+        try: await send_paginated(channel, await build_job_report(guild, job), author_id=job["author_id"], message=msg)
+        except discord.HTTPException as e: log_jobs.warning("Error sending results of job #%s: %s", job['id'], e)
+
 # (User messages translated to English)
 @bot.command(name="bulkban")
 @commands.has_permissions(ban_members=True)
 @admin_only()
 async def bulk_ban(ctx, *args):
-    if not args: return await ctx.send("❌ Error: At least one user ID required.") # English text
-    reason = "Bulk ban" # English reason
+    if not args and not id_attachments(ctx): return await ctx.send("❌ Error: At least one user ID (or an attached .txt/.csv of IDs) required.")
+    reason = "Bulk ban"
     user_ids = list(args)
     for i in range(len(args) - 1, -1, -1):
-        if args[i].lower().startswith("reason=") and len(args[i]) > 7: reason = args[i][7:]; user_ids = list(args[:i]); break
-        elif args[i].lower() == "reason=": user_ids = list(args[:i]); break
-    if not user_ids: return await ctx.send("❌ Error: At least one user ID required (excluding reason).") # English text
-
-    banned, errors, already_banned, not_found_or_cant_ban = [], [], [], []
-    msg = await ctx.send(f"⏳ Processing bulk ban for {len(user_ids)} users...") # English text
-
-    for id_str in user_ids:
-        await asyncio.sleep(0.1)
-        try:
-            user_id = int(id_str.strip())
-            if user_id == ctx.author.id or user_id == bot.user.id: errors.append(f"{user_id} (Cannot ban self/bot)"); continue # English text
-            target_user = discord.Object(id=user_id); name = f"ID:{user_id}"
-            try: user_info = await bot.fetch_user(user_id); name = user_info.name
-            except: pass
-            try:
-                await ctx.guild.fetch_ban(target_user); already_banned.append(f"{name} ({user_id})"); continue
-            except discord.NotFound: pass
-            except discord.Forbidden: errors.append(f"{name} ({user_id}) (No permission to check ban list)"); continue # English text
-            except discord.HTTPException as e: errors.append(f"{name} ({user_id}) (HTTP Error checking ban: {e.status})"); continue # English text
-            try:
-                await ctx.guild.ban(target_user, reason=f"{reason} (Banned by: {ctx.author})", delete_message_days=0); banned.append(f"{name} ({user_id})") # English text in reason
-            except discord.Forbidden: not_found_or_cant_ban.append(f"{name} ({user_id}) (No Permission/Higher Role/Not Found)") # English text
-            except discord.NotFound: not_found_or_cant_ban.append(f"{id_str} (User not found)") # English text
-            except discord.HTTPException as e: errors.append(f"{name} ({user_id}) (HTTP Error during ban: {e.status})") # English text
-            except Exception as e: errors.append(f"{name} ({user_id}) (Unknown Error: {e})") # English text
-        except ValueError: errors.append(f"'{id_str}' (Invalid ID)") # English text
-        except Exception as e: errors.append(f"'{id_str}' (General Error: {e})") # English text
+        if args[i].lower().startswith("reason=") and len(args[i]) > 7:
+            reason = args[i][7:]
+            user_ids = list(args[:i])
+            break
+        elif args[i].lower() == "reason=":
+            user_ids = list(args[:i])
+            break
+    fetch_names = any(arg.lower() == "names" for arg in user_ids) # Look up usernames via the API (one request per uncached user)
+    user_ids = [arg for arg in user_ids if arg.lower() != "names"]
+    if not user_ids and not id_attachments(ctx): return await ctx.send("❌ Error: At least one user ID required (excluding reason).")
+
+    items = {}
+    async for id_str in iter_command_ids(ctx, user_ids):
+        try: user_id = int(id_str.strip())
+        except ValueError:
+            items[id_str] = "invalid"
+            continue
+        if user_id == ctx.author.id or user_id == bot.user.id:
+            items[str(user_id)] = "error: Cannot ban self/bot"
+            continue
+        items.setdefault(str(user_id), "pending")
 
-    response = ""
-    if banned: response += f"✅ Successfully banned ({len(banned)}):\n```\n" + "\n".join(banned) + "\n```\n" # English text
-    if already_banned: response += f"ℹ️ Already banned ({len(already_banned)}):\n```\n" + "\n".join(already_banned) + "\n```\n" # English text
-    if not_found_or_cant_ban: response += f"⚠️ Not found or could not ban ({len(not_found_or_cant_ban)}):\n```\n" + "\n".join(not_found_or_cant_ban) + "\n```\n" # English text
-    if errors: response += f"❌ Errors ({len(errors)}):\n```\n" + "\n".join(errors) + "\n```\n" # English text
-    if not response: response = "ℹ️ No users found to process or report." # English text
+    job = await bulk_jobs.create("ban", ctx, items, {"reason": f"{reason} (Banned by: {ctx.author})", "names": fetch_names})
+    bulk_jobs.start(job)
 
-    try:
-        if len(response) <= 2000: await msg.edit(content=response)
-        else:
-            await msg.edit(content=f"Bulk ban results (split):"); # English text
-            for chunk in chunk_text_by_size(response, 1950): await ctx.send(chunk)
-    except discord.HTTPException as e:
-        print(f"Error sending bulk ban results: {e}\n--- Bulk Ban Results ---\n{response}\n--- End Results ---") # English comment
-        await ctx.send("❌ Error sending results message. Details logged.") # English text
+async def _bulk_role_change(ctx, role, user_ids, add):
+    """Shared body of !bulkgiverole / !bulkremoverole: validates, then submits a bulk job."""
+    if not user_ids and not id_attachments(ctx): return await ctx.send("❌ Error: At least one user ID (or an attached .txt/.csv of IDs) required.")
+    if not role: return await ctx.send(f"❌ Error: Role not found.") # English text
+    if ctx.guild.me.top_role <= role: return await ctx.send(f"❌ Error: Bot role too low to manage {role.mention}.")
+    if ctx.author.id != ctx.guild.owner_id and ctx.author.top_role <= role : return await ctx.send(f"❌ Error: Your role is too low to manage {role.mention}.")
+
+    items, valid_ids = {}, []
+    async for id_str in iter_command_ids(ctx, user_ids):
+        try: valid_ids.append(int(id_str.strip()))
+        except ValueError: items[id_str] = "invalid"
+    current = await fetch_members(ctx.guild, valid_ids)
+    for user_id in valid_ids:
+        member = current.get(user_id)
+        if not member: items[str(user_id)] = "not_found"
+        elif (role in member.roles) == add: items[str(user_id)] = "unchanged"
+        else: items.setdefault(str(user_id), "pending")
+
+    action = "assignment" if add else "removal"
+    job = await bulk_jobs.create("giverole" if add else "removerole", ctx, items, {"role_id": role.id, "reason": f"Bulk role {action} (By: {ctx.author})"})
+    bulk_jobs.start(job)
 
 @bot.command(name="bulkgiverole")
 @commands.has_permissions(manage_roles=True)
 @admin_only()
-async def bulk_give_role(ctx, role: discord.Role, *user_ids: str):
-    if not user_ids: return await ctx.send("❌ Error: At least one user ID required.") # English text
-    if not role: return await ctx.send(f"❌ Error: Role not found.") # English text
-    if ctx.guild.me.top_role <= role: return await ctx.send(f"❌ Error: Bot role too low to assign {role.mention}.") # English text
-    if ctx.author.id != ctx.guild.owner_id and ctx.author.top_role <= role : return await ctx.send(f"❌ Error: Your role is too low to assign {role.mention}.") # English text
+async def bulk_give_role(ctx, role: discord.Role, *user_ids: str): await _bulk_role_change(ctx, role, user_ids, add=True)
 
-    given, errors, already_had, not_found = [], [], [], []
-    msg = await ctx.send(f"⏳ Giving role {role.mention} to {len(user_ids)} users...") # English text
-
-    for id_str in user_ids:
-        await asyncio.sleep(0.1)
-        try:
-            user_id = int(id_str.strip()); member = ctx.guild.get_member(user_id)
-            if not member: not_found.append(f"{id_str} (Not in server)"); continue # English text
-            if role in member.roles: already_had.append(f"{member.display_name} ({user_id})"); continue
-            try:
-                await member.add_roles(role, reason=f"Bulk role assignment (Assigner: {ctx.author})"); given.append(f"{member.display_name} ({user_id})") # English text in reason
-            except discord.Forbidden: errors.append(f"{member.display_name} ({user_id}) (No Permission)") # English text
-            except discord.HTTPException as e: errors.append(f"{member.display_name} ({user_id}) (HTTP Error: {e.status})") # English text
-            except Exception as e: errors.append(f"{member.display_name} ({user_id}) (Unknown Error: {e})") # English text
-        except ValueError: errors.append(f"'{id_str}' (Invalid ID)") # English text
-        except Exception as e: errors.append(f"'{id_str}' (General Error: {e})") # English text
+@bot.command(name="bulkremoverole")
+@commands.has_permissions(manage_roles=True)
+@admin_only()
+async def bulk_remove_role(ctx, role: discord.Role, *user_ids: str): await _bulk_role_change(ctx, role, user_ids, add=False)
 
-    response = ""
-    if given: response += f"✅ Gave role {role.mention} to ({len(given)}):\n```\n" + "\n".join(given) + "\n```\n" # English text
-    if already_had: response += f"ℹ️ Already had role ({len(already_had)}):\n```\n" + "\n".join(already_had) + "\n```\n" # English text
-    if not_found: response += f"⚠️ Not found in server ({len(not_found)}):\n```\n" + "\n".join(not_found) + "\n```\n" # English text
-    if errors: response += f"❌ Errors ({len(errors)}):\n```\n" + "\n".join(errors) + "\n```\n" # English text
-    if not response: response = "ℹ️ No users found to process or report." # English text
+@bot.command(name="jobs")
+@admin_only()
+async def list_jobs(ctx):
+    """Lists this server's recent bulk jobs."""
+    jobs = [job for job in bulk_jobs.jobs.values() if job["guild_id"] == ctx.guild.id]
+    if not jobs: return await ctx.send("ℹ️ No bulk jobs recorded.")
+    lines = []
+    for job in sorted(jobs, key=lambda j: j["id"], reverse=True):
+        counts = bulk_jobs.counts(job)
+        processed = len(job["items"]) - counts.get("pending", 0)
+        lines.append(f"#{job['id']:<5} {JOB_TYPES[job['type']]:<17} {job['status']:<9} {processed}/{len(job['items'])}  {job['created'][:16].replace('T', ' ')}")
+    await send_paginated(ctx, TextPageSource([(None, lines)], title="Bulk Jobs (use !job <id> for details)", filename="jobs.txt"), author_id=ctx.author.id)
+
+@bot.command(name="job")
+@admin_only()
+async def show_job(ctx, job_id: int):
+    """Shows a bulk job's status and per-user results."""
+    job = bulk_jobs.jobs.get(job_id)
+    if not job or job["guild_id"] != ctx.guild.id: return await ctx.send(f"❌ Error: Job #{job_id} not found.")
+    await send_paginated(ctx, await build_job_report(ctx.guild, job), author_id=ctx.author.id)
 
-    try:
-        if len(response) <= 2000: await msg.edit(content=response)
-        else:
-            await msg.edit(content=f"Bulk role results ({role.mention}) (split):") # English text
-            for chunk in chunk_text_by_size(response, 1950): await ctx.send(chunk)
-    except discord.HTTPException as e:
-        print(f"Error sending bulk role results: {e}\n--- Bulk Role Results ---\n{response}\n--- End Results ---") # English comment
-        await ctx.send("❌ Error sending results message. Details logged.") # English text
+@bot.command(name="canceljob")
+@admin_only()
+async def cancel_job(ctx, job_id: int):
+    """Stops a running bulk job after its current batch; processed items are kept."""
+    job = bulk_jobs.jobs.get(job_id)
+    if not job or job["guild_id"] != ctx.guild.id: return await ctx.send(f"❌ Error: Job #{job_id} not found.")
+    if not bulk_jobs.cancel(job_id): return await ctx.send(f"ℹ️ Job #{job_id} is not running (status: {job['status']}).")
+    await ctx.send(f"✅ Job #{job_id} cancelled. Items already processed are kept.")
 
 # --- STATS BUTTON RELATED COMMANDS ---
 # (User messages translated to English)
 @bot.command(name="setstatschannel")
 @admin_only()
 async def set_stats_channel(ctx, channel: discord.TextChannel):
-    global stats_channel_id, stats_message_id
+    guild_state = get_guild_state(ctx.guild)
     if not channel: return await ctx.send("❌ Error: Valid text channel not found.") # English text
 
-    if stats_channel_id and stats_message_id:
+    if guild_state.stats_channel_id and guild_state.stats_message_id:
         try:
-            old_channel = bot.get_channel(stats_channel_id) or await bot.fetch_channel(stats_channel_id)
-            if old_channel: old_msg = await old_channel.fetch_message(stats_message_id); await old_msg.delete()
-        except (discord.NotFound, discord.Forbidden, Exception) as e: print(f"Could not delete old stats button message ({stats_message_id} in {stats_channel_id}): {e}") # English comment
-        finally: stats_message_id = None
-
-    stats_channel_id = channel.id
+            old_channel = bot.get_channel(guild_state.stats_channel_id) or await bot.fetch_channel(guild_state.stats_channel_id)
+            if old_channel:
+                old_msg = await old_channel.fetch_message(guild_state.stats_message_id)
+                await old_msg.delete()
+        except (discord.NotFound, discord.Forbidden, Exception) as e: log_stats_button.warning("Could not delete old stats button message (%s in %s): %s", guild_state.stats_message_id, guild_state.stats_channel_id, e)
+        finally: guild_state.stats_message_id = None
+
+    guild_state.stats_channel_id = channel.id
     try:
         view = StatsView(); sent_message = await channel.send("📊 Click the button below to see your statistics.", view=view) # English text
-        stats_message_id = sent_message.id; save_stats()
-        await ctx.send(f"✅ Stats button sent to {channel.mention} (ID: {stats_message_id}).") # English text
+        guild_state.stats_message_id = sent_message.id
+        guild_state.save_stats()
+        await ctx.send(f"✅ Stats button sent to {channel.mention} (ID: {guild_state.stats_message_id}).")
     except (discord.Forbidden, Exception) as e:
         await ctx.send(f"❌ Error sending button: {e}") # English text
-        stats_channel_id, stats_message_id = None, None; save_stats()
-        if not isinstance(e, discord.Forbidden): traceback.print_exc()
+        guild_state.stats_channel_id, guild_state.stats_message_id = None, None
+        guild_state.save_stats()
+        if not isinstance(e, discord.Forbidden): log_stats_button.exception("Could not send the stats button: %s", e)
 
 @set_stats_channel.error
 async def set_stats_channel_error(ctx, error):
@@ -1839,17 +4396,22 @@ async def set_stats_channel_error(ctx, error):
     elif isinstance(error, commands.BadArgument): await ctx.send("❌ Error: Please provide a valid text channel.") # English text
     elif isinstance(error, MissingRequiredArgument): await ctx.send("❌ Error: Channel is required.") # English text
     elif isinstance(error, CheckFailure): pass # Handled silently
-    else: await ctx.send(f"Unexpected error: {error}"); print(f"Error (setstatschannel): {error}"); traceback.print_exc() # English text
+    else:
+        await ctx.send(f"Unexpected error: {error}")
+        log_commands.error("Error (setstatschannel): %s", error, exc_info=error)
 
 @bot.command(name="setstatscooldown")
 @admin_only()
 async def set_stats_cooldown(ctx, role: discord.Role, duration: str):
-    global stats_cooldowns
+    guild_state = get_guild_state(ctx.guild)
     if not role: return await ctx.send("❌ Error: Valid role not found.") # English text
     cooldown_seconds = parse_cooldown_duration(duration)
     if cooldown_seconds is None: return await ctx.send("❌ Error: Invalid duration format (e.g., 5m, 1h, 2d, 0).") # English text
 
-    role_id_str = str(role.id); stats_cooldowns[role_id_str] = cooldown_seconds; save_stats()
+    role_id_str = str(role.id)
+    guild_state.stats_cooldowns[role_id_str] = cooldown_seconds
+    guild_state.save_stats()
+    guild_state.stats_button_limiter.compile_role_periods(guild_state.stats_cooldowns) # Precompiled cooldown map used by the button
 
     if cooldown_seconds == 0: await ctx.send(f"✅ Stats button cooldown removed for role {role.mention}.") # English text
     else:
@@ -1868,39 +4430,544 @@ async def set_stats_cooldown_error(ctx, error):
     elif isinstance(error, commands.BadArgument): await ctx.send("❌ Error: Invalid role or duration format.") # English text
     elif isinstance(error, MissingRequiredArgument): await ctx.send(f"❌ Missing argument: {error.param.name}.") # English text
     elif isinstance(error, CheckFailure): pass # Handled silently
-    else: await ctx.send(f"Unexpected error: {error}"); print(f"Error (setstatscooldown): {error}"); traceback.print_exc() # English text
+    else:
+        await ctx.send(f"Unexpected error: {error}")
+        log_commands.error("Error (setstatscooldown): %s", error, exc_info=error)
+
+# --- MODERATED CHANNEL DELETIONS ---
+DELETE_COALESCE_WINDOW = 0.5 # Seconds to gather deletions per channel before flushing
+BULK_DELETE_MAX = 100 # Discord's limit per bulk delete request
+BULK_DELETE_MAX_AGE = timedelta(days=14, minutes=-5) # Bulk delete rejects messages older than 14 days (small safety margin)
+
+class DeletionCoalescer:
+    """
+    Gathers messages to delete per channel over a short window, then deletes them with
+    channel.delete_messages (up to 100 per call). Single leftovers and messages too old
+    for bulk delete fall back to message.delete(). Keeps backlog/throughput counters.
+    """
+    def __init__(self, window=DELETE_COALESCE_WINDOW):
+        self.window = window
+        self.pending = {} # channel_id -> [Message, ...]
+        self.tasks = {} # channel_id -> flush task
+        self.counters = {"queued": 0, "deleted": 0, "bulk_calls": 0, "single_calls": 0, "errors": 0}
+        self.peak_backlog = 0
+        self.last_flush_delay = 0.0 # Seconds the oldest message of the last flush waited
+
+    @property
+    def backlog(self):
+        return sum(len(messages) for messages in self.pending.values())
+
+    def queue(self, message):
+        channel_id = message.channel.id
+        self.pending.setdefault(channel_id, []).append(message)
+        self.counters["queued"] += 1
+        self.peak_backlog = max(self.peak_backlog, self.backlog)
+        task = self.tasks.get(channel_id)
+        if task is None or task.done():
+            self.tasks[channel_id] = asyncio.create_task(self._flush_later(message.channel))
+
+    async def _flush_later(self, channel):
+        await asyncio.sleep(self.window)
+        # Messages queued while a flush is running are picked up by the next loop iteration
+        while self.pending.get(channel.id):
+            batch = self.pending.pop(channel.id)
+            self.last_flush_delay = (discord.utils.utcnow() - batch[0].created_at).total_seconds()
+            try: await outbound.submit(channel, lambda: self._delete(channel, batch), priority=PRIORITY_MODERATION)
+            except Exception as e:
+                log_moderation.exception("Deletion flush in %s failed: %s", channel.id, e)
+        self.tasks.pop(channel.id, None)
+
+    async def _delete(self, channel, messages):
+        cutoff = discord.utils.utcnow() - BULK_DELETE_MAX_AGE
+        recent = [m for m in messages if m.created_at > cutoff]
+        singles = [m for m in messages if m.created_at <= cutoff]
+        for start in range(0, len(recent), BULK_DELETE_MAX):
+            chunk = recent[start:start + BULK_DELETE_MAX]
+            if len(chunk) == 1:
+                singles.extend(chunk)
+                continue
+            try:
+                await channel.delete_messages(chunk)
+                self.counters["bulk_calls"] += 1
+                self.counters["deleted"] += len(chunk)
+            except discord.Forbidden as e:
+                self.counters["errors"] += len(chunk)
+                log_moderation.warning("Error bulk deleting %d messages in %s: %s", len(chunk), channel.id, e, extra={"channel_id": channel.id})
+            except discord.HTTPException as e:
+                log_moderation.warning("Bulk delete failed in %s (%s); deleting individually.", channel.id, e.status, extra={"channel_id": channel.id})
+                singles.extend(chunk)
+        for message in singles:
+            self.counters["single_calls"] += 1
+            try:
+                await message.delete()
+                self.counters["deleted"] += 1
+            except discord.NotFound: pass # Already gone
+            except (discord.Forbidden, discord.HTTPException) as e:
+                self.counters["errors"] += 1
+                log_moderation.warning("Error deleting message %s in %s: %s", message.id, channel.id, e, extra={"channel_id": channel.id})
+
+deletion_queue = DeletionCoalescer()
+
+@bot.command(name="deletequeue")
+@admin_only()
+async def delete_queue_stats(ctx):
+    """Shows the moderated-channel deletion backlog and counters."""
+    c = deletion_queue.counters
+    per_channel = ", ".join(f"<#{cid}>: {len(msgs)}" for cid, msgs in deletion_queue.pending.items() if msgs) or "none"
+    calls = c["bulk_calls"] + c["single_calls"]
+    await ctx.send(
+        f"🧹 **Deletion queue**\n"
+        f"Backlog: {deletion_queue.backlog} (peak {deletion_queue.peak_backlog}) - per channel: {per_channel}\n"
+        f"Queued: {c['queued']} | Deleted: {c['deleted']} | Errors: {c['errors']}\n"
+        f"API calls: {calls} ({c['bulk_calls']} bulk, {c['single_calls']} single) | Messages per call: {c['deleted'] / calls if calls else 0:.1f}\n"
+        f"Last flush waited: {deletion_queue.last_flush_delay:.1f}s"
+    )
+
+def _latency_line(histogram, label=None, **labels):
+    """'label: count | avg | p50 | p95 | p99' summary of a latency histogram, in milliseconds."""
+    _, total, count = histogram.merged(**labels)
+    if not count: return f"{label}: no samples"
+    p50, p95, p99 = (histogram.quantile(q, **labels) * 1000 for q in (0.5, 0.95, 0.99))
+    return f"{label}: {count:,} | avg {total / count * 1000:.1f}ms | p50 {p50:.1f}ms | p95 {p95:.1f}ms | p99 {p99:.1f}ms"
+
+@bot.command(name="perf")
+@admin_only()
+async def perf(ctx):
+    """Summarizes the metrics registry (message pipeline, persistence, reports, commands, queues)."""
+    kinds = sorted(metrics_messages.values, key=lambda key: -metrics_messages.values[key])
+    deletes = ", ".join(f"{reason} {count:,}" for (reason,), count in sorted(metrics_moderation_deletes.values.items())) or "none"
+    commands_seen = {command for command, _ in metrics_command_seconds.values}
+    last_stall = loop_watchdog.stalls[-1] if loop_watchdog.stalls else None
+    slowest_commands = sorted(commands_seen, key=lambda command: -metrics_command_seconds.quantile(0.95, command=command))[:10]
+    latency_ms = bot.latency * 1000 if bot.latency == bot.latency else 0
+    endpoint = f"http://{METRICS_HOST}:{METRICS_PORT}/metrics" if metrics_runner else "disabled"
+    guild_state = get_guild_state(ctx.guild)
+    render_cache = guild_state.render_cache
+    sections = [
+        ("📨 on_message (tracking logic per handler kind):",
+         [_latency_line(metrics_message_seconds, kind, kind=kind) for (kind,) in kinds] + [f"deletes queued: {deletes}"]),
+        ("💾 Persistence:", [
+            f"saves: {metrics_saves.get(result='ok'):,} ok, {metrics_saves.get(result='error'):,} failed, this guild's stats file {format_file_size(metrics_stats_bytes.get(guild=ctx.guild.id))}, {len(guild_states)} guilds loaded",
+            _latency_line(metrics_save_seconds, "save_stats"),
+            (f"storage {STORAGE_DB_PATH} (writer {storage.writer}), {int(sum(metrics_storage_invalidations.values.values())):,} external changes reloaded"
+             if storage is not None else "storage: JSON files")]),
+        ("📊 Reports:", [
+            f"reports: {metrics_reports.get(result='ok'):,} ok, {metrics_reports.get(result='error'):,} failed",
+            _latency_line(metrics_report_seconds, "generate_excel")]),
+        ("⌨️ Commands (slowest p95 first):",
+         [_latency_line(metrics_command_seconds, f"!{command}", command=command) for command in slowest_commands]),
+        (f"🐢 Recent slow commands (>= {SLOW_COMMAND_THRESHOLD:g}s, details in {SLOW_COMMAND_LOG_PATH}):", list(reversed(recent_slow_commands))),
+        ("🫀 Event loop:", [
+            _latency_line(metrics_loop_lag, "lag") + f" | max {loop_watchdog.max_lag * 1000:.0f}ms",
+            f"stalls >= {loop_watchdog.threshold:g}s: {int(metrics_loop_stalls.get()):,}" + (f" (last {last_stall[0]}, {last_stall[1]:.2f}s, {last_stall[2]})" if last_stall else "")]),
+        ("📬 Queues & cache:", [
+            f"outbound backlog {outbound.backlog}, deletion backlog {deletion_queue.backlog}, running jobs {len(bulk_jobs.tasks)}",
+            f"render cache {render_cache.hit_rate:.0%} hits ({render_cache.hits:,}/{render_cache.hits + render_cache.misses:,}), {len(render_cache)} entries",
+            f"members cached {len(ctx.guild.members):,} of {ctx.guild.member_count or 0:,}" + (f", lean mode: {len(member_lru):,} in LRU, fetched {int(metrics_member_fetches.get(source='query') + metrics_member_fetches.get(source='list')):,}" if LEAN_MEMORY else "")]),
+    ]
+    shards = f", shards {','.join(map(str, SHARD_IDS)) if SHARD_IDS else 'all'} of {bot.shard_count}" if SHARDED else ""
+    title = f"📈 Performance: uptime {format_duration(time_module.time() - METRICS_STARTED)}, gateway {latency_ms:.0f}ms{shards}, Prometheus {endpoint}"
+    await send_paginated(ctx, TextPageSource(sections, title=title, filename="perf.txt"), author_id=ctx.author.id)
+
+
+# --- PROFILING ---
+PROFILE_CPU_DEFAULT_SECONDS = 30
+PROFILE_MEM_DEFAULT_SECONDS = 30
+PROFILE_MAX_SECONDS = 300
+PROFILE_MEM_FRAMES = 1 # Frames stored per allocation while tracemalloc runs (1 keeps the overhead low)
+PROFILE_TOP_LINES = 40 # Rows per table in the attached reports
+SIZEOF_YIELD_EVERY = 20000 # Objects measured between yields to the event loop
+SIZEOF_FOREIGN_FIELDS = (str, bytes, int, float, list, tuple, dict, set, frozenset, deque, array.array) # Followed inside library objects
+profile_lock = asyncio.Lock() # One capture at a time (cProfile/tracemalloc are process-wide)
+
+async def deep_sizeof(root):
+    """
+    Estimated memory of 'root' in bytes and number of objects: builtin containers are followed, numpy arrays
+    count their buffer, objects of this module are followed through their attributes, and library objects
+    (discord.py models) count themselves plus their plain-data slots, not the client/guild/state they point to.
+    Yields to the event loop every SIZEOF_YIELD_EVERY objects; containers are copied before walking them.
+    """
+    seen, stack = set(), [root]
+    total = count = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen: continue
+        seen.add(id(obj))
+        count += 1
+        if count % SIZEOF_YIELD_EVERY == 0: await asyncio.sleep(0)
+        total += sys.getsizeof(obj, 0)
+        if isinstance(obj, (str, bytes, int, float, bool, type(None))): continue
+        if isinstance(obj, np.ndarray):
+            total += obj.nbytes
+            continue
+        if isinstance(obj, dict): stack.extend(item for pair in list(obj.items()) for item in pair)
+        elif isinstance(obj, (list, tuple, set, frozenset, deque)): stack.extend(list(obj))
+        elif type(obj).__module__ == __name__: stack.append(vars(obj) if hasattr(obj, "__dict__") else ())
+        else:
+            for cls in type(obj).__mro__:
+                for slot in cls.__dict__.get("__slots__", ()):
+                    value = getattr(obj, slot, None)
+                    if isinstance(value, SIZEOF_FOREIGN_FIELDS): stack.append(value)
+    return total, count
+
+def profiled_structures():
+    """(name, object, entries) of the bot's major in-memory structures for !profile mem (summed over all guild partitions)."""
+    state = bot._connection
+    members = [member for guild in bot.guilds for member in guild._members.values()]
+    def per_guild(attr, size=len):
+        objects = [getattr(guild_state, attr) for guild_state in list(guild_states.values())]
+        return objects, sum(size(obj) for obj in objects)
+    return [
+        ("stats_data", *per_guild("stats_data")),
+        ("posted_links_set", *per_guild("posted_links_set")),
+        ("stats_cooldowns", *per_guild("stats_cooldowns")),
+        ("stats button cooldown buckets", *per_guild("stats_button_limiter")),
+        ("!stats/!allstats rate limit buckets", [stats_command_limiter, allstats_command_limiter], len(stats_command_limiter._buckets) + len(allstats_command_limiter._buckets)),
+        ("stats table (numpy columns)", *per_guild("stats_table", lambda table: len(table.user_ids))),
+        ("leaderboards", *per_guild("leaderboards")),
+        ("stats render cache", *per_guild("render_cache")),
+        ("bulk jobs", bulk_jobs.jobs, len(bulk_jobs.jobs)),
+        ("attendance sessions", attendance_sessions, sum(len(s) for s in attendance_sessions.values())),
+        ("discord.py member cache", members, len(members)),
+        ("discord.py user cache", list(state._users.values()), len(state._users)),
+        ("discord.py message cache", list(state._messages or ()), len(state._messages or ())),
+    ]
+
+def _pstats_table(stats, sort_key):
+    out = io.StringIO()
+    stats.stream = out
+    stats.sort_stats(sort_key).print_stats(PROFILE_TOP_LINES)
+    return out.getvalue()
+
+async def _profile_cpu(ctx, seconds):
+    msg = await ctx.send(f"⏳ Profiling CPU over live traffic for {seconds}s...")
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try: await asyncio.sleep(seconds)
+    finally: profiler.disable()
+    profiler.create_stats()
+    raw_stats = marshal.dumps(profiler.stats) # .prof file (pstats/snakeviz format); pstats.Stats() takes over profiler.stats
+    stats = pstats.Stats(profiler)
+    stats.strip_dirs()
+    stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    report = (f"CPU profile: {seconds}s of live traffic, {stats.total_calls:,} calls, {stats.total_tt:.3f}s CPU in profiled code\n\n"
+              f"=== Sorted by cumulative time ===\n{_pstats_table(stats, 'cumulative')}\n"
+              f"=== Sorted by own time ===\n{_pstats_table(stats, 'tottime')}")
+    top = sorted(stats.stats.items(), key=lambda item: -item[1][2])[:5] # (file, line, function) -> (cc, nc, tt, ct, callers)
+    top_lines = "\n".join(f"{tt * 1000:8.1f}ms {nc:>8,} calls  {func} ({os.path.basename(path)}:{line})" for (path, line, func), (_, nc, tt, _, _) in top)
+    outbound.edit(msg, content=f"✅ CPU profile done ({seconds}s, {stats.total_calls:,} calls). Top by own time:\n```\n{top_lines}\n```")
+    await outbound.send(ctx, files=[discord.File(io.BytesIO(report.encode("utf-8")), filename=f"profile_cpu_{stamp}.txt"),
+                                   discord.File(io.BytesIO(raw_stats), filename=f"profile_cpu_{stamp}.prof")])
+
+async def _profile_mem(ctx, seconds):
+    started_tracing = not tracemalloc.is_tracing()
+    msg = await ctx.send(f"⏳ Tracing allocations for {seconds}s, then measuring the main structures...")
+    if started_tracing: tracemalloc.start(PROFILE_MEM_FRAMES)
+    try:
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap>"), tracemalloc.Filter(False, "<unknown>")]
+        before = tracemalloc.take_snapshot().filter_traces(ignore)
+        await asyncio.sleep(seconds)
+        after = tracemalloc.take_snapshot().filter_traces(ignore)
+        traced, peak = tracemalloc.get_traced_memory()
+    finally:
+        if started_tracing: tracemalloc.stop() # Only keep tracing on if it was already enabled (e.g. PYTHONTRACEMALLOC)
+    diff = after.compare_to(before, "lineno")[:PROFILE_TOP_LINES]
+    largest = after.statistics("lineno")[:PROFILE_TOP_LINES]
+
+    sizes = []
+    for name, obj, entries in profiled_structures():
+        size, objects = await deep_sizeof(obj)
+        sizes.append((name, entries, objects, size))
+    sizes.sort(key=lambda row: -row[3])
+
+    stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    lines = [f"Memory profile: {seconds}s allocation window" + ("" if started_tracing else " (tracemalloc was already running)"),
+             f"Traced memory: {format_file_size(traced)} now, peak {format_file_size(peak)}", "",
+             "=== Structures (estimated deep size) ===", f"{'structure':<40} {'entries':>10} {'objects':>12} {'size':>12}"]
+    lines += [f"{name:<40} {entries:>10,} {objects:>12,} {format_file_size(size):>12}" for name, entries, objects, size in sizes]
+    lines += ["", f"=== Allocation growth during the window (top {PROFILE_TOP_LINES}, by source line) ==="] + [str(stat) for stat in diff]
+    lines += ["", f"=== Largest allocations at the end of the window (top {PROFILE_TOP_LINES}) ==="] + [str(stat) for stat in largest]
+    summary = "\n".join(f"{name:<36} {format_file_size(size):>10}" for name, _, _, size in sizes[:6])
+    outbound.edit(msg, content=f"✅ Memory profile done. Largest structures:\n```\n{summary}\n```")
+    await outbound.send(ctx, file=discord.File(io.BytesIO("\n".join(lines).encode("utf-8")), filename=f"profile_mem_{stamp}.txt"))
+
+@bot.command(name="profile")
+@commands.is_owner()
+async def profile(ctx, kind: str, seconds: int = None):
+    """Owner only: '!profile cpu [seconds]' (cProfile over live traffic) or '!profile mem [seconds]' (tracemalloc diff + structure sizes)."""
+    kind = kind.lower()
+    if kind not in ("cpu", "mem", "memory"): return await ctx.send("❌ Error: Use `!profile cpu [seconds]` or `!profile mem [seconds]`.")
+    seconds = seconds if seconds is not None else (PROFILE_CPU_DEFAULT_SECONDS if kind == "cpu" else PROFILE_MEM_DEFAULT_SECONDS)
+    if not 1 <= seconds <= PROFILE_MAX_SECONDS: return await ctx.send(f"❌ Error: Duration must be between 1 and {PROFILE_MAX_SECONDS} seconds.")
+    if profile_lock.locked(): return await ctx.send("⏳ A profile capture is already running.")
+    async with profile_lock:
+        if kind == "cpu": await _profile_cpu(ctx, seconds)
+        else: await _profile_mem(ctx, seconds)
+
+
+# --- TRAFFIC RECORDER ---
+TRAFFIC_RECORD_PATH = os.getenv("TRAFFIC_RECORD_PATH", "") # Opt-in: gzip JSONL file the recorder appends to at startup (empty = off)
+TRAFFIC_RECORD_KEY = os.getenv("TRAFFIC_RECORD_KEY", "") # Secret for the pseudonymous IDs; random per recording when empty
+TRAFFIC_FLUSH_INTERVAL = 5.0 # Seconds between appends of buffered events to the file
+TRAFFIC_FORMAT_VERSION = 1
+TRAFFIC_KEYWORDS = {"or", "and", "nothaverole", "messages", "tweets", "id", "dryrun", "strict", "names", "cpu", "mem", "memory",
+                    "start", "stop", "status", "join", "leave"} # Command arguments kept verbatim (grammar, not user content)
+TRAFFIC_SHORT_TOKEN = re.compile(r"^(?:\d{1,6}|\d+[smhd])$", re.IGNORECASE) # Counts, limits and durations are kept verbatim
+TRAFFIC_MENTION_TOKEN = re.compile(r"^<(@!?|@&|#)(\d+)>$")
+TRAFFIC_ID_TOKEN = re.compile(r"^\d{15,21}$")
+metrics_traffic_events = metrics.counter("eventtrack_traffic_events_total", "Events written by the traffic recorder, per event type.", ("event",))
+
+class TrafficRecorder:
+    """
+    Records anonymized gateway traffic (message creates, component interactions, voice channel changes) to a gzip JSONL
+    file for benchmarks/replay.py. No content, names or real IDs are stored: users, channels, roles and links become keyed
+    hashes, messages keep their channel class, length, attachment count and (for commands) the command name and argument shape.
+    Events are buffered and appended every TRAFFIC_FLUSH_INTERVAL seconds, one gzip member per append, off the event loop.
+    """
+    def __init__(self, path, key=""):
+        self.path = path
+        self.key = key.encode("utf-8")[:64] if key else os.urandom(32)
+        self.keyed = bool(key) # Pseudonyms only match across recordings made with the same key
+        self.started = time_module.monotonic()
+        self.started_at = datetime.datetime.now(timezone.utc)
+        self.buffer = []
+        self.counts = {}
+        self.written = 0
+        self._task = None
+        self._write_lock = asyncio.Lock()
+
+    def start(self):
+        header = {"e": "header", "v": TRAFFIC_FORMAT_VERSION, "started": self.started_at.isoformat(timespec="seconds"),
+                  "prefix": bot.command_prefix, "keyed": self.keyed}
+        self.buffer.append(header)
+        self._task = asyncio.create_task(self._flush_loop())
+        log_perf.info("Traffic recorder writing to %s", self.path)
+
+    async def stop(self):
+        if self._task: self._task.cancel()
+        await self.flush()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(TRAFFIC_FLUSH_INTERVAL)
+            try: await self.flush()
+            except Exception as e: log_perf.error("Traffic recorder could not write %s: %s", self.path, e)
+
+    async def flush(self):
+        async with self._write_lock:
+            if not self.buffer: return
+            events, self.buffer = self.buffer, []
+            data = "".join(json.dumps(event, separators=(",", ":")) + "\n" for event in events)
+            await asyncio.to_thread(self._append, data)
+            self.written += len(events)
+
+    def _append(self, data):
+        with gzip.open(self.path, "at", encoding="utf-8") as f: f.write(data)
+
+    @property
+    def events(self):
+        return sum(self.counts.values())
+
+    def pseudonym(self, namespace, value):
+        return hashlib.blake2b(f"{namespace}:{value}".encode("utf-8"), key=self.key, digest_size=6).hexdigest()
+
+    def _add(self, event_type, fields):
+        self.buffer.append({"t": round(time_module.monotonic() - self.started, 3), "e": event_type, **fields})
+        self.counts[event_type] = self.counts.get(event_type, 0) + 1
+        metrics_traffic_events.inc(event=event_type)
+
+    def _member_fields(self, guild_state, member):
+        """Pseudonymous user plus the role-derived flags replay needs (tracked by the bot, admin)."""
+        roles = getattr(member, "roles", ())
+        tracked = guild_state.is_tracked(member)
+        admin = member.id == bot.owner_id or member.id in (bot.owner_ids or ()) or any(role.id in guild_state.authorized_roles for role in roles)
+        return {"u": self.pseudonym("u", member.id), "tr": int(tracked), "ad": int(admin)}
+
+    @staticmethod
+    def channel_class(guild_state, channel_id):
+        if channel_id in guild_state.twitter_log_channel_ids: return "log"
+        if channel_id in guild_state.art_channel_ids: return "art"
+        if channel_id == guild_state.stats_channel_id: return "stats"
+        return "text"
+
+    def _anonymize_arg(self, token):
+        mention = TRAFFIC_MENTION_TOKEN.match(token)
+        if mention: return f"<{mention.group(1)}{self.pseudonym('r' if mention.group(1) == '@&' else 'c' if mention.group(1) == '#' else 'u', mention.group(2))}>"
+        if TRAFFIC_ID_TOKEN.match(token): return f"id:{self.pseudonym('u', token)}" # Mostly user IDs; same hash as the author field
+        if token.lower() in TRAFFIC_KEYWORDS or TRAFFIC_SHORT_TOKEN.match(token) or parse_numeric_filter(token): return token
+        return f"w:{self.pseudonym('w', token.lower())}" # Event names, role names, free text
+
+    def record_message(self, message):
+        content = message.content
+        guild_state = get_guild_state(message.guild)
+        fields = {"c": self.channel_class(guild_state, message.channel.id), "ch": self.pseudonym("c", message.channel.id), **self._member_fields(guild_state, message.author)}
+        if message.attachments: fields["att"] = len(message.attachments)
+        if message.embeds: fields["emb"] = len(message.embeds)
+        stripped = content.strip()
+        command = None
+        if fields["c"] == "log" and X_LINK_PATTERN.match(stripped): fields["link"] = self.pseudonym("l", stripped)
+        elif content.startswith(bot.command_prefix):
+            view = StringView(content[len(bot.command_prefix):])
+            command = bot.get_command(view.get_word())
+        if command:
+            args = []
+            while not view.eof:
+                view.skip_ws()
+                try: word = view.get_quoted_word()
+                except commands.ArgumentParsingError: break
+                if word: args.append(self._anonymize_arg(word))
+            fields.update(cmd=command.qualified_name, args=args)
+        elif "link" not in fields:
+            fields["len"] = len(stripped)
+        self._add("msg", fields)
+
+    def record_interaction(self, interaction):
+        custom_id = (interaction.data or {}).get("custom_id")
+        persistent = {item.custom_id for view in bot.persistent_views for item in view.children if getattr(item, "custom_id", None)}
+        guild_state = get_guild_state(interaction.guild)
+        self._add("int", {"c": self.channel_class(guild_state, interaction.channel_id), "id": custom_id if custom_id in persistent else None,
+                          **self._member_fields(guild_state, interaction.user)})
+
+    def record_voice(self, member, before, after):
+        before_id = before.channel.id if before.channel else None
+        after_id = after.channel.id if after.channel else None
+        if before_id == after_id: return # Mute/deafen updates
+        self._add("voice", {"from": before_id and self.pseudonym("c", before_id), "to": after_id and self.pseudonym("c", after_id),
+                            **self._member_fields(get_guild_state(member.guild), member)})
+
+traffic_recorder = None # TrafficRecorder while recording
+
+async def start_traffic_recorder(path):
+    global traffic_recorder
+    traffic_recorder = TrafficRecorder(path, TRAFFIC_RECORD_KEY)
+    traffic_recorder.start()
+
+async def stop_traffic_recorder():
+    global traffic_recorder
+    recorder, traffic_recorder = traffic_recorder, None
+    if recorder: await recorder.stop()
+    return recorder
+
+@bot.command(name="traffic")
+@commands.is_owner()
+async def traffic(ctx, action: str = "status", path: str = None):
+    """Owner only: '!traffic start [path]', '!traffic stop' or '!traffic status' of the anonymized traffic recorder."""
+    action = action.lower()
+    if action == "start":
+        if traffic_recorder: return await ctx.send(f"ℹ️ Already recording to `{traffic_recorder.path}`.")
+        path = path or TRAFFIC_RECORD_PATH or f"traffic_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl.gz"
+        await start_traffic_recorder(path)
+        await ctx.send(f"✅ Recording anonymized traffic to `{path}`. Stop with `!traffic stop`.")
+    elif action == "stop":
+        recorder = await stop_traffic_recorder()
+        if not recorder: return await ctx.send("ℹ️ The traffic recorder is not running.")
+        size = os.path.getsize(recorder.path) if os.path.exists(recorder.path) else 0
+        await ctx.send(f"✅ Recording stopped: {recorder.events:,} events in `{recorder.path}` ({format_file_size(size)}).")
+    elif action == "status":
+        if not traffic_recorder: return await ctx.send("ℹ️ The traffic recorder is not running.")
+        elapsed = time_module.monotonic() - traffic_recorder.started
+        counts = ", ".join(f"{event}: {count:,}" for event, count in sorted(traffic_recorder.counts.items())) or "no events yet"
+        await ctx.send(f"ℹ️ Recording to `{traffic_recorder.path}` for {elapsed / 60:.1f} min ({counts}; {len(traffic_recorder.buffer):,} buffered).")
+    else:
+        await ctx.send("❌ Error: Use `!traffic start [path]`, `!traffic stop` or `!traffic status`.")
+
 
 # --- EVENT HANDLERS ---
 @bot.event
 async def on_ready():
     """Runs when the bot is ready."""
-    print("-" * 30)
-    print(f"Bot ready! Logged in as: {bot.user.name} ({bot.user.id})") # English text
-    print(f"Guilds: {len(bot.guilds)}") # English text
-    # Load config (including art_channel_id)
-    load_data() # Load data first
-    print(f"Track Auth Roles: {AUTHORIZED_ROLES}") # English text
-    print(f"Track Target Roles: {TARGET_ROLES}") # English text
-    print(f"Stats Auth Roles: {STATS_AUTHORIZED_ROLES}") # English text
-    print(f"X.com Log Channels: {twitter_log_channel_ids or 'None Set'}") # << MODIFIED: Print list >>
-    print(f"Art Channels: {art_channel_ids or 'None Set'}")             # << MODIFIED: Print list >>
-    print(f"Stats Button Channel: {stats_channel_id or 'Not Set'} (Msg ID: {stats_message_id or 'None'})") # English text
-    cooldown_display = []
-    for rid, secs in stats_cooldowns.items():
-        # Short cooldown display (English units)
-        cooldown_str = f"{int(secs)}s"
-        if int(secs) == 0: cooldown_str = "0s"
-        elif int(secs) % 86400 == 0: cooldown_str = f"{int(secs)//86400}d"
-        elif int(secs) % 3600 == 0: cooldown_str = f"{int(secs)//3600}h"
-        elif int(secs) % 60 == 0: cooldown_str = f"{int(secs)//60}m"
-        cooldown_display.append(f"{rid}:{cooldown_str}")
-    print(f"Stats Cooldowns: {', '.join(cooldown_display) or 'None'}") # English text
-    print("-" * 30)
+    log.info("Bot ready! Logged in as: %s (%s)", bot.user.name, bot.user.id)
+    log.info("Guilds: %d, shards: %s of %s", len(bot.guilds), SHARD_IDS or "all", bot.shard_count or 1)
+    # Move a pre-partition stats.json into its guild's file, then load every guild's partition
+    await migrate_legacy_stats(bot.guilds)
+    await load_guild_states([guild.id for guild in bot.guilds])
+    for guild in bot.guilds:
+        guild_state = get_guild_state(guild)
+        cooldown_display = []
+        for rid, secs in guild_state.stats_cooldowns.items():
+            # Short cooldown display (English units)
+            cooldown_str = f"{int(secs)}s"
+            if int(secs) == 0: cooldown_str = "0s"
+            elif int(secs) % 86400 == 0: cooldown_str = f"{int(secs)//86400}d"
+            elif int(secs) % 3600 == 0: cooldown_str = f"{int(secs)//3600}h"
+            elif int(secs) % 60 == 0: cooldown_str = f"{int(secs)//60}m"
+            cooldown_display.append(f"{rid}:{cooldown_str}")
+        log.info("Guild %s (%s): %d users, Track Auth Roles: %s, Track Target Roles: %s, Stats Auth Roles: %s", guild.name, guild.id, guild_state.stats_table.size,
+                 guild_state.authorized_roles, guild_state.target_roles, guild_state.stats_authorized_roles)
+        log.info("Guild %s: X.com Log Channels: %s, Art Channels: %s, Stats Button Channel: %s (Msg ID: %s), Stats Cooldowns: %s", guild.id,
+                 guild_state.twitter_log_channel_ids or 'None Set', guild_state.art_channel_ids or 'None Set', guild_state.stats_channel_id or 'Not Set',
+                 guild_state.stats_message_id or 'None', ', '.join(cooldown_display) or 'None')
     # Add persistent view when bot is ready
     bot.add_view(StatsView())
-    print("Persistent StatsView registered.") # English comment
-    # Add the Global Error Handler Cog AFTER other setup
-    await bot.add_cog(GlobalErrorHandler(bot))
+    log.info("Persistent StatsView registered.")
+    # Pick up members already sitting in channels of events with open attendance (also after a full reconnect)
+    for guild in bot.guilds: reconcile_attendance(guild)
+    # Resume bulk jobs interrupted by a restart or a reconnect (running jobs are left alone)
+    bulk_jobs.resume_all()
+    # Add the Global Error Handler Cog AFTER other setup; on_ready fires again after a reconnect and add_cog raises for a loaded cog
+    if not bot.get_cog("GlobalErrorHandler"):
+        await bot.add_cog(GlobalErrorHandler(bot))
+
+
+@bot.listen("on_guild_join")
+async def preload_joined_guild(guild):
+    """Loads a newly joined guild's partition without blocking the event loop on storage."""
+    await load_guild_states([guild.id])
+
+
+@bot.listen("on_interaction")
+async def record_interaction(interaction):
+    if traffic_recorder and interaction.guild and interaction.type == discord.InteractionType.component:
+        traffic_recorder.record_interaction(interaction)
+
+
+@bot.event
+async def on_voice_state_update(member, before, after):
+    """Feeds open attendance sessions; only channel changes matter (mute/deafen updates are ignored)."""
+    if traffic_recorder and not member.bot: traffic_recorder.record_voice(member, before, after)
+    sessions = attendance_sessions.get(member.guild.id)
+    if not sessions or member.bot: return
+    before_id = before.channel.id if before.channel else None
+    after_id = after.channel.id if after.channel else None
+    if before_id == after_id: return
+    now = time_module.time()
+    for session in sessions.values():
+        was_inside, is_inside = before_id in session.channel_ids, after_id in session.channel_ids
+        if was_inside and not is_inside: session.leave(member.id, now)
+        elif is_inside and not was_inside: session.join(member.id, now)
+
+@bot.event
+async def on_member_join(member):
+    get_guild_state(member.guild).stats_table.mark_member_stale(str(member.id))
+    member_lru.discard(member.guild.id, member.id) # May hold "not a member"
+
+@bot.event
+async def on_member_remove(member):
+    get_guild_state(member.guild).stats_table.mark_member_stale(str(member.id))
+
+@bot.event
+async def on_raw_member_remove(payload):
+    member_lru.discard(payload.guild_id, payload.user.id) # Also sent for members that are not cached (lean memory mode)
+
+@bot.event
+async def on_member_update(before, after):
+    """Keeps role-derived data and cached stats renders in sync when a member changes."""
+    guild_state = get_guild_state(after.guild)
+    if before.roles != after.roles:
+        guild_state.stats_table.mark_member_stale(str(after.id))
+    if before.roles != after.roles or before.display_name != after.display_name or before.display_avatar != after.display_avatar:
+        guild_state.bump_user_version(str(after.id))
+
+@bot.event
+async def on_user_update(before, after):
+    if before.display_name != after.display_name or before.display_avatar != after.display_avatar:
+        for guild_state in guild_states.values(): guild_state.bump_user_version(str(after.id))
+
+@bot.event
+async def on_guild_role_update(before, after):
+    # Role colors feed into rendered embeds; cheap to just drop the guild's renders
+    if before.color != after.color:
+        get_guild_state(after.guild).render_cache.clear()
 
 
 # << MODIFIED: on_message - Check lists for channels >>
@@ -1910,55 +4977,67 @@ async def on_message(message):
     # Ignore bots and DMs
     if message.author.bot or not message.guild:
         return
+    if traffic_recorder: traffic_recorder.record_message(message)
+
+    started = time_module.perf_counter()
+    kind = await track_message(message)
+    metrics_message_seconds.observe(time_module.perf_counter() - started, kind=kind)
+    metrics_messages.inc(kind=kind)
+
+    # --- Process Commands ---
+    # Process commands ONLY if the message wasn't handled by channel-specific logic (log/art channels)
+    if kind in ("message", "untracked"):
+        await bot.process_commands(message)
+
+X_LINK_PATTERN = re.compile(r"^https://x\.com/[A-Za-z0-9_]+/status/[0-9]+(?:\?[^\s]*)?$") # A valid post in an X.com log channel
 
+async def track_message(message):
+    """Channel-specific tracking and moderation for a guild message; returns the handler kind (metrics label)."""
     user_id = str(message.author.id)
     member = message.author # This is a Member object in guild context
+    guild_state = get_guild_state(message.guild) # Only this guild's channels, links and records are touched
 
     # --- Determine if user should be tracked ---
-    should_track = False
-    # Ensure member object for role check
-    if isinstance(member, discord.Member) and TARGET_ROLES:
-        if any(role.id in TARGET_ROLES for role in member.roles):
-            should_track = True
-    elif isinstance(member, discord.Member) and not TARGET_ROLES: # Track everyone if no target roles
-        should_track = True
+    should_track = guild_state.is_tracked(member) # Everyone is tracked if no target roles are set
 
 
     # --- X.com Log Channel Logic ---
     # << MODIFIED: Check if channel ID is in the list >>
-    if twitter_log_channel_ids and message.channel.id in twitter_log_channel_ids:
+    if guild_state.twitter_log_channel_ids and message.channel.id in guild_state.twitter_log_channel_ids:
         content = message.content.strip()
-        url_pattern = re.compile(r"^https://x\.com/[A-Za-z0-9_]+/status/[0-9]+(?:\?[^\s]*)?$")
-        match = url_pattern.match(content) # Use match() for start-to-end check
+        match = X_LINK_PATTERN.match(content) # Use match() for start-to-end check
         is_author_admin = await is_admin(member) # Check admin status once
 
         if match: # Message is a valid link format
             extracted_url = match.group(0)
             norm_url = extracted_url # Regex ensures correct format
 
-            if norm_url in posted_links_set: # Duplicate link
+            if norm_url in guild_state.posted_links_set: # Duplicate link
                 if not is_author_admin:
-                    try: await message.delete()
-                    except (discord.Forbidden, discord.HTTPException) as e: print(f"Error deleting duplicate link message: {e}") # English comment
+                    deletion_queue.queue(message)
+                    metrics_moderation_deletes.inc(reason="duplicate_link")
+                return "link_duplicate"
             else: # New link
-                posted_links_set.add(norm_url)
+                guild_state.posted_links_set.add(norm_url)
                 link_added_to_stats = False
                 if should_track: # Add to user stats only if tracked
-                    user_data = stats_data.setdefault(user_id, DEFAULT_USER_TEMPLATE())
+                    user_data = guild_state.get_user_data(user_id)
                     user_data.setdefault("twitter_links", []).append(norm_url)
+                    guild_state.notify_user_changed(user_id)
                     link_added_to_stats = True
-                save_stats() # Save immediately for new links (updates set and potentially user data)
-                if not link_added_to_stats: print(f"Added untracked user's link {norm_url} to global set.") # English comment
+                guild_state.save_stats() # Save immediately for new links (updates set and potentially user data)
+                if not link_added_to_stats: log_tracking.debug("Added untracked user's link %s to the guild's set.", norm_url)
+                return "link"
         elif not is_author_admin: # Message is not a valid link format and author is not admin
-            try: await message.delete()
-            except (discord.Forbidden, discord.HTTPException) as e: print(f"Error deleting invalid message in x.com log channel: {e}") # English comment
+            deletion_queue.queue(message)
+            metrics_moderation_deletes.inc(reason="invalid_link")
 
         # Don't process commands or other logic for messages in the Twitter log channel
-        return # Stop further processing for this channel
+        return "link_invalid" # Stop further processing for this channel
 
     # --- Art Channel Logic ---
     # << MODIFIED: Check if channel ID is in the list >>
-    elif art_channel_ids and message.channel.id in art_channel_ids:
+    elif guild_state.art_channel_ids and message.channel.id in guild_state.art_channel_ids:
         is_author_admin = await is_admin(member) # Check admin status
 
         # Check for valid media post (attachments OR embeds exist, BUT text content does NOT)
@@ -1970,34 +5049,32 @@ async def on_message(message):
         if is_valid_art_post:
             # Valid post, increment counter if user should be tracked
             if should_track:
-                user_data = stats_data.setdefault(user_id, DEFAULT_USER_TEMPLATE())
+                user_data = guild_state.get_user_data(user_id)
                 user_data["art_count"] = user_data.get("art_count", 0) + 1
-                save_stats() # Save immediately after a valid art post
+                guild_state.notify_user_changed(user_id)
+                guild_state.save_stats() # Save immediately after a valid art post
+            return "art"
         elif not is_author_admin:
-            # Invalid post (no media, or media + text) and not admin, delete silently
-            try:
-                await message.delete()
-            except (discord.Forbidden, discord.HTTPException) as e:
-                print(f"Error deleting invalid message in art channel: {e}") # English comment
+            # Invalid post (no media, or media + text) and not admin, delete silently (batched per channel)
+            deletion_queue.queue(message)
+            metrics_moderation_deletes.inc(reason="invalid_art")
 
         # Don't process commands or other logic for messages in the art channel
-        return # Stop further processing for this channel
+        return "art_invalid" # Stop further processing for this channel
 
     # --- General Message Counter Update ---
     # This block is reached ONLY if the message was NOT in the twitter log or art channel
     else:
         if should_track:
-            user_data = stats_data.setdefault(user_id, DEFAULT_USER_TEMPLATE())
+            user_data = guild_state.get_user_data(user_id)
             # Only increment total_message_count here
             user_data["total_message_count"] = user_data.get("total_message_count", 0) + 1
+            guild_state.notify_user_changed(user_id)
             # Periodic save for message count
             if user_data["total_message_count"] % 50 == 0:
-                 save_stats()
-
-
-    # --- Process Commands ---
-    # Process commands ONLY if the message wasn't handled and returned by channel-specific logic above
-    await bot.process_commands(message)
+                 guild_state.save_stats()
+            return "message"
+        return "untracked"
 
 
 # --- GLOBAL ERROR HANDLING (Cog) ---
@@ -2013,7 +5090,7 @@ class GlobalErrorHandler(commands.Cog):
         # Avoid reprocessing CheckFailure/MissingPermissions potentially handled by SilentBot
         if isinstance(error, (commands.CheckFailure, commands.MissingPermissions)):
              # Optional: Log that it reached here, but don't send message to user
-             # print(f"Silent error reached global handler: {type(error)}") # English comment
+             # log_commands.debug("Silent error reached global handler: %s", type(error)) # English comment
              return
 
         # Get the original error
@@ -2028,6 +5105,8 @@ class GlobalErrorHandler(commands.Cog):
         elif isinstance(original_error, (BadArgument, commands.BadUnionArgument, RoleNotFound, MemberNotFound, commands.ChannelNotFound, commands.UserNotFound)):
             await ctx.send(f"❌ Invalid argument provided: {original_error}. Check `!thelp`.")
         elif isinstance(original_error, commands.CommandOnCooldown):
+            if not getattr(original_error, "notify", True):
+                return
             await ctx.send(f"⏳ Command on cooldown. Try again in {original_error.retry_after:.1f}s.", delete_after=5)
         elif isinstance(original_error, commands.UserInputError): # Other user input errors
             await ctx.send(f"❌ Incorrect command usage: {original_error}. Check `!thelp`.")
@@ -2038,44 +5117,55 @@ class GlobalErrorHandler(commands.Cog):
             await ctx.send("❌ This command cannot be used in private messages.")
         elif isinstance(original_error, discord.Forbidden): # General API permission error
             await ctx.send(f"❌ Discord API Error: Insufficient Permissions. Check bot roles/permissions.")
-            print(f"Forbidden Error: Cmd: {ctx.command}, Err: {original_error}") # English comment
+            log_commands.warning("Forbidden Error: Cmd: %s, Err: %s", ctx.command, original_error)
         elif isinstance(original_error, discord.HTTPException): # Other API errors
             await ctx.send(f"❌ Discord API Error: {original_error.status} - {original_error.text}")
-            print(f"HTTP Error: Cmd: {ctx.command}, Status: {original_error.status}, Text: {original_error.text}") # English comment
+            log_commands.warning("HTTP Error: Cmd: %s, Status: %s, Text: %s", ctx.command, original_error.status, original_error.text)
         # Log all other unexpected errors to console
         else:
-            print(f"Unhandled command error (Command: {ctx.command}): {original_error}") # English comment
-            traceback.print_exception(type(original_error), original_error, original_error.__traceback__)
+            log_commands.error("Unhandled command error (Command: %s): %s", ctx.command, original_error, exc_info=original_error)
             # Send a generic error message
             try:
                 await ctx.send("❌ An unexpected error occurred. Please contact an administrator.") # English text
             except Exception as e:
-                print(f"Error sending 'unexpected error' message: {e}") # English comment
+                log_commands.warning("Error sending 'unexpected error' message: %s", e)
 
 
 # --- BOT TOKEN & RUN ---
 async def main():
     """Main async function to start the bot."""
-    load_dotenv() # Load variables from .env file
     BOT_TOKEN = os.getenv('DISCORD_TOKEN')
 
     if not BOT_TOKEN:
-        print("ERROR: Bot token not found in DISCORD_TOKEN environment variable.") # English text
+        log.error("Bot token not found in DISCORD_TOKEN environment variable.")
         return
 
     async with bot:
-        # Load data initially
-        load_data()
+        # Guild partitions are loaded in on_ready (and on first use for guilds joined later)
+        await start_metrics_server()
+        loop_watchdog.start()
+        if storage is not None:
+            await storage.start()
+            await bulk_jobs.load_storage()
+        elif SHARD_IDS: log.warning("SHARD_IDS is set without STORAGE_DB_PATH: other shard processes will not see this process's changes.")
+        if TRAFFIC_RECORD_PATH: await start_traffic_recorder(TRAFFIC_RECORD_PATH)
         # Start the bot
         try:
             await bot.start(BOT_TOKEN)
         except discord.LoginFailure:
-            print("ERROR: Invalid bot token.") # English text
+            log.error("Invalid bot token.")
         except discord.PrivilegedIntentsRequired:
-            print("ERROR: Enable Privileged Intents (Members, Message Content) in the Developer Portal.") # English text
+            log.error("Enable Privileged Intents (Members, Message Content) in the Developer Portal.")
         except Exception as e:
-            print(f"Unexpected error running bot: {e}") # English text
-            traceback.print_exc()
+            log.exception("Unexpected error running bot: %s", e)
+        finally:
+            await flush_guild_states() # Delayed saves (STATS_FLUSH_DELAY) still pending
+            if storage is not None:
+                await bulk_jobs.wait_saved()
+                await storage.stop()
+            await stop_traffic_recorder()
+            await loop_watchdog.stop()
+            await stop_metrics_server()
 
 if __name__ == "__main__":
     # Use asyncio.run() to start the bot's main function
@@ -2085,5 +5175,5 @@ if __name__ == "__main__":
         #     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
         asyncio.run(main())
     except KeyboardInterrupt:
-        print("Bot stopped manually.") # English text
+        log.info("Bot stopped manually.")
 